@@ -0,0 +1,193 @@
+"""Medie e percentili per ruolo calcolati in locale, senza passare dal tab 'Stats'.
+
+Per ogni ruolo si tengono count, media e M2 (algoritmo di Welford) e, per ogni
+categoria, un t-digest (tdigest.py) per il percentile; tutto viene aggiornato a
+ogni invio confermato e salvato in SQLite, la lettura è dalla memoria.
+Quando una submission viene modificata la versione precedente esce da count,
+media e M2; il t-digest non supporta la rimozione, quindi lì resta (i percentili
+sono comunque approssimati).
+Si può inizializzare una volta da un export completo delle righe:
+
+    python aggregates.py export.json --db aggregates.sqlite3
+"""
+import argparse
+import json
+import math
+import sqlite3
+import sys
+import threading
+
+from tdigest import TDigest
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS role_stats (
+    role TEXT PRIMARY KEY,
+    n INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    m2 REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sketches (
+    role TEXT NOT NULL,
+    category TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (role, category)
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# colonne delle righe salvate (vedi build_row in app.py) con un percentile
+CATEGORIES = ["CO2 Total", "CO2 Devices", "CO2 E-Waste", "CO2 Digital Activities", "CO2 AI"]
+
+
+def _to_float(x):
+    # Converte "310,2" o "310.2" in float, gestisce None
+    if x is None:
+        return None
+    if isinstance(x, (int, float)):
+        return float(x)
+    try:
+        return float(str(x).strip().replace(" ", "").replace(",", "."))
+    except ValueError:
+        return None
+
+
+class RoleAggregates:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._stats = {
+            role: [n, mean, m2] for role, n, mean, m2 in self._db.execute("SELECT role, n, mean, m2 FROM role_stats")
+        }
+        self._sketches = {
+            (role, cat): TDigest.from_dict(json.loads(data))
+            for role, cat, data in self._db.execute("SELECT role, category, data FROM sketches")
+        }
+
+    @property
+    def bootstrapped(self):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'bootstrapped'").fetchone()
+        return row is not None
+
+    def _save(self, roles):
+        self._db.executemany(
+            "INSERT OR REPLACE INTO role_stats (role, n, mean, m2) VALUES (?, ?, ?, ?)",
+            [(r, *self._stats[r]) for r in roles],
+        )
+        self._db.executemany(
+            "INSERT OR REPLACE INTO sketches (role, category, data) VALUES (?, ?, ?)",
+            [(r, c, json.dumps(t.to_dict())) for (r, c), t in self._sketches.items() if r in roles],
+        )
+
+    def _push(self, role, x):
+        s = self._stats.setdefault(role, [0, 0.0, 0.0])
+        s[0] += 1
+        delta = x - s[1]
+        s[1] += delta / s[0]
+        s[2] += delta * (x - s[1])
+
+    def _pop(self, role, x):
+        # inverso di _push (Welford all'indietro)
+        s = self._stats.get(role)
+        if not s or s[0] == 0:
+            return
+        if s[0] == 1:
+            s[:] = [0, 0.0, 0.0]
+            return
+        n, mean, m2 = s
+        new_mean = (n * mean - x) / (n - 1)
+        s[0], s[1], s[2] = n - 1, new_mean, max(0.0, m2 - (x - mean) * (x - new_mean))
+
+    def _push_row(self, row):
+        """Aggiunge una riga a medie e sketch; ritorna il ruolo (o None se la riga non è valida)."""
+        role = (row.get("Role") or "").strip()
+        x = _to_float(row.get("CO2 Total"))
+        if not role or x is None or not math.isfinite(x):
+            return None
+        self._push(role, x)
+        for cat in CATEGORIES:
+            v = _to_float(row.get(cat))
+            if v is not None:
+                self._sketches.setdefault((role, cat), TDigest()).add(v)
+        return role
+
+    def _pop_row(self, row):
+        role = (row.get("Role") or "").strip()
+        x = _to_float(row.get("CO2 Total"))
+        if not role or x is None or not math.isfinite(x):
+            return None
+        self._pop(role, x)
+        return role
+
+    def add_rows(self, rows, replaced=None):
+        """
+        Aggiorna medie e sketch con le righe inviate (dict come build_row in app.py).
+        replaced: per ogni riga la versione precedente della stessa submission (o None), da togliere.
+        """
+        with self._lock:
+            touched = {self._pop_row(prev) for prev in (replaced or []) if prev}
+            touched |= {self._push_row(row) for row in rows}
+            self._save(touched - {None})
+
+    def bootstrap(self, rows):
+        """Ricalcola tutto da un export completo (una volta sola: le chiamate successive non fanno nulla)."""
+        if self.bootstrapped:
+            return False
+        with self._lock:
+            # le righe arrivate da add_rows() prima del bootstrap sono già nell'export: si riparte da zero
+            self._stats = {}
+            self._sketches = {}
+            for row in rows:
+                self._push_row(row)
+            self._db.execute("BEGIN")
+            self._db.execute("DELETE FROM role_stats")
+            self._db.execute("DELETE FROM sketches")
+            self._save(self._stats)
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('bootstrapped', '1')")
+            self._db.execute("COMMIT")
+        return True
+
+    def get(self, role):
+        """Ritorna (media, count, deviazione standard) per il ruolo, oppure (None, 0, None)."""
+        with self._lock:
+            s = self._stats.get((role or "").strip())
+            if not s or s[0] == 0:
+                return None, 0, None
+            n, mean, m2 = s
+        std = math.sqrt(m2 / (n - 1)) if n > 1 else 0.0
+        return mean, n, std
+
+    def percentile(self, role, x, category="CO2 Total"):
+        """Ritorna (percentile 0–100 di x tra i rispondenti del ruolo, numero di rispondenti)."""
+        with self._lock:
+            t = self._sketches.get(((role or "").strip(), category))
+            if t is None or t.count == 0:
+                return None, 0
+            return 100.0 * t.cdf(x), int(t.count)
+
+    def snapshot(self):
+        with self._lock:
+            return {r: {"count": n, "mean": round(mean, 3)} for r, (n, mean, _) in self._stats.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bootstrap local role averages from a full export.")
+    parser.add_argument("export", help="JSON array (Sheet.best GET) or JSONL file with the saved rows")
+    parser.add_argument("--db", default="aggregates.sqlite3", help="aggregates database (default: aggregates.sqlite3)")
+    args = parser.parse_args(argv)
+
+    with open(args.export, encoding="utf-8") as f:
+        text = f.read()
+    rows = json.loads(text) if text.lstrip().startswith("[") else [json.loads(l) for l in text.splitlines() if l.strip()]
+    agg = RoleAggregates(args.db)
+    if not agg.bootstrap(rows):
+        parser.exit(1, f"{args.db} is already bootstrapped\n")
+    print(json.dumps(agg.snapshot(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
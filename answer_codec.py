@@ -0,0 +1,344 @@
+"""Codifica compatta e a larghezza fissa delle risposte complete, salvata accanto ai totali.
+
+Con le risposte (non solo i totali) si possono ricalcolare le impronte quando
+cambiano i fattori. Ogni risposta diventa un record binario:
+
+    header  (HEADER, larghezza fissa)  versione, ruolo, bucket email/cloud, wifi,
+                                       pagine, idle, ore per attività, query AI per task
+    device  (DEVICE × n_devices)       tipo, anni, condizione, ownership, fine vita
+
+Le etichette sono salvate come indice nelle tabelle LABELS della versione (non
+come valori: un bucket email resta "11–20" anche se cambia il suo punto medio);
+ore e wifi in mezze unità, come lo step degli slider; gli anni dei device in
+centesimi (dalla versione 2), perché nel number_input si può scrivere anche 2.3 e
+non solo multipli di 0.5: quantize_years() è lo stesso arrotondamento, da usare
+dove la risposta viene costruita perché i totali siano quelli del codice. Il record va in base64
+URL-safe senza padding, così sta in una cella: la versione è il primo byte,
+quindi il testo inizia sempre con "A" e il foglio non lo scambia per una formula.
+
+decode_many() decodifica in blocco con np.frombuffer e produce le stesse colonne
+di footprint.encode_answers(), pronte per footprint.score().
+"""
+import base64
+import struct
+
+import numpy as np
+
+import footprint
+
+VERSION = 2
+
+# scala degli anni dei device per versione: 1 = mezzi anni (u1), 2 = centesimi (u2)
+YEARS_SCALE = {1: 2, 2: 100}
+
+# etichette per versione, congelate: se footprint cambia un'opzione serve una versione nuova
+LABELS = {
+    1: {
+        "roles": (
+            "Student",
+            "Professor",
+            "Staff Member",
+        ),
+        "activities": (
+            "MS Office (e.g. Excel, Word, PPT, Outlook…)",
+            "Technical softwares (e.g. Matlab, Python…)",
+            "Web browsing",
+            "Watching lecture recordings",
+            "Online classes streaming or video call",
+            "Reading study materials on your computer (e.g. slides, articles, digital textbooks)",
+            "Videocall (e.g. Zoom, Teams…)",
+            "Online classes streaming",
+            "Reading materials on your computer (e.g. slides, articles, digital textbooks)",
+            "Management software (e.g. SAP)",
+            "Reading materials on your computer (e.g. documents)",
+        ),
+        "ai_tasks": (
+            "Summarize texts or articles",
+            "Translate sentences or texts",
+            "Explain a concept",
+            "Generate quizzes or questions",
+            "Write formal emails or messages",
+            "Correct grammar or style",
+            "Analyze long PDF documents",
+            "Write or test code",
+            "Generate images",
+            "Brainstorm for thesis or projects",
+            "Explain code step-by-step",
+            "Prepare lessons or presentations",
+        ),
+        "devices": (
+            "Desktop Computer",
+            "Laptop Computer",
+            "Smartphone",
+            "Tablet",
+            "External Monitor",
+            "Headphones",
+            "Printer",
+            "Home Router/Modem",
+            "Maxi-screen",
+            "Projector",
+        ),
+        "used": (
+            "-- Select --",
+            "New",
+            "Used",
+        ),
+        "shared": (
+            "-- Select --",
+            "Personal",
+            "Shared with family",
+            "Shared in university",
+        ),
+        "eol": (
+            "-- Select --",
+            "I bring it to a certified e-waste collection center",
+            "I throw it away in general waste",
+            "I return it to manufacturer for recycling or reuse",
+            "I sell or donate it to someone else",
+            "I store it at home, unused",
+            "Device provided by the university, I return it after use",
+        ),
+        "idle": (
+            "I turn it off",
+            "I leave it on (idle mode)",
+            "I don’t have a computer",
+        ),
+        "emails": (
+            "-- Select option --",
+            "0",
+            "1–10",
+            "11–20",
+            "21–30",
+            "31–40",
+            "41–80",
+            "81–100",
+            ">100",
+        ),
+        "cloud": (
+            "-- Select option --",
+            "<5GB",
+            "5–20GB",
+            "20–50GB",
+            "50–100GB",
+            "100–200GB",
+        ),
+    },
+}
+LABELS[2] = LABELS[1]  # cambia solo la larghezza degli anni
+
+# riferimento: le etichette attuali di footprint, nello stesso formato di LABELS
+CURRENT_LABELS = {
+    "roles": tuple(footprint.ROLES),
+    "activities": tuple(footprint.ACTIVITIES),
+    "ai_tasks": tuple(footprint.AI_TASKS),
+    "devices": tuple(footprint.DEVICE_TYPES),
+    "used": tuple(footprint.USED_OPTIONS),
+    "shared": tuple(footprint.SHARED_OPTIONS),
+    "eol": tuple(footprint.EOL_OPTIONS),
+    "idle": tuple(footprint.IDLE_OPTIONS),
+    "emails": tuple(footprint.emails),
+    "cloud": tuple(footprint.cloud_gb),
+}
+if CURRENT_LABELS != LABELS[VERSION]:
+    raise RuntimeError("answer_codec: footprint options changed, add a new version to LABELS")
+
+
+def _layout(labels, version):
+    header = np.dtype([
+        ("version", "u1"), ("role", "u1"),
+        ("email_plain", "u1"), ("email_attach", "u1"), ("cloud", "u1"),
+        ("wifi", "u1"), ("pages", "u1"), ("idle", "u1"), ("n_devices", "u1"),
+        ("hours", "u1", (len(labels["activities"]),)),
+        ("ai", "<u2", (len(labels["ai_tasks"]),)),
+    ])
+    years = "u1" if YEARS_SCALE[version] == 2 else "<u2"
+    device = np.dtype([("type", "u1"), ("years", years), ("used", "u1"), ("shared", "u1"), ("eol", "u1")])
+    return header, device
+
+
+LAYOUTS = {v: _layout(labels, v) for v, labels in LABELS.items()}
+HEADER, DEVICE = LAYOUTS[VERSION]
+
+# per encode(), che gira a ogni rerun dell'app: etichetta -> indice e struct con lo
+# stesso layout di HEADER/DEVICE (little-endian, senza padding), più veloci di numpy su un record
+_ENC_INDEX = {what: {v: i for i, v in enumerate(labels)} for what, labels in LABELS[VERSION].items()}
+_ENC_HEADER = struct.Struct(f"<9B{len(LABELS[VERSION]['activities'])}B{len(LABELS[VERSION]['ai_tasks'])}H")
+_ENC_DEVICE = struct.Struct("<BHBBB")
+assert (_ENC_HEADER.size, _ENC_DEVICE.size) == (HEADER.itemsize, DEVICE.itemsize)
+
+
+def _index(what, value, label):
+    try:
+        return _ENC_INDEX[what][value]
+    except (KeyError, TypeError):
+        raise ValueError(f"Unknown {label}: {value!r}") from None
+
+
+def _halves(value, hi, what):
+    v = float(value or 0) * 2
+    if v != int(v) or not 0 <= v <= hi:
+        raise ValueError(f"{what} must be a multiple of 0.5 between 0 and {hi / 2:g}: {value!r}")
+    return int(v)
+
+
+def _hundredths(value, what):
+    v = float(value or 0) * 100
+    if not 0 <= v <= 0xFFFF:
+        raise ValueError(f"{what} must be between 0 and {0xFFFF / 100:g}: {value!r}")
+    return round(v)
+
+
+def quantize_years(value):
+    """Anni come vengono salvati nel codice (centesimi): lo stesso valore che decode() restituisce."""
+    return _hundredths(value, "years") / 100
+
+
+def _count(value, hi, what):
+    v = int(value or 0)
+    if not 0 <= v <= hi:
+        raise ValueError(f"{what} must be between 0 and {hi}: {value!r}")
+    return v
+
+
+def encode(answer):
+    """Risposta (dict come per footprint.encode_answers) -> stringa compatta."""
+    devices = answer.get("devices") or []
+    hours = [0] * len(_ENC_INDEX["activities"])
+    for act, h in (answer.get("hours") or {}).items():
+        hours[_index("activities", act, "activity")] = _halves(h, 255, "hours")
+    ai = [0] * len(_ENC_INDEX["ai_tasks"])
+    for task, q in (answer.get("ai") or {}).items():
+        ai[_index("ai_tasks", task, "AI task")] = _count(q, 0xFFFF, "AI queries")
+    raw = [_ENC_HEADER.pack(
+        VERSION,
+        _index("roles", answer.get("role"), "role"),
+        _index("emails", answer.get("email_plain", "-- Select option --"), "email bucket"),
+        _index("emails", answer.get("email_attach", "-- Select option --"), "email bucket"),
+        _index("cloud", answer.get("cloud", "-- Select option --"), "cloud bucket"),
+        _halves(answer.get("wifi", 4.0), 255, "wifi"),
+        _count(answer.get("pages", 0), 255, "pages"),
+        _index("idle", answer.get("idle", LABELS[VERSION]["idle"][2]), "idle option"),
+        _count(len(devices), 255, "number of devices"),
+        *hours, *ai,
+    )]
+    for dev in devices:
+        raw.append(_ENC_DEVICE.pack(
+            _index("devices", dev.get("type"), "device"),
+            _hundredths(dev.get("years", 0), "years"),
+            _index("used", dev.get("used", "-- Select --"), "condition"),
+            _index("shared", dev.get("shared", "-- Select --"), "ownership"),
+            _index("eol", dev.get("eol", "-- Select --"), "end-of-life option"),
+        ))
+    return base64.urlsafe_b64encode(b"".join(raw)).rstrip(b"=").decode("ascii")
+
+
+def _raw(code):
+    s = str(code).strip()
+    try:
+        return base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+    except ValueError:
+        raise ValueError(f"Invalid answer code: {s[:16]!r}") from None
+
+
+def _split(raws, version):
+    """Record grezzi di una stessa versione -> (header, device) come array strutturati."""
+    header, device = LAYOUTS[version]
+    heads = np.frombuffer(b"".join(r[:header.itemsize] for r in raws), dtype=header)
+    bad = [i for i, r in enumerate(raws) if len(r) != header.itemsize + int(heads["n_devices"][i]) * device.itemsize]
+    if bad:
+        raise ValueError(f"Truncated answer code at position {bad[0]}")
+    devs = np.frombuffer(b"".join(r[header.itemsize:] for r in raws), dtype=device)
+    return heads, devs
+
+
+def _to_current(labels, what):
+    """Indici della versione salvata -> indici delle etichette attuali (-1 se l'etichetta non esiste più)."""
+    cur = CURRENT_LABELS[what]
+    return np.array([cur.index(v) if v in cur else -1 for v in labels[what]], dtype=np.intp)
+
+
+def _map(labels, what, idx):
+    out = _to_current(labels, what)[idx]
+    if (out < 0).any():
+        gone = labels[what][int(idx[np.argmax(out < 0)])]
+        raise ValueError(f"Option no longer scored ({what}): {gone!r}")
+    return out
+
+
+def decode_many(codes):
+    """Stringhe di encode() -> colonne come footprint.encode_answers(), per footprint.score()."""
+    raws = [_raw(c) for c in codes]
+    n = len(raws)
+    cols = {
+        "role": np.zeros(n, dtype=np.intp),
+        "hours": np.zeros((n, len(footprint.ACTIVITIES))),
+        "ai": np.zeros((n, len(footprint.AI_TASKS))),
+        "email_plain": np.zeros(n), "email_attach": np.zeros(n), "cloud": np.zeros(n),
+        "wifi": np.zeros(n), "pages": np.zeros(n), "idle": np.zeros(n, dtype=np.intp),
+    }
+    dev_parts = {k: [] for k in ("dev_owner", "dev_type", "dev_years", "dev_used", "dev_shared", "dev_eol")}
+    versions = np.array([r[0] if r else 0 for r in raws], dtype=np.intp)
+    unknown = set(versions.tolist()) - set(LAYOUTS)
+    if unknown:
+        raise ValueError(f"Unknown answer code version(s): {sorted(unknown)}")
+    email_vals = np.array(list(footprint.emails.values()), dtype=float)
+    cloud_vals = np.array(list(footprint.cloud_gb.values()), dtype=float)
+
+    for v in np.unique(versions):
+        lab = LABELS[int(v)]
+        pos = np.flatnonzero(versions == v)
+        heads, devs = _split([raws[i] for i in pos], int(v))
+        cols["role"][pos] = _map(lab, "roles", heads["role"])
+        cols["email_plain"][pos] = email_vals[_map(lab, "emails", heads["email_plain"])]
+        cols["email_attach"][pos] = email_vals[_map(lab, "emails", heads["email_attach"])]
+        cols["cloud"][pos] = cloud_vals[_map(lab, "cloud", heads["cloud"])]
+        cols["wifi"][pos] = heads["wifi"] / 2
+        cols["pages"][pos] = heads["pages"]
+        cols["idle"][pos] = _map(lab, "idle", heads["idle"])
+        act = _to_current(lab, "activities")
+        hours = heads["hours"] / 2
+        if (hours[:, act < 0] > 0).any():
+            raise ValueError("Hours recorded for an activity that is no longer scored")
+        cols["hours"][np.ix_(pos, act[act >= 0])] = hours[:, act >= 0]
+        ai = _to_current(lab, "ai_tasks")
+        if (heads["ai"][:, ai < 0] > 0).any():
+            raise ValueError("Queries recorded for an AI task that is no longer scored")
+        cols["ai"][np.ix_(pos, ai[ai >= 0])] = heads["ai"][:, ai >= 0]
+        dev_parts["dev_owner"].append(np.repeat(pos, heads["n_devices"]))
+        dev_parts["dev_type"].append(_map(lab, "devices", devs["type"]))
+        dev_parts["dev_years"].append(devs["years"] / YEARS_SCALE[int(v)])
+        dev_parts["dev_used"].append(_map(lab, "used", devs["used"]))
+        dev_parts["dev_shared"].append(_map(lab, "shared", devs["shared"]))
+        dev_parts["dev_eol"].append(_map(lab, "eol", devs["eol"]))
+
+    for k, parts in dev_parts.items():
+        dtype = float if k == "dev_years" else np.intp
+        cols[k] = np.concatenate(parts).astype(dtype) if parts else np.zeros(0, dtype=dtype)
+    return cols
+
+
+def decode(code):
+    """Stringa di encode() -> risposta con le etichette della sua versione (per ispezione)."""
+    raw = _raw(code)
+    if not raw or raw[0] not in LAYOUTS:
+        raise ValueError(f"Unknown answer code version: {raw[0] if raw else None}")
+    lab = LABELS[raw[0]]
+    heads, devs = _split([raw], raw[0])
+    h = heads[0]
+    return {
+        "role": lab["roles"][h["role"]],
+        "devices": [
+            {"type": lab["devices"][d["type"]], "years": float(d["years"]) / YEARS_SCALE[raw[0]],
+             "used": lab["used"][d["used"]],
+             "shared": lab["shared"][d["shared"]], "eol": lab["eol"][d["eol"]]}
+            for d in devs
+        ],
+        "hours": {a: float(h["hours"][i]) / 2 for i, a in enumerate(lab["activities"]) if h["hours"][i]},
+        "email_plain": lab["emails"][h["email_plain"]],
+        "email_attach": lab["emails"][h["email_attach"]],
+        "cloud": lab["cloud"][h["cloud"]],
+        "wifi": float(h["wifi"]) / 2,
+        "pages": int(h["pages"]),
+        "idle": lab["idle"][h["idle"]],
+        "ai": {t: int(h["ai"][i]) for i, t in enumerate(lab["ai_tasks"]) if h["ai"][i]},
+    }
@@ -1,14 +1,80 @@
 import streamlit as st
 import pandas as pd
-import random
 import plotly.express as px
-import time
 import streamlit.components.v1 as components
-import requests
+from streamlit.errors import StreamlitAPIException
+import hmac
 import math
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from footprint import (
+    ROLE_ACTIVITIES, AI_TASKS, DEVICE_TYPES, EOL_OPTIONS,
+    compile_factors, FACTORS_VERSION, SHARED_OPTIONS, USED_OPTIONS,
+)
+from outbox import Outbox
+from writebehind import BatchRejected, WriteBehindQueue
+from ttlcache import TTLCache
+from aggregates import RoleAggregates
+from httpclient import PooledClient, maybe_sent
+from breaker import CircuitBreaker
+from answer_codec import quantize_years
+from results import answer_key, canonical_answer, results_for_answer
+from lrucache import LRUCache
+import images
+import assets
+import device_table
+from storage import open_storage
+from export import ColumnarExport
+
+DEFAULT_STATS_URL = "https://api.sheetbest.com/sheets/b182e0f1-84d8-41f6-9ad3-ea8473065730/tabs/Stats"
+
+def secret(key, default=None):
+    """Come st.secrets.get, ma funziona anche senza secrets.toml (sviluppo locale)."""
+    try:
+        return st.secrets.get(key, default)
+    except FileNotFoundError:
+        return default
+
+def get_factors():
+    """Fattori della versione scelta nei secrets (FACTORS_VERSION), compilati una volta per processo."""
+    return compile_factors(secret("FACTORS_VERSION", FACTORS_VERSION))
+
+@st.cache_resource
+def get_images():
+    """Varianti ridimensionate delle immagini (images.py), preparate una volta per processo: {(file, larghezza): URL}.
+
+    Con lo static serving l'URL è /app/static/img/<nome>.<hash>.<ext>, uguale per tutte le
+    sessioni e quindi in cache nel browser; senza (o se il file non è stato scritto) è un data URI.
+    """
+    static = assets.static_images()
+    return {
+        key: assets.image_url(v.path) if static and Path(v.path).exists() else images.data_uri(v)
+        for key, v in images.build_all(secret("IMAGE_FORMAT", "webp")).items()
+    }
 
-API_URL = st.secrets["SHEETBEST_URL"]
-API_URL_STATS = "https://api.sheetbest.com/sheets/b182e0f1-84d8-41f6-9ad3-ea8473065730/tabs/Stats" 
+def image_src(name, width):
+    # st.image passa l'URL al browser così com'è; un file senza variante va a st.image come prima
+    return get_images().get((name, width), name)
+
+@st.cache_resource
+def app_css():
+    """Foglio di stile comune (style.css), minificato una volta per processo e incluso una volta per rerun."""
+    return assets.stylesheet_html("style.css")
+
+# <style> delle pagine con font Inter (da Google Fonts) e titoli colorati
+FONT_CSS = (
+    "<style>@import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600&display=swap');\n"
+    "html,body,[class*=\"css\"]{font-family:'Inter',sans-serif}h1,h2,h3,h4{color:#1d3557}</style>"
+)
+
+@st.cache_resource
+def get_results_cache():
+    """Results per risposta canonica, condivisi da tutte le sessioni (LRU, RESULTS_CACHE_SIZE voci)."""
+    return LRUCache(int(secret("RESULTS_CACHE_SIZE", 4096)), name="results")
 
 def scroll_top():
     components.html(
@@ -20,7 +86,45 @@ def scroll_top():
         height=0,
     )
 
-def save_row(role, co2_devices, co2_ewaste, co2_ai, co2_digital, co2_total):
+@st.cache_resource
+def get_http():
+    """Sessione HTTP keep-alive condivisa (pool limitato) per tutte le chiamate a Sheet.best."""
+    return PooledClient(
+        timeouts={
+            "save": (3.05, 15),     # (connect, read) in secondi
+            "stats": (3.05, 5),
+            "export": (3.05, 60),
+        },
+        pool_size=int(secret("HTTP_POOL_SIZE", 10)),
+    )
+
+@st.cache_resource
+def get_storage():
+    """
+    Backend delle righe (storage.py), letto dai secrets al primo uso: STORAGE_BACKEND = sheetbest | sqlite | columnar.
+    Senza SHEETBEST_URL si usa SQLite locale, così l'app parte anche senza secrets.
+    """
+    url = secret("SHEETBEST_URL")
+    backend = secret("STORAGE_BACKEND") or ("sheetbest" if url else "sqlite")
+    default_path = {"sqlite": "submissions.sqlite3", "columnar": "submissions.columnar"}.get(backend, "")
+    return open_storage(
+        backend,
+        url=url,
+        stats_url=secret("SHEETBEST_STATS_URL", DEFAULT_STATS_URL),
+        path=secret("STORAGE_PATH", str(Path(__file__).parent / default_path)),
+        http=get_http(),
+    )
+
+@st.cache_resource
+def get_breakers():
+    """Circuit breaker condivisi: 'read' per Stats/export, 'save' per gli inserimenti."""
+    return {
+        "read": CircuitBreaker("read", failure_threshold=3, reset_timeout=30.0),
+        "save": CircuitBreaker("save", failure_threshold=3, reset_timeout=30.0, ignore=(BatchRejected,)),
+    }
+
+def build_row(submission_id, role, co2_devices, co2_ewaste, co2_ai, co2_digital, co2_total, timestamp=None, answers=None,
+              factors_version=None):
     # restituisce numeri (float), non stringhe
     def norm_val(x):
         try:
@@ -32,18 +136,109 @@ def save_row(role, co2_devices, co2_ewaste, co2_ai, co2_digital, co2_total):
         except Exception:
             return 0.0
 
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
     payload = {
+        "Submission ID": str(submission_id),
+        "Timestamp": timestamp or now,  # primo invio della sessione: decide la partizione dell'export
+        "Updated At": now,  # ogni salvataggio, anche le modifiche: watermark del backfill (export.py)
         "Role": str(role or ""),
         "CO2 Devices": norm_val(co2_devices),
         "CO2 E-Waste": norm_val(co2_ewaste),
         "CO2 AI": norm_val(co2_ai),
         "CO2 Digital Activities": norm_val(co2_digital),
         "CO2 Total": norm_val(co2_total),
+        # risposte complete (answer_codec), per ricalcolare i totali se cambiano i fattori
+        "Answers": answers or "",
+        "Factors Version": factors_version or FACTORS_VERSION,
     }
+    return payload
+
+def post_rows(payloads):
+    """
+    Inserisce più righe con una sola richiesta (Sheet.best accetta una lista di oggetti).
+    Ritorna una conferma per riga: Sheet.best risponde con le righe inserite, in ordine.
+    Con il circuito 'save' aperto solleva CircuitOpen e le righe restano nell'outbox.
+    """
+    return get_breakers()["save"].call(get_storage().insert, payloads)
+
+def upsert_row(payload):
+    """
+    Aggiorna la riga con lo stesso 'Submission ID' (PATCH) e la inserisce solo se non esiste:
+    usata per le modifiche e per i reinvii dopo un esito incerto, così non si creano duplicati.
+    """
+    return get_breakers()["save"].call(get_storage().upsert, payload)
+
+def fetch_all_rows():
+    """Tutte le righe salvate (export completo), per inizializzare le medie locali."""
+    return get_breakers()["read"].call(get_storage().fetch_all)
+
+BOOTSTRAP_RETRY = (30.0, 900.0)  # attesa dopo il primo errore e massima (secondi), raddoppia a ogni errore
+
+@st.cache_resource
+def _bootstrap_state():
+    return {"lock": threading.Lock(), "running": False, "failures": 0, "next_try": 0.0}
 
-    r = requests.post(API_URL, json=payload, timeout=10)
-    r.raise_for_status()
-    return r.json()
+def _bootstrap_aggregates(agg, state):
+    try:
+        # le righe confermate mentre scarichiamo l'export possono andare perse: è una finestra di pochi secondi, una volta sola;
+        # bootstrap() scarta le medie parziali accumulate da add_rows() prima di ripartire dall'export
+        agg.bootstrap(fetch_all_rows())
+        print("[aggregates] bootstrapped:", agg.snapshot(), file=sys.stderr)
+        failures = 0
+    except Exception as e:
+        failures = state["failures"] + 1
+        print("[aggregates][ERROR] bootstrap failed:", e, file=sys.stderr)
+    with state["lock"]:
+        state["running"] = False
+        state["failures"] = failures
+        state["next_try"] = time.monotonic() + min(BOOTSTRAP_RETRY[1], BOOTSTRAP_RETRY[0] * 2 ** (failures - 1)) if failures else 0.0
+
+def ensure_bootstrap(agg):
+    """Avvia in background il bootstrap delle medie locali se manca; dopo un errore riprova con backoff."""
+    if agg.bootstrapped:
+        return
+    state = _bootstrap_state()
+    with state["lock"]:
+        if state["running"] or time.monotonic() < state["next_try"]:
+            return
+        state["running"] = True
+    threading.Thread(target=_bootstrap_aggregates, args=(agg, state), daemon=True).start()
+
+@st.cache_resource
+def get_aggregates():
+    """Medie per ruolo tenute in locale (SQLite), aggiornate a ogni invio confermato."""
+    agg = RoleAggregates(secret("AGGREGATES_PATH", str(Path(__file__).parent / "aggregates.sqlite3")))
+    ensure_bootstrap(agg)
+    return agg
+
+@st.cache_resource
+def get_export():
+    """Export colonnare per le analisi (export.py), aggiornato a ogni invio confermato; None se EXPORT_PATH non è impostato."""
+    path = secret("EXPORT_PATH")
+    return ColumnarExport(path) if path else None
+
+@st.cache_resource
+def get_writer():
+    """Coda write-behind condivisa da tutte le sessioni, appoggiata all'outbox SQLite locale."""
+    path = secret("OUTBOX_PATH", str(Path(__file__).parent / "outbox.sqlite3"))
+    agg, exp = get_aggregates(), get_export()
+
+    def on_sent(rows, replaced):
+        agg.add_rows(rows, replaced)
+        if exp is not None:
+            exp.append(rows)
+
+    return WriteBehindQueue(post_rows, Outbox(path), on_sent=on_sent, upsert=upsert_row, maybe_sent=maybe_sent)
+
+def save_row(submission_id, role, co2_devices, co2_ewaste, co2_ai, co2_digital, co2_total, timestamp=None, answers=None,
+             factors_version=None):
+    """
+    Salva la riga nell'outbox e ritorna subito: l'invio a Sheet.best avviene in background.
+    Salvare di nuovo con lo stesso submission_id aggiorna la riga invece di aggiungerne una.
+    """
+    row = build_row(submission_id, role, co2_devices, co2_ewaste, co2_ai, co2_digital, co2_total, timestamp, answers,
+                    factors_version)
+    get_writer().put(row, key=submission_id)
 
 def _to_float(x):
     # Converte "310,2" o "310.2" in float, gestisce None
@@ -58,19 +253,25 @@ def _to_float(x):
         return None
 
 def fetch_role_stats():
-    """Legge il tab 'Stats' via Sheet.best: [{'Role':'Student','AvgCO2':'297.3','Count':'42'}, ...]."""
-    if not API_URL_STATS:
-        return []
-    r = requests.get(API_URL_STATS, timeout=10)
-    r.raise_for_status()
-    return r.json() or []
+    """Medie per ruolo dal backend (su Sheet.best il tab 'Stats'): [{'Role':'Student','AvgCO2':'297.3','Count':'42'}, ...]."""
+    # con il circuito aperto fallisce subito (CircuitOpen) invece di aspettare il timeout
+    return get_breakers()["read"].call(get_storage().fetch_stats)
+
+@st.cache_resource
+def get_stats_cache():
+    """Cache del tab 'Stats' condivisa da tutte le sessioni: una richiesta per TTL, non una per render."""
+    return TTLCache(fetch_role_stats, ttl=float(secret("STATS_TTL_SECONDS", 60)), name="stats")
 
 def get_avg_for_role_from_stats(role: str):
     """Ritorna (avg, count) per il ruolo dal tab 'Stats', oppure (None, None) se non disponibile."""
+    cache = get_stats_cache()
     try:
-        rows = fetch_role_stats()
+        rows = cache.get()
     except Exception:
-        return None, None
+        # servizio giù o circuito aperto: ultime Stats note, se ci sono (altrimenti medie statiche)
+        rows = cache.peek()
+        if rows is None:
+            return None, None
     role = (role or "").strip()
     for row in rows:
         if (row.get("Role") or "").strip() == role:
@@ -79,6 +280,28 @@ def get_avg_for_role_from_stats(role: str):
             return avg, cnt
     return None, None
 
+def prefetch_role_stats():
+    """
+    Chiamata appena il ruolo è scelto nell'intro: avvia in background il bootstrap delle medie
+    locali o il caricamento del tab 'Stats' nella cache condivisa, così la pagina dei risultati
+    li trova già pronti. Se un bootstrap precedente è fallito lo ritenta (con backoff).
+    Non serve tenere il Future: get_avg_for_role() passa dalla stessa cache, che aspetta il refresh in corso.
+    """
+    agg = get_aggregates()
+    if agg.bootstrapped:
+        return
+    ensure_bootstrap(agg)
+    get_stats_cache().prefetch()
+
+def get_avg_for_role(role: str):
+    """(avg, count) per il ruolo: dalle medie locali (O(1), senza rete) se già inizializzate, altrimenti dal tab 'Stats'."""
+    agg = get_aggregates()
+    if agg.bootstrapped:
+        avg, cnt, _ = agg.get(role)
+        return avg, cnt
+    # se il prefetch dell'intro è ancora in corso, get() aspetta quella stessa richiesta
+    return get_avg_for_role_from_stats(role)
+
 
 st.set_page_config(page_title="Digital Carbon Footprint Calculator", layout="wide")
 
@@ -90,110 +313,15 @@ if "role" not in st.session_state:
 if "device_inputs" not in st.session_state:
     st.session_state.device_inputs = {}
 if "results" not in st.session_state:
-    st.session_state.results = {}
+    st.session_state.results = None  # results.Results, calcolato al Next di show_main
+if "answer_code" not in st.session_state:
+    st.session_state.answer_code = None  # risposte codificate (answer_codec), anche queste al Next
 if "archetype_guess" not in st.session_state:
     st.session_state.archetype_ = None
-
-activity_factors = {
-    "Student": {
-        "MS Office (e.g. Excel, Word, PPT, Outlook…)": 0.00901,
-        "Technical softwares (e.g. Matlab, Python…)": 0.00901,
-        "Web browsing": 0.0264,
-        "Watching lecture recordings": 0.0439,
-        "Online classes streaming or video call": 0.112,
-        "Reading study materials on your computer (e.g. slides, articles, digital textbooks)": 0.004352
-    },
-    "Professor": {
-        "MS Office (e.g. Excel, Word, PPT, Outlook…)": 0.00901,
-        "Web browsing": 0.0264,
-        "Videocall (e.g. Zoom, Teams…)": 0.112,
-        "Online classes streaming": 0.112,
-        "Reading materials on your computer (e.g. slides, articles, digital textbooks)": 0.004352,
-        "Technical softwares (e.g. Matlab, Python…)": 0.00901
-    },
-    "Staff Member": {
-        "MS Office (e.g. Excel, Word, PPT, Outlook…)": 0.00901,
-        "Management software (e.g. SAP)": 0.00901,
-        "Web browsing": 0.0264,
-        "Videocall (e.g. Zoom, Teams…)": 0.112,
-        "Reading materials on your computer (e.g. documents)": 0.004352
-    }
-}
-
-ai_factors = {
-    "Summarize texts or articles": 0.000711936,
-    "Translate sentences or texts": 0.000363008,
-    "Explain a concept": 0.000310784,
-    "Generate quizzes or questions": 0.000539136,
-    "Write formal emails or messages": 0.000107776,
-    "Correct grammar or style": 0.000107776,
-    "Analyze long PDF documents": 0.001412608,
-    "Write or test code": 0.002337024,
-    "Generate images": 0.00206,
-    "Brainstorm for thesis or projects": 0.000310784,
-    "Explain code step-by-step": 0.003542528,
-    "Prepare lessons or presentations": 0.000539136
-}
-
-device_ef = {
-    "Desktop Computer": 296,
-    "Laptop Computer": 170,
-    "Smartphone": 38.4,
-    "Tablet": 87.1,
-    "External Monitor": 235,
-    "Headphones": 10.22,
-    "Printer": 62.3,
-    "Home Router/Modem": 106,
-    "Maxi-screen": 1320,
-    "Projector": 145,
-    
-}
-
-eol_modifier = {
-    "I bring it to a certified e-waste collection center": -0.224,
-    "I throw it away in general waste": 0.611,
-    "I return it to manufacturer for recycling or reuse": -0.3665,
-    "I sell or donate it to someone else": -0.445,
-    "I store it at home, unused": 0.402,
-    "Device provided by the university, I return it after use": -0.089,
-}
-
-DEFAULT_LIFESPAN = {
-    "Desktop Computer": 6,
-    "Laptop Computer": 5,
-    "Smartphone": 3,
-    "Tablet": 4,
-    "External Monitor": 8,
-    "Headphones": 3,
-    "Printer": 7,
-    "Home Router/Modem": 8,
-    "Maxi-screen": 8,
-    "Projector": 8,
-}
-
-
-DAYS = 250  # Typical number of work/study days per year
-
-
-emails = {
-    "-- Select option --": 0,
-    "0": 0,
-    "1–10": 5,
-    "11–20": 15,
-    "21–30": 25,
-    "31–40": 35,
-    "41–80": 60, 
-    "81–100": 90, 
-    ">100": 150,
-}
-cloud_gb = {
-    "-- Select option --": 0,
-    "<5GB": 2.5,
-    "5–20GB": 12.5,
-    "20–50GB": 35,
-    "50–100GB": 75,
-    "100–200GB": 150,
-}
+if "submission_id" not in st.session_state:
+    # l'ID sta solo nella sessione (che sopravvive ai reconnect), mai nell'URL: chi apre
+    # un link copiato o condiviso sovrascriverebbe la riga di un altro
+    st.session_state.submission_id = uuid.uuid4().hex
 
 ARCHETYPES = [
     {
@@ -228,44 +356,35 @@ AVERAGE_CO2_BY_ROLE = {
     "Staff Member": 309,
 }
 
-# INTRO PAGE 
-
-def show_intro():
-    scroll_top()
-    st.markdown("""
-        <style>
-        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600&display=swap');
+ROLE_PLURAL = {
+    "Student": "students",
+    "Professor": "professors",
+    "Staff Member": "staff members",
+}
 
-        html, body, [class*="css"] {
-            font-family: 'Inter', sans-serif;
-        }
+MIN_SAMPLES = 10  # sotto questa soglia medie e percentili dinamici non vengono mostrati
 
-        h1, h2, h3, h4 {
-            color: #1d3557;
-        }
+def _ordinal(n):
+    n = int(n)
+    suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
 
-        .intro-box {
-            background: linear-gradient(to right, #d8f3dc, #a8dadc);
-            padding: 40px 25px;
-            border-radius: 15px;
-            text-align: center;
-            box-shadow: 0 4px 18px rgba(0,0,0,0.06);
-            margin-bottom: 30px;
-        }
+def percentile_label(role, value, category="CO2 Total"):
+    """'63rd percentile' per il valore tra i rispondenti del ruolo, oppure None se i dati sono pochi o non ancora inizializzati."""
+    agg = get_aggregates()
+    if not agg.bootstrapped:
+        # prima del bootstrap il t-digest ha solo le righe inviate da questo processo
+        return None
+    pct, n = agg.percentile(role, value, category)
+    if pct is None or n < MIN_SAMPLES:
+        return None
+    return f"{_ordinal(min(99, max(1, round(pct))))} percentile"
 
-        .selectbox-container {
-            background-color: #f1faee;
-            border-left: 5px solid #52b788;
-            border-radius: 10px;
-            padding: 20px;
-            margin-top: 25px;
-        }
+# INTRO PAGE 
 
-        .start-button {
-            margin-top: 20px;
-        }
-        </style>
-    """, unsafe_allow_html=True)
+def show_intro():
+    scroll_top()
+    st.markdown(FONT_CSS, unsafe_allow_html=True)
 
     # --- HERO INTUITIVO
     st.markdown("""
@@ -296,8 +415,8 @@ def show_intro():
         # Logo grande che occupa lo spazio a destra
         box = st.container()
         with box:
-            st.image("logo.png", width=300)  # <-- niente <img>, funziona anche con repo privata
-            st.image("logo2.png", width=300)
+            st.image(image_src("logo.png", 300), width=300)  # <-- niente <img>, funziona anche con repo privata
+            st.image(image_src("logo2.png", 300), width=300)
 
     st.divider()  # linea continua a tutta larghezza
 
@@ -310,6 +429,9 @@ def show_intro():
             "What is your role in academia?",
             ["", "Student", "Professor", "Staff Member"]
         )
+    if st.session_state.role:
+        # le statistiche servono solo nei risultati, ma le chiediamo subito (in background)
+        prefetch_role_stats()
 
     # --- INPUT NOME ---
     st.session_state.name = st.text_input("What is your name?")
@@ -335,127 +457,303 @@ def show_intro():
 
 
 # MAIN PAGE
-def show_main():
-    scroll_top()
+# Ogni card device, le attività e l'AI sono frammenti (st.fragment): un'interazione
+# riesegue solo il proprio frammento, che salva in sessione la sua parte di risposta;
+# show_main le rimette insieme e calcola i totali solo al Next.
+def rerun_fragment():
+    """st.rerun del solo frammento; se il frammento gira dentro un rerun completo, rerun completo."""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+@st.fragment
+def device_card(device_id):
+    """Card di un device: una modifica riesegue solo questa card (Remove ricarica la pagina)."""
+    base_device = device_id.rsplit("_", 1)[0]
+    prev = st.session_state.device_inputs[device_id]
+    is_open = st.session_state.device_expanders.get(device_id, True)
+    token = st.session_state.expander_tokens.get(device_id, 0)
+
+    # Cambiamo l’etichetta SOLO quando vogliamo forzare la chiusura
+    suffix = "" if is_open else ("\u200B" * (token + 1))
+    label = f"{base_device}{suffix}"
+
+    with st.expander(label, expanded=is_open):
+        col1, col2, col3, col4 = st.columns(4)
+
+        with col1:
+            st.markdown("""
+                <div style='margin-bottom:-20px'>
+                    <strong>Ownership</strong><br/>
+                    <span style='font-size:12px; color:gray'>Is this device used only by you or shared?</span>
+                </div>
+            """, unsafe_allow_html=True)
+            shared_options = ["-- Select --", "Personal", "Shared with family", "Shared in university"]
+            shared_index = shared_options.index(prev["shared"]) if prev["shared"] in shared_options else 0
+            shared = st.selectbox("", shared_options, index=shared_index, key=f"{device_id}_shared")
+
+        with col2:
+            st.markdown("""
+                <div style='margin-bottom:-20px'>
+                    <strong>Condition</strong><br/>
+                    <span style='font-size:12px; color:gray'>Was the device new or used when you got it?</span>
+                </div>
+            """, unsafe_allow_html=True)
+            used_options = ["-- Select --", "New", "Used"]
+            used_index = used_options.index(prev["used"]) if prev["used"] in used_options else 0
+            used = st.selectbox("", used_options, index=used_index, key=f"{device_id}_used")
+
+        with col3:
+            st.markdown(f"""
+                <div style='margin-bottom:-20px'>
+                    <div class="label-with-tooltip">
+                        <strong>Device's lifespan</strong>
+                        <div class="info-icon">i
+                            <div class="tooltip-text">
+                                <b>Example:</b> if you have had a phone for 2 years and expect to keep it for 3 more, enter 5. 
+                                If the device was purchased second-hand, only count your own usage period, not the years used by the previous owner.
+                            </div>
+                        </div>
+                    </div>
+                    <span style='font-size:12px; color:gray'>
+                        How many years you plan to use the device in total
+                    </span>
+                </div>
+            """, unsafe_allow_html=True)
+
+            # chiave di stato per il toggle "I don't know"
+            idk_key = f"{device_id}_idk"
+            years_key = f"{device_id}_years"
+            avg_years = get_factors().default_lifespan(base_device)
+
+            # Inizializza lo stato se non presente
+            if idk_key not in st.session_state:
+                st.session_state[idk_key] = False
+
+            # Se "I don't know" è attivo, forza il valore medio e disabilita l'input
+            if st.session_state[idk_key]:
+                st.session_state[years_key] = float(avg_years)
+                years = st.number_input(
+                    "",
+                    0.5,
+                    20.0,
+                    step=0.5,
+                    format="%.1f",
+                    key=years_key,
+                    disabled=True
+                )
+            else:
+                years = st.number_input(
+                    "",
+                    0.5,
+                    20.0,
+                    step=0.5,
+                    format="%.1f",
+                    key=years_key
+                )
+
+            # --- "I don't know" toggle ---
+            prev_state = st.session_state.get(idk_key, False)
+            is_idk = st.checkbox(
+                "I don’t know",
+                value=prev_state,
+                key=f"idk_checkbox_{device_id}",
+                 help="If you select this option, the average lifespan of the device will be considered.",
+                label_visibility="visible"
+            )
 
+            if is_idk != prev_state:
+                st.session_state[idk_key] = is_idk
+                rerun_fragment()
+            else:
+                st.session_state[idk_key] = is_idk
+
+        
+        with col4:
+            st.markdown("""
+                <div style='margin-bottom:-20px'>
+                    <strong>End-of-life behavior</strong><br/>
+                    <span style='font-size:12px; color:gray'>What do you usually do when the device reaches its end of life?</span>
+                </div>
+            """, unsafe_allow_html=True)
+            role_curr = st.session_state.get("role", "")
+            all_eol = EOL_OPTIONS[1:]
+            # Filtra la nuova opzione per gli studenti
+            filtered_eol = [
+                k for k in all_eol
+                if (role_curr in ["Professor", "Staff Member"]) or (k != "Device provided by the university, I return it after use")
+            ]
+            eol_options = ["-- Select --"] + filtered_eol               
+            eol_index = eol_options.index(prev["eol"]) if prev["eol"] in eol_options else 0
+            eol = st.selectbox("", eol_options, index=eol_index, key=f"{device_id}_eol")
+
+        # --- risposta del device ---
+        # anni arrotondati come nel codice salvato (si può scrivere anche 2.345)
+        st.session_state.device_answers[device_id] = {
+            "type": base_device, "years": quantize_years(years), "used": used, "shared": shared, "eol": eol,
+        }
+
+        col_remove, _, col_confirm = st.columns([1, 8, 1])
+
+        with col_remove:
+            if st.button(f"🗑 Remove", key=f"remove_{device_id}"):
+                st.session_state.device_list.remove(device_id)
+                st.session_state.device_inputs.pop(device_id, None)
+                st.session_state.device_expanders.pop(device_id, None)
+                st.session_state.expander_tokens.pop(device_id, None)  # NEW
+                st.session_state.device_answers.pop(device_id, None)
+                st.rerun()
+
+        with col_confirm:
+            confirm_key = f"confirm_{device_id}"
+            if st.button("✅ Confirm", key=confirm_key):
+                if "-- Select --" in [used, shared, eol]:
+                    st.warning("Please complete all fields before confirming.")
+                else:
+                    st.session_state.device_inputs[device_id] = {
+                        "years": years, "used": used, "shared": shared, "eol": eol
+                    }
+                    # Forza CHIUSURA e RE-MOUNT alla prossima esecuzione
+                    st.session_state.device_expanders[device_id] = False
+                    st.session_state.expander_tokens[device_id] = st.session_state.expander_tokens.get(device_id, 0) + 1
+                    rerun_fragment()
+
+
+@st.fragment
+def activities_section():
+    """Digital Activities: ore per attività, email, cloud, Wi-Fi, stampa e idle, con il loro totale parziale."""
     st.markdown("""
-    <style>
-    .label-with-tooltip {
-        display: flex;
-        align-items: center;
-        gap: 6px;
-    }
-    .info-icon {
-        display: inline-block;
-        width: 22px;
-        height: 22px;
-        border-radius: 50%;
-        background: #457b9d; /* blu elegante */
-        color: #fff;
-        font-weight: 700;
-        font-size: 14px;
-        line-height: 22px;
-        text-align: center;
-        cursor: default;
-        position: relative;
-        transition: all 0.2s ease-in-out;
-        box-shadow: 0 2px 6px rgba(0,0,0,0.15);
-        margin-left: 6px;
-    }
-    .info-icon:hover {
-        background: #1d3557; /* più scuro in hover */
-        box-shadow: 0 4px 10px rgba(0,0,0,0.25);
-    }
-    .info-icon .tooltip-text {
-        visibility: hidden;
-        opacity: 0;
-        position: absolute;
-        top: 120%;
-        left: 50%;
-        transform: translateX(-50%);
-        background: #1d3557;
-        color: #fff;
-        border-radius: 10px;
-        padding: 10px 12px;
-        font-size: 13px;
-        line-height: 1.45;
-        width: 360px !important;           
-        max-width: min(90vw, 420px) !important;
-        white-space: normal !important;        
-        word-break: break-word;               
-        box-shadow: 0 8px 24px rgba(0,0,0,.15);
-        transition: opacity .15s ease-in-out;
-        z-index: 9999;
-        text-align: left;
-        font-weight: 400;
-    }
-    .info-icon:hover .tooltip-text {
-        visibility: visible;
-        opacity: 1;
-    }
-    .info-icon .tooltip-text::after {
-        content: "";
-        position: absolute;
-        top: -6px;
-        left: 50%;
-        transform: translateX(-50%);
-        border-width: 6px;
-        border-style: solid;
-        border-color: transparent transparent #1d3557 transparent;
-    }
-    </style>
+        <h3 style="margin-top: 25px; color:#1d3557;">🔌 Digital Activities</h3>
+        <p>
+            Estimate how many hours per day you spend on each activity during a typical 8-hour study or work day.
+            <br>
+            <b style="color: #40916c;">You may exceed 8 hours if multitasking</b> 
+            <span style="color: #495057;">(e.g., watching a lecture while writing notes).</span>
+        </p>
     """, unsafe_allow_html=True)
 
-    st.markdown(f"""
-    <div style="
-        background: linear-gradient(to right, #d8f3dc, #a8dadc);
-        padding: 25px 20px;
-        border-radius: 12px;
-        box-shadow: 0 4px 18px rgba(0,0,0,0.06);
-        text-align: center;
-        margin-bottom: 20px;
-    ">
-        <h1 style="font-size: 2.2em; color:#1d3557; margin-bottom: 0;">
-            Hello <b>{st.session_state.name}</b>, it’s time to uncover the impact of your digital world! 🚀
-        </h1>
-    </div>
-""", unsafe_allow_html=True)
+    role = st.session_state.role
+    ore_dict = {}
+    col1, col2 = st.columns(2)
+
+    # Sliders con -- Select --
+    for i, act in enumerate(ROLE_ACTIVITIES[role]):
+        with (col1 if i % 2 == 0 else col2):
+            ore = st.slider(
+                f"{act} (h/day)",
+                min_value=0.0,
+                max_value=8.0,
+                value=0.0,
+                step=0.5,
+                key=f"slider_{act}"
+            )
+            ore_dict[act] = ore
 
+    total_hours_raw = sum(ore_dict.values())
+    warn_color = "#B58900"  # giallo scuro
+    color = "#6EA8FE" if total_hours_raw <= 8 else warn_color
 
-    st.markdown(f"""
-        <p style="font-size: 1em; color: #6c757d; margin-top: -8px;">
-            First, we’ll ask you a few quick questions about your studying/working habits. This will take less than <b>5 minutes</b>.
+    # Riga totale ore (con colore condizionale)
+    st.markdown(
+        f"<div style='text-align:right; font-size:0.9rem; color:{color}; margin-top:-6px;'>"
+        f"Total: <b>{total_hours_raw:.1f}</b> h/day</div>",
+        unsafe_allow_html=True
+    )
+
+    # Nota esplicativa se supera 8h
+    if total_hours_raw > 8:
+        st.markdown(
+            "<div style='text-align:right; font-size:0.85rem; color:#B58900; margin-top:-8px;'>"
+            "Overlapping activities can push the total above 8 hours.</div>",
+            unsafe_allow_html=True
+        )
+
+    # Parte 2: Email, cloud, printing, connectivity
+    st.markdown("""
+        <hr style="margin-top: 30px; margin-bottom: 20px;">
+        <p style="font-size: 17px; line-height: 1.5;">
+            Now tell us more about your habits related to <b style="color: #40916c;">email, cloud, printing and connectivity</b>.
+        </p>
+        <p style="font-size: 13px; color: gray; margin-top: 8px;">
+            How many study or work emails do you send or receive in a typical 8-hour day? 
+            Please do not count spam messages.
         </p>
     """, unsafe_allow_html=True)
 
+    email_opts = ["-- Select option --", "0", "1–10", "11–20", "21–30", "31–40", "41–80", "81–100", ">100"]
+    cloud_opts = ["-- Select option --", "<5GB", "5–20GB", "20–50GB", "50–100GB", "100–200GB"]
+
+
+    email_col1, email_col2 = st.columns(2)
+
+    with email_col1:
+        email_plain = st.selectbox("Emails (no attachments)", email_opts, index=0, key="email_plain")
+
+    with email_col2:
+        email_attach = st.selectbox("Emails (with attachments)", email_opts, index=0, key="email_attach")
+
+    cloud = st.selectbox("Cloud storage you currently use for academic or work-related files (e.g., on iCloud, Google Drive, OneDrive)", cloud_opts, index=0, key="cloud")
+
+    wifi = st.slider("Estimate your daily Wi-Fi connection time during a typical 8-hour study or work day, including hours when you're not actively using your device (e.g., background apps, idle mode)", 0.0, 8.0, 4.0, 0.5, key="wifi")
+    pages = st.number_input("Printed pages per week", 0, 100, 0, key="pages")
+
+    idle = st.radio("Do you turn off your computer at the end of the workday, or leave it on standby?", ["I turn it off", "I leave it on (idle mode)", "I don’t have a computer"],
+    key="idle")
+
+    st.session_state.activity_answer = {
+        "role": role, "hours": ore_dict, "email_plain": email_plain, "email_attach": email_attach,
+        "cloud": cloud, "wifi": wifi, "pages": pages, "idle": idle,
+    }
+
+
+@st.fragment
+def ai_section():
+    """AI Tools: query giornaliere per task."""
     st.markdown("""
-    <h3 style="margin-top: 25px; color:#1d3557;">💻 Devices & E-Waste</h3>
+    <h3 style="margin-top: 25px; color:#1d3557;">🦾 AI Tools</h3>
     <p>
-        Please select only the digital devices you use for <b>study or work</b>. Example: If you own a personal smartphone and a work smartphone, include <b>only the one used for study or work</b>. 
+        Estimate how many queries you make for each AI-powered task on a typical 8-hour study/working day.
+        As a reference, users submit approximately 15 to 20 queries during a half-hour interaction with an AI assistant.
     </p>
     """, unsafe_allow_html=True)
 
+    ai_queries = {}
+    cols = st.columns(4)
 
-    # --- STATE INIT ---
-    if "device_list" not in st.session_state:
-        st.session_state.device_list = []
-    if "device_expanders" not in st.session_state:
-        st.session_state.device_expanders = {}
-    if "device_inputs" not in st.session_state:
-        st.session_state.device_inputs = {}
-    # NEW: token per expander per forzare re-mount alla conferma
-    if "expander_tokens" not in st.session_state:
-        st.session_state.expander_tokens = {}
+    for i, task in enumerate(AI_TASKS):
+        with cols[i % 4]:
+            st.markdown(f"""
+            <div style='margin-bottom: 12px;'>
+                <div style='
+                    font-weight: 600;
+                    font-size: 15px;
+                    color: #1d3557;
+                    margin-bottom: 6px;
+                '>
+                    {task}
+                </div>
+            """, unsafe_allow_html=True)
 
-    # --- Device picker più chiaro (quantità per tipo) ---
-    st.markdown("""
-        <style>
-        .chips{margin:.25rem 0 .5rem}
-        .chip{display:inline-block;background:#f1faee;border:1px solid #e6ebe9;border-radius:999px;
-              padding:4px 10px;margin:4px 6px 0 0;font-size:.85rem;color:#1b4332}
-        </style>
-    """, unsafe_allow_html=True)
+            q = st.number_input(
+                label="",
+                min_value=0,
+                max_value=10000,
+                value=0,
+                step=5,
+                key=task,
+                label_visibility="collapsed"
+            )
+            ai_queries[task] = q
+
+            st.markdown("</div>", unsafe_allow_html=True)
 
+    st.session_state.ai_answer = {"role": st.session_state.role, "ai": ai_queries}
+
+
+def device_cards():
+    """Device come card: picker delle quantità (max 10 per tipo), riepilogo e una card per device."""
+    # --- Device picker più chiaro (quantità per tipo) ---
     device_emoji = {
         "Desktop Computer": "🖥️", "Laptop Computer": "💻", "Smartphone": "📱", "Tablet": "📲",
         "External Monitor": "🖥️", "Headphones": "🎧", "Printer": "🖨️", "Home Router/Modem": "🛜", "Projector": "📽️", "Maxi-screen": "📺"
@@ -467,11 +765,11 @@ def show_main():
     role_curr = st.session_state.get("role", "")
     if role_curr == "Student":
         # Gli studenti non vedono Maxi-screen e Projector
-        types = [d for d in device_ef.keys() if d not in ["Maxi-screen", "Projector"]]
+        types = [d for d in DEVICE_TYPES if d not in ["Maxi-screen", "Projector"]]
         num_cols = 4
     else:
         # Professor o Staff Member vedono tutti i device
-        types = list(device_ef.keys())
+        types = list(DEVICE_TYPES)
         num_cols = 5
 
     # memorizza le quantità precedenti per rilevare cambi (no bottone)
@@ -545,6 +843,7 @@ def show_main():
                 st.session_state.device_inputs.pop(rid, None)
                 st.session_state.device_expanders.pop(rid, None)
                 st.session_state.expander_tokens.pop(rid, None)
+                st.session_state.device_answers.pop(rid, None)
             changed_any = True
 
         # aggiorna il "precedente" per questo tipo
@@ -565,368 +864,115 @@ def show_main():
         st.markdown(f"<div class='chips'>{chips}</div>", unsafe_allow_html=True)
 
 
-    total_prod, total_eol = 0, 0
-
     for device_id in st.session_state.device_list:
-        base_device = device_id.rsplit("_", 1)[0]
-        prev = st.session_state.device_inputs[device_id]
-        is_open = st.session_state.device_expanders.get(device_id, True)
-        token = st.session_state.expander_tokens.get(device_id, 0)
-
-        # Cambiamo l’etichetta SOLO quando vogliamo forzare la chiusura
-        suffix = "" if is_open else ("\u200B" * (token + 1))
-        label = f"{base_device}{suffix}"
-
-        with st.expander(label, expanded=is_open):
-            col1, col2, col3, col4 = st.columns(4)
-
-            with col1:
-                st.markdown("""
-                    <div style='margin-bottom:-20px'>
-                        <strong>Ownership</strong><br/>
-                        <span style='font-size:12px; color:gray'>Is this device used only by you or shared?</span>
-                    </div>
-                """, unsafe_allow_html=True)
-                shared_options = ["-- Select --", "Personal", "Shared with family", "Shared in university"]
-                shared_index = shared_options.index(prev["shared"]) if prev["shared"] in shared_options else 0
-                shared = st.selectbox("", shared_options, index=shared_index, key=f"{device_id}_shared")
-
-            with col2:
-                st.markdown("""
-                    <div style='margin-bottom:-20px'>
-                        <strong>Condition</strong><br/>
-                        <span style='font-size:12px; color:gray'>Was the device new or used when you got it?</span>
-                    </div>
-                """, unsafe_allow_html=True)
-                used_options = ["-- Select --", "New", "Used"]
-                used_index = used_options.index(prev["used"]) if prev["used"] in used_options else 0
-                used = st.selectbox("", used_options, index=used_index, key=f"{device_id}_used")
-
-            with col3:
-                st.markdown(f"""
-                    <div style='margin-bottom:-20px'>
-                        <div class="label-with-tooltip">
-                            <strong>Device's lifespan</strong>
-                            <div class="info-icon">i
-                                <div class="tooltip-text">
-                                    <b>Example:</b> if you have had a phone for 2 years and expect to keep it for 3 more, enter 5. 
-                                    If the device was purchased second-hand, only count your own usage period, not the years used by the previous owner.
-                                </div>
-                            </div>
-                        </div>
-                        <span style='font-size:12px; color:gray'>
-                            How many years you plan to use the device in total
-                        </span>
-                    </div>
-                """, unsafe_allow_html=True)
-
-                # chiave di stato per il toggle "I don't know"
-                idk_key = f"{device_id}_idk"
-                years_key = f"{device_id}_years"
-                avg_years = DEFAULT_LIFESPAN.get(base_device, 5)
-
-                # Inizializza lo stato se non presente
-                if idk_key not in st.session_state:
-                    st.session_state[idk_key] = False
-
-                # Se "I don't know" è attivo, forza il valore medio e disabilita l'input
-                if st.session_state[idk_key]:
-                    st.session_state[years_key] = float(avg_years)
-                    years = st.number_input(
-                        "",
-                        0.5,
-                        20.0,
-                        step=0.5,
-                        format="%.1f",
-                        key=years_key,
-                        disabled=True
-                    )
-                else:
-                    years = st.number_input(
-                        "",
-                        0.5,
-                        20.0,
-                        step=0.5,
-                        format="%.1f",
-                        key=years_key
-                    )
-
-                # --- "I don't know" single-radio style toggle ---
-                st.markdown("""
-                    <style>
-                    .radio-like input[type=checkbox] {
-                        appearance: none;
-                        -webkit-appearance: none;
-                        width: 16px;
-                        height: 16px;
-                        border-radius: 50%;
-                        border: 2px solid #999;
-                        outline: none;
-                        cursor: pointer;
-                        vertical-align: middle;
-                        margin-right: 6px;
-                    }
-                    .radio-like input[type=checkbox]:checked {
-                        background-color: #6c757d;
-                        border-color: #6c757d;
-                    }
-                    .radio-like label {
-                        cursor: pointer;
-                        font-size: 14px;
-                    }
-                    </style>
-                """, unsafe_allow_html=True)
-
-
-                prev_state = st.session_state.get(idk_key, False)
-                is_idk = st.checkbox(
-                    "I don’t know",
-                    value=prev_state,
-                    key=f"idk_checkbox_{device_id}",
-                     help="If you select this option, the average lifespan of the device will be considered.",
-                    label_visibility="visible"
-                )
-
-                if is_idk != prev_state:
-                    st.session_state[idk_key] = is_idk
-                    st.rerun()
-                else:
-                    st.session_state[idk_key] = is_idk
-
-            
-            with col4:
-                st.markdown("""
-                    <div style='margin-bottom:-20px'>
-                        <strong>End-of-life behavior</strong><br/>
-                        <span style='font-size:12px; color:gray'>What do you usually do when the device reaches its end of life?</span>
-                    </div>
-                """, unsafe_allow_html=True)
-                role_curr = st.session_state.get("role", "")
-                all_eol = list(eol_modifier.keys())
-                # Filtra la nuova opzione per gli studenti
-                filtered_eol = [
-                    k for k in all_eol
-                    if (role_curr in ["Professor", "Staff Member"]) or (k != "Device provided by the university, I return it after use")
-                ]
-                eol_options = ["-- Select --"] + filtered_eol               
-                eol_index = eol_options.index(prev["eol"]) if prev["eol"] in eol_options else 0
-                eol = st.selectbox("", eol_options, index=eol_index, key=f"{device_id}_eol")
-
-            # --- calcoli (immutati) ---
-            impact = device_ef.get(base_device, 0)
-            if used == "New" and shared == "Personal":
-                adj_years = years
-            elif used == "Used" and shared == "Personal":
-                adj_years = years + (years / 2)
-
-            elif used == "New" and shared == "Shared with family":
-                adj_years = years * 3
-            elif used == "Used" and shared == "Shared with family":
-                adj_years = years * 4.5
-
-            elif used == "New" and shared == "Shared in university":
-                adj_years = years * 10
-            elif used == "Used" and shared == "Shared in university":
-                adj_years = years * 15  # 10 * 1.5 (come proporzione coerente)
-
-            else:
-                adj_years = years
-
-
-            eol_mod = eol_modifier.get(eol, 0)
-            prod_per_year = impact / adj_years if adj_years else 0
-            eol_impact = (impact * eol_mod) / adj_years if adj_years else 0
-            total_prod += prod_per_year
-            total_eol += eol_impact
-
-            col_remove, _, col_confirm = st.columns([1, 8, 1])
-
-            with col_remove:
-                if st.button(f"🗑 Remove", key=f"remove_{device_id}"):
-                    st.session_state.device_list.remove(device_id)
-                    st.session_state.device_inputs.pop(device_id, None)
-                    st.session_state.device_expanders.pop(device_id, None)
-                    st.session_state.expander_tokens.pop(device_id, None)  # NEW
-                    st.rerun()
-
-            with col_confirm:
-                confirm_key = f"confirm_{device_id}"
-                if st.button("✅ Confirm", key=confirm_key):
-                    if "-- Select --" in [used, shared, eol]:
-                        st.warning("Please complete all fields before confirming.")
-                    else:
-                        st.session_state.device_inputs[device_id] = {
-                            "years": years, "used": used, "shared": shared, "eol": eol
-                        }
-                        # Forza CHIUSURA e RE-MOUNT alla prossima esecuzione
-                        st.session_state.device_expanders[device_id] = False
-                        st.session_state.expander_tokens[device_id] = st.session_state.expander_tokens.get(device_id, 0) + 1
-                        st.rerun()
+        device_card(device_id)
 
 
-
-    # === DIGITAL ACTIVITIES ===
-
-    st.markdown("""
-        <h3 style="margin-top: 25px; color:#1d3557;">🔌 Digital Activities</h3>
-        <p>
-            Estimate how many hours per day you spend on each activity during a typical 8-hour study or work day.
-            <br>
-            <b style="color: #40916c;">You may exceed 8 hours if multitasking</b> 
-            <span style="color: #495057;">(e.g., watching a lecture while writing notes).</span>
-        </p>
-    """, unsafe_allow_html=True)
-
+@st.fragment
+def device_table_section():
+    """Device come tabella: validazione e totali di tutte le righe insieme, ad ogni modifica solo questo frammento."""
+    if "device_table_base" not in st.session_state:
+        # prima apertura: parte dai device già inseriti come card
+        st.session_state.device_table_base = device_table.table_from_devices(
+            [st.session_state.device_answers[d] for d in st.session_state.device_list
+             if d in st.session_state.device_answers]
+        )
     role = st.session_state.role
-    ore_dict = {}
-    hours_total = 0
-    col1, col2 = st.columns(2)
+    types, eols = device_table.options_for(role)
+    table = st.data_editor(
+        st.session_state.device_table_base,
+        key="device_table_editor",
+        num_rows="dynamic",
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "Device": st.column_config.SelectboxColumn(options=types, required=True),
+            "Ownership": st.column_config.SelectboxColumn(
+                options=SHARED_OPTIONS[1:], help="Is this device used only by you or shared?"),
+            "Condition": st.column_config.SelectboxColumn(
+                options=USED_OPTIONS[1:], help="Was the device new or used when you got it?"),
+            "Lifespan (years)": st.column_config.NumberColumn(
+                min_value=device_table.MIN_YEARS, max_value=device_table.MAX_YEARS, step=0.5, format="%.1f",
+                help="How many years you plan to use the device in total"),
+            "I don't know": st.column_config.CheckboxColumn(
+                default=False, help="Use the average lifespan of the device"),
+            "End of life": st.column_config.SelectboxColumn(
+                options=eols, help="What do you usually do when the device reaches its end of life?"),
+        },
+    )
+    chk = device_table.check(table, role, get_factors())
+    if chk.errors and len(table):
+        more = f" (+{len(chk.errors) - 5} more)" if len(chk.errors) > 5 else ""
+        st.caption("⚠️ " + "; ".join(chk.errors[:5]) + more)
+    st.session_state.device_table = (table, chk)
 
-    # Sliders con -- Select --
-    for i, (act, ef) in enumerate(activity_factors[role].items()):
-        with (col1 if i % 2 == 0 else col2):
-            ore = st.slider(
-                f"{act} (h/day)",
-                min_value=0.0,
-                max_value=8.0,
-                value=0.0,
-                step=0.5,
-                key=f"slider_{act}"
-            )
-            ore_dict[act] = ore
 
-    total_hours_raw = sum(ore_dict.values())
-    warn_color = "#B58900"  # giallo scuro
-    color = "#6EA8FE" if total_hours_raw <= 8 else warn_color
+def show_main():
+    scroll_top()
 
-    # Riga totale ore (con colore condizionale)
-    st.markdown(
-        f"<div style='text-align:right; font-size:0.9rem; color:{color}; margin-top:-6px;'>"
-        f"Total: <b>{total_hours_raw:.1f}</b> h/day</div>",
-        unsafe_allow_html=True
-    )
 
-    # Nota esplicativa se supera 8h
-    if total_hours_raw > 8:
-        st.markdown(
-            "<div style='text-align:right; font-size:0.85rem; color:#B58900; margin-top:-8px;'>"
-            "Overlapping activities can push the total above 8 hours.</div>",
-            unsafe_allow_html=True
-        )
+    st.markdown(f"""
+    <div style="
+        background: linear-gradient(to right, #d8f3dc, #a8dadc);
+        padding: 25px 20px;
+        border-radius: 12px;
+        box-shadow: 0 4px 18px rgba(0,0,0,0.06);
+        text-align: center;
+        margin-bottom: 20px;
+    ">
+        <h1 style="font-size: 2.2em; color:#1d3557; margin-bottom: 0;">
+            Hello <b>{st.session_state.name}</b>, it’s time to uncover the impact of your digital world! 🚀
+        </h1>
+    </div>
+""", unsafe_allow_html=True)
 
 
-    
-    for act, ore in ore_dict.items():
-        hours_total += ore * activity_factors[role][act] * DAYS
-    
-    # Parte 2: Email, cloud, printing, connectivity
-    st.markdown("""
-        <hr style="margin-top: 30px; margin-bottom: 20px;">
-        <p style="font-size: 17px; line-height: 1.5;">
-            Now tell us more about your habits related to <b style="color: #40916c;">email, cloud, printing and connectivity</b>.
-        </p>
-        <p style="font-size: 13px; color: gray; margin-top: 8px;">
-            How many study or work emails do you send or receive in a typical 8-hour day? 
-            Please do not count spam messages.
+    st.markdown(f"""
+        <p style="font-size: 1em; color: #6c757d; margin-top: -8px;">
+            First, we’ll ask you a few quick questions about your studying/working habits. This will take less than <b>5 minutes</b>.
         </p>
     """, unsafe_allow_html=True)
 
-    email_opts = ["-- Select option --", "0", "1–10", "11–20", "21–30", "31–40", "41–80", "81–100", ">100"]
-    cloud_opts = ["-- Select option --", "<5GB", "5–20GB", "20–50GB", "50–100GB", "100–200GB"]
-
-
-    email_col1, email_col2 = st.columns(2)
-
-    with email_col1:
-        email_plain = st.selectbox("Emails (no attachments)", email_opts, index=0, key="email_plain")
-
-    with email_col2:
-        email_attach = st.selectbox("Emails (with attachments)", email_opts, index=0, key="email_attach")
-
-    cloud = st.selectbox("Cloud storage you currently use for academic or work-related files (e.g., on iCloud, Google Drive, OneDrive)", cloud_opts, index=0, key="cloud")
-
-    wifi = st.slider("Estimate your daily Wi-Fi connection time during a typical 8-hour study or work day, including hours when you're not actively using your device (e.g., background apps, idle mode)", 0.0, 8.0, 4.0, 0.5, key="wifi")
-    pages = st.number_input("Printed pages per week", 0, 100, 0, key="pages")
-
-    idle = st.radio("Do you turn off your computer at the end of the workday, or leave it on standby?", ["I turn it off", "I leave it on (idle mode)", "I don’t have a computer"],
-    key="idle")
-
-    st.session_state["idle_turns_off"] = (st.session_state.get("idle") == "I turn it off")
-    st.session_state["idle_is_left_on"] = (st.session_state.get("idle") == "I leave it on (idle mode)")
-
-    
-
-
-# --- CALCOLI 
-    em_plain  = emails.get(st.session_state.get("email_plain"), 0)
-    em_attach = emails.get(st.session_state.get("email_attach"), 0)
-    cld = cloud_gb.get(st.session_state.get("cloud"), 0)
-
-    st.session_state["da_em_plain"]   = int(em_plain)
-    st.session_state["da_em_attach"]  = int(em_attach)
-    st.session_state["da_cloud_gb"]   = float(cld)
-    st.session_state["da_pages"] = int(st.session_state.get("pages", 0) or 0)
-
-
-    mail_total = (em_plain * 0.004 + em_attach * 0.035 + cld * 0.01) * DAYS
-    wifi_total  = st.session_state.get("wifi", 4.0) * 0.00584 * DAYS
-    pages = int(st.session_state.get("pages", 0) or 0)
-    print_total = pages * 0.0045 * (DAYS/5)
-
-    idle_val = st.session_state.get("idle")
-    if idle_val == "I leave it on (idle mode)":
-        idle_total = DAYS * 0.0104 * 16
-    elif idle_val == "I turn it off":
-        idle_total = DAYS * 0.0005204 * 16
-    else:
-        idle_total = 0
-
-    digital_total = hours_total + mail_total + wifi_total + print_total + idle_total
-
-
-    # === AI TOOLS ===
     st.markdown("""
-    <h3 style="margin-top: 25px; color:#1d3557;">🦾 AI Tools</h3>
+    <h3 style="margin-top: 25px; color:#1d3557;">💻 Devices & E-Waste</h3>
     <p>
-        Estimate how many queries you make for each AI-powered task on a typical 8-hour study/working day.
-        As a reference, users submit approximately 15 to 20 queries during a half-hour interaction with an AI assistant.
+        Please select only the digital devices you use for <b>study or work</b>. Example: If you own a personal smartphone and a work smartphone, include <b>only the one used for study or work</b>. 
     </p>
     """, unsafe_allow_html=True)
 
-    ai_total = 0
-    ai_queries_count = 0
-    cols = st.columns(4)
-
-    for i, (task, ef) in enumerate(ai_factors.items()):
-        with cols[i % 4]:
-            st.markdown(f"""
-            <div style='margin-bottom: 12px;'>
-                <div style='
-                    font-weight: 600;
-                    font-size: 15px;
-                    color: #1d3557;
-                    margin-bottom: 6px;
-                '>
-                    {task}
-                </div>
-            """, unsafe_allow_html=True)
-
-            q = st.number_input(
-                label="",
-                min_value=0,
-                max_value=10000,
-                value=0,
-                step=5,
-                key=task,
-                label_visibility="collapsed"
-            )
-            ai_total += q * ef * DAYS
-            ai_queries_count += int(q)
 
-            st.markdown("</div>", unsafe_allow_html=True)
+    # --- STATE INIT ---
+    if "device_list" not in st.session_state:
+        st.session_state.device_list = []
+    if "device_expanders" not in st.session_state:
+        st.session_state.device_expanders = {}
+    if "device_inputs" not in st.session_state:
+        st.session_state.device_inputs = {}
+    # NEW: token per expander per forzare re-mount alla conferma
+    if "expander_tokens" not in st.session_state:
+        st.session_state.expander_tokens = {}
+    # parti della risposta, scritte dai frammenti
+    if "device_answers" not in st.session_state:
+        st.session_state.device_answers = {}
+        st.session_state.activity_answer = None
+        st.session_state.ai_answer = None
+
+    # --- Modalità tabella (device_table.py): una riga per device, per inventari grandi ---
+    table_mode = st.toggle(
+        "Enter devices as a table",
+        key="device_table_mode",
+        help="One row per device and no limit per type: quicker for labs and offices with many devices.",
+    )
+    if table_mode:
+        device_table_section()
+    else:
+        device_cards()
 
-    st.session_state.ai_total_queries = ai_queries_count
+    # === DIGITAL ACTIVITIES ===
+    activities_section()
 
+    # === AI TOOLS ===
+    ai_section()
 
     # === FINAL BUTTONS (BACK + NEXT) ===
     col_back, col_space, col_next = st.columns([1, 4, 1])
@@ -961,40 +1007,58 @@ def show_main():
 
 
     # --- LOGICA DEL NEXT ---
+    table_mode = st.session_state.get("device_table_mode", False)
     if next_clicked:
-        unconfirmed_devices = [
-            key for key in st.session_state.get("device_expanders", {})
-            if st.session_state.device_expanders[key]
-        ]
+        if table_mode:
+            table, chk = st.session_state.device_table
+            unconfirmed_devices = []
+            no_devices = len(table) == 0
+            missing_devices = not chk.ok
+        else:
+            unconfirmed_devices = [
+                key for key in st.session_state.get("device_expanders", {})
+                if st.session_state.device_expanders[key]
+            ]
+            no_devices = len(st.session_state.get("device_list", [])) == 0
+            missing_devices = _devices_missing()
 
         missing_activities = (
             st.session_state.get("email_plain", "-- Select option --") == "-- Select option --"
             or st.session_state.get("email_attach", "-- Select option --") == "-- Select option --"
             or st.session_state.get("cloud", "-- Select option --") == "-- Select option --"
         )
-        no_devices = len(st.session_state.get("device_list", [])) == 0
-
-        missing_devices = _devices_missing()
 
         # Mostra eventuali warning
         if no_devices:
             st.warning("⚠️ Please add at least one device.")
         if unconfirmed_devices:
             st.warning("⚠️ You have devices not yet confirmed. Please click 'Confirm' in each box to proceed.")
-        if _devices_missing() and not no_devices:
+        if missing_devices and not no_devices and table_mode:
+            st.warning("⚠️ Please complete every row of the device table: " + "; ".join(chk.errors[:3]))
+        elif missing_devices and not no_devices:
             st.warning("⚠️ Please complete Ownership, Condition, and End-of-life for all devices, then press 'Confirm'.")
         if missing_activities:
             st.warning("⚠️ Please complete all digital activity fields before continuing.")
 
 
         # Procedi solo se tutto è OK
-        if not (no_devices or unconfirmed_devices or _devices_missing() or missing_activities):
-            st.session_state.results = {
-                "Devices": total_prod,
-                "E-Waste": total_eol,
-                "Digital Activities": digital_total,
-                "AI Tools": ai_total
-            }
+        if not (no_devices or unconfirmed_devices or missing_devices or missing_activities):
+            if table_mode:
+                devices = device_table.table_devices(table, chk)
+            else:
+                devices = [st.session_state.device_answers[d] for d in st.session_state.device_list]
+            answer = {**st.session_state.activity_answer, **st.session_state.ai_answer, "devices": devices}
+            # risposte identiche (anche di altre sessioni) riusano lo stesso Results: calcolo solo al primo
+            # uso, e solo dal codice (la chiave), così chi condivide la chiave condivide anche gli input
+            factors = get_factors()
+            answer_code = canonical_answer(answer)
+            result = get_results_cache().get_or_compute(
+                answer_key(answer_code, factors.version),
+                lambda: results_for_answer(answer_code, factors.version),
+            )
+            # tutto ciò che mostrano le pagine dei risultati, calcolato una volta sola
+            st.session_state.results = result
+            st.session_state.answer_code = answer_code
             st.session_state.page = "guess"
             st.rerun()
 
@@ -1005,30 +1069,11 @@ def show_guess():
     if "archetype_guess" not in st.session_state:
         st.session_state.archetype_guess = None
 
-    # ---- Stili ---- (aggiunta intro-box, senza rimuovere il resto)
-    st.markdown("""
-        <style>
-        .intro-box {
-            background: linear-gradient(to right, #d8f3dc, #a8dadc);
-            padding: 40px 25px;
-            border-radius: 15px;
-            text-align: center;
-            box-shadow: 0 4px 18px rgba(0,0,0,0.06);
-            margin-bottom: 30px;
-        }
-        .arc-card h4{
-            margin: 6px 0 10px; text-align:center; color:#1d3557;
-            font-weight:800; font-size:1.05rem;
-        }
-        .arc-badge{
-            display:inline-block; margin:10px auto 12px; padding:6px 12px;
-            border:1px solid #e9ecef; border-radius:999px; background:#fff;
-            color:#1b4332; font-weight:700; font-size:.9rem;
-        }
-        .picked { box-shadow: 0 0 0 3px #52b788 inset; border-radius: 12px; }
-        div[data-testid="stVerticalBlockBorderWrapper"] > div:empty { display:none; }
-        </style>
-    """, unsafe_allow_html=True)
+    # ---- Stili ---- (le classi sono in style.css; questa regola globale vale solo qui)
+    st.markdown(
+        "<style>div[data-testid='stVerticalBlockBorderWrapper'] > div:empty{display:none}</style>",
+        unsafe_allow_html=True,
+    )
 
     # --- Box identico a intro ---
     st.markdown(f"""
@@ -1052,7 +1097,7 @@ def show_guess():
                     st.markdown('<div class="picked">', unsafe_allow_html=True)
 
                 st.markdown(f"<div class='arc-card'><h4>{arc['name']}</h4></div>", unsafe_allow_html=True)
-                st.image(arc["image"], width=290)
+                st.image(image_src(arc["image"], 290), width=290)
                 st.markdown(f"<div style='text-align:center;'><span class='arc-badge'>{arc['category']}</span></div>",
                             unsafe_allow_html=True)
 
@@ -1083,13 +1128,7 @@ def show_guess():
 def show_results_cards():
     scroll_top()
     # stile + header
-    st.markdown("""
-        <style>
-        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600&display=swap');
-        html, body, [class*="css"] { font-family: 'Inter', sans-serif; }
-        h1, h2, h3, h4 { color: #1d3557; }
-        </style>
-    """, unsafe_allow_html=True)
+    st.markdown(FONT_CSS, unsafe_allow_html=True)
     st.markdown("""
         <div style="background: linear-gradient(to right, #d8f3dc, #a8dadc); padding: 40px 20px; border-radius: 12px; text-align: center; box-shadow: 0 4px 20px rgba(0,0,0,0.08); margin-bottom: 30px;">
             <h1 style="font-size: 2.8em; margin-bottom: 0.1em;">Your Digital Carbon Footprint🌍</h1>
@@ -1097,19 +1136,9 @@ def show_results_cards():
         </div>
     """, unsafe_allow_html=True)
 
-    res = st.session_state.results
-    total = sum(res.values())
-
-    with st.spinner("🔍 Calculating your footprint..."):
-        time.sleep(1.2)
-
-    cat_by_value = {
-        "Devices": res.get("Devices", 0),
-        "E-Waste": res.get("E-Waste", 0),
-        "Digital Activities": res.get("Digital Activities", 0),
-        "Artificial Intelligence": res.get("AI Tools", 0),
-    }
-    actual_top = max(cat_by_value, key=cat_by_value.get)
+    result = st.session_state.results
+    total = result.total
+    actual_top = result.top_category
     key_to_category = {a["key"]: a["category"] for a in ARCHETYPES}
     category_to_arc = {a["category"]: a for a in ARCHETYPES}
     guessed_key = st.session_state.get("archetype_guess")
@@ -1119,12 +1148,9 @@ def show_results_cards():
 
     
     # --- Dynamic average from Stats with minimum sample threshold ---
-    MIN_SAMPLES = 10
-
     role_label = st.session_state.get("role", "")
-    total = sum(res.values())
 
-    avg_dynamic, sample_n = get_avg_for_role_from_stats(role_label)
+    avg_dynamic, sample_n = get_avg_for_role(role_label)
     use_dynamic = (
         isinstance(avg_dynamic, (int, float)) and avg_dynamic > 0 and (sample_n or 0) >= MIN_SAMPLES
     )
@@ -1146,6 +1172,15 @@ def show_results_cards():
             msg = f"You emit {abs_pct:.0f}% less than the average {role_label.lower()}."
             comp_color = "#2b8a3e"
 
+    # percentile dallo sketch locale (nessuna chiamata di rete)
+    pct_label = percentile_label(role_label, total)
+    pct_html = ""
+    if pct_label:
+        pct_html = (
+            f"<div style='font-size:1.05rem; color:#1b4332; margin:0;'>You are in the <b>{pct_label}</b> "
+            f"of {ROLE_PLURAL.get(role_label, role_label.lower())}</div>"
+        )
+
 
     c1, c2, c3 = st.columns(3)
     CARD_STYLE = """
@@ -1159,7 +1194,7 @@ def show_results_cards():
         card = st.container(border=True)
         with card:
             st.markdown(
-                f"<div style='{CARD_STYLE} {CARD_ACCENT}'>"
+                f"<div class='fp-reveal' style='{CARD_STYLE} {CARD_ACCENT}'>"
                 f"<div style='font-size:2rem; color:#1b4332; font-weight:800; margin:0;'>{st.session_state.get('name','')}, your total CO₂e is…</div>"
                 f"<div style='font-size:clamp(2.6rem,6vw,3.6rem); line-height:1; font-weight:900; color:#ff7f0e; letter-spacing:-0.5px; margin:0;'>{total:.0f} kg/year</div>"
                 f"</div>", unsafe_allow_html=True
@@ -1170,17 +1205,17 @@ def show_results_cards():
         with card:
             if msg:
                 st.markdown(
-                    f"<div style='{CARD_STYLE} {CARD_ACCENT}'>"
+                    f"<div class='fp-reveal' style='{CARD_STYLE} {CARD_ACCENT}'>"
                     f"<div style='font-size:1.3rem; font-weight:800; color:#1b4332; margin:0;'>Your footprint vs average</div>"
                     f"<div style='font-size:2rem; font-weight:800; color:{comp_color}; line-height:1.15; margin:0;'>{msg}</div>"
                     f"<div style='font-size:1.05rem; color:#1b4332; margin:0;'>Average {role_label.lower()} emissions: <b>{avg_used:.0f} kg/year</b></div>"
+                    f"{pct_html}"
                     f"</div>", unsafe_allow_html=True
                 )
             else:
                 st.markdown(f"<div style='{CARD_STYLE} {CARD_ACCENT}'>No average available for your role.</div>", unsafe_allow_html=True)
 
     # Card 3 — Archetype
-    from pathlib import Path
     if actual is None and actual_top in category_to_arc:
         actual = category_to_arc[actual_top]
     show_arc = guessed if (guessed_right and guessed) else (actual or {})
@@ -1211,7 +1246,7 @@ def show_results_cards():
             with right:
                 st.markdown("<div style='display:flex; align-items:flex-start; justify-content:flex-end; padding-top:4px;'>", unsafe_allow_html=True)
                 if arc_img:
-                    st.image(arc_img, width=180)
+                    st.image(get_images().get((arc_img_rel, 180), arc_img), width=180)
                 st.markdown("</div>", unsafe_allow_html=True)
 
     # Nav
@@ -1229,21 +1264,22 @@ def show_results_cards():
 def show_results_breakdown():
     scroll_top()
     # stile + header
-    st.markdown("""
-        <style>
-        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600&display=swap');
-        html, body, [class*="css"] { font-family: 'Inter', sans-serif; }
-        h1, h2, h3, h4 { color: #1d3557; }
-        .tip-card { background-color: #e3fced; border-radius: 10px; padding: 15px; margin-bottom: 10px; }
-        </style>
-    """, unsafe_allow_html=True)
+    st.markdown(FONT_CSS, unsafe_allow_html=True)
     st.markdown("""
         <div style="background: linear-gradient(to right, #d8f3dc, #a8dadc); padding: 28px 16px; border-radius: 12px; text-align: center; margin-bottom: 16px;">
             <h2 style="margin:0;">Your footprint breakdown📊</h2>
         </div>
     """, unsafe_allow_html=True)
 
-    res = st.session_state.results
+    res = st.session_state.results.totals
+
+    # percentile per categoria tra i rispondenti dello stesso ruolo (se ci sono abbastanza dati)
+    role_label = st.session_state.get("role", "")
+    pct = {}
+    for key, column in [("Devices", "CO2 Devices"), ("E-Waste", "CO2 E-Waste"),
+                        ("Digital Activities", "CO2 Digital Activities"), ("AI Tools", "CO2 AI")]:
+        label = percentile_label(role_label, res[key], column)
+        pct[key] = f"<div style='color:#555; font-size:0.85em;'>{label}</div>" if label else ""
 
     st.markdown("<br><h3>Breakdown by Category:</h3>", unsafe_allow_html=True)
     st.markdown(f"""
@@ -1252,21 +1288,25 @@ def show_results_breakdown():
                 <div style="font-size: 2em;">💻</div>
                 <div style="font-size: 1.2em;"><b>{res['Devices']:.2f} kg CO2e/year</b></div>
                 <div style="color: #555;">Devices</div>
+                {pct['Devices']}
             </div>
             <div class="tip-card" style="text-align:center;">
                 <div style="font-size: 2em;">🗑️</div>
                 <div style="font-size: 1.2em;"><b>{res['E-Waste']:.2f} kg CO2e/year</b></div>
                 <div style="color: #555;">E-Waste</div>
+                {pct['E-Waste']}
             </div>
             <div class="tip-card" style="text-align:center;">
                 <div style="font-size: 2em;">🔌</div>
                 <div style="font-size: 1.2em;"><b>{res['Digital Activities']:.2f} kg CO2e/year</b></div>
                 <div style="color: #555;">Digital Activities</div>
+                {pct['Digital Activities']}
             </div>
             <div class="tip-card" style="text-align:center;">
                 <div style="font-size: 2em;">🦾</div>
                 <div style="font-size: 1.2em;"><b>{res['AI Tools']:.2f} kg CO2e/year</b></div>
                 <div style="color: #555;">AI Tools</div>
+                {pct['AI Tools']}
             </div>
         </div>
     """, unsafe_allow_html=True)
@@ -1333,43 +1373,22 @@ def show_results_breakdown():
 
 def show_results_equiv():
     scroll_top()
-    if "saved_once" not in st.session_state:
-        st.session_state.saved_once = False
 
     # stile + header
-    st.markdown("""
-        <style>
-        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600&display=swap');
-        html, body, [class*="css"] { font-family: 'Inter', sans-serif; }
-        h1, h2, h3, h4 { color: #1d3557; }
-        .equiv-card { background-color: white; border-left: 6px solid #52b788; border-radius: 12px; padding: 20px; box-shadow: 0 4px 12px rgba(0,0,0,0.08); text-align: center; }
-        </style>
-    """, unsafe_allow_html=True)
+    st.markdown(FONT_CSS, unsafe_allow_html=True)
     st.markdown("""
         <div style="background: linear-gradient(to right, #d8f3dc, #a8dadc); padding: 28px 16px; border-radius: 12px; text-align: center; margin-bottom: 16px;">
             <h2 style="margin:0;">The same amount of emissions corresponds to...</h2>
         </div>
     """, unsafe_allow_html=True)
 
-    res = st.session_state.results
-    total = sum(res.values())
-
-    burger_eq = total / 4.6
-    led_days_eq = (total / 0.256) / 24
-    car_km_eq = total / 0.17
-    netflix_hours_eq = total / 0.055
+    eq = st.session_state.results.equivalences
+    burger_eq = eq["burgers"]
+    led_days_eq = eq["led_days"]
+    car_km_eq = eq["car_km"]
+    netflix_hours_eq = eq["netflix_hours"]
 
     st.markdown(f"""
-        <style>
-        .equiv-grid {{
-            display: grid; grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
-            gap: 25px; margin-top: 25px;
-        }}
-        .equiv-emoji {{ font-size: 3.5em; margin-bottom: 15px; }}
-        .equiv-text {{ font-size: 1.05em; line-height: 1.6; color: #333; }}
-        .equiv-value {{ font-weight: 600; font-size: 1.2em; color: #1b4332; }}
-        </style>
-
         <div class="equiv-grid">
             <div class="equiv-card">
                 <div class="equiv-emoji">🍔</div>
@@ -1406,25 +1425,28 @@ def show_results_equiv():
     with right:
         if st.button("➡️ Discover Tips", key="res_eq_next", use_container_width=True):
             try:
-                if not st.session_state.get("saved_once", False):
-                    import sys
-                    api_url = st.secrets.get("SHEETBEST_URL", None)
-                    assert api_url, "SHEETBEST_URL not found in st.secrets"
-
+                result = st.session_state.results
+                # ogni Results nuovo (es. dopo "Edit your answers") viene salvato: stessa submission, la riga si aggiorna
+                if st.session_state.get("saved_results") is not result:
                     role_label = st.session_state.get("role", "")
-                    total_val = float(sum(st.session_state.results.values()))
-                    resp = save_row(
+                    save_row(
+                        st.session_state.submission_id,
                         role_label,
-                        st.session_state.results.get("Devices", 0),
-                        st.session_state.results.get("E-Waste", 0),
-                        st.session_state.results.get("AI Tools", 0),
-                        st.session_state.results.get("Digital Activities", 0),
-                        total_val
+                        result.totals["Devices"],
+                        result.totals["E-Waste"],
+                        result.totals["AI Tools"],
+                        result.totals["Digital Activities"],
+                        result.total,
+                        # ora del primo salvataggio: le modifiche restano nella stessa partizione dell'export
+                        timestamp=st.session_state.setdefault(
+                            "submitted_at", datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+                        ),
+                        answers=st.session_state.answer_code,
+                        factors_version=result.factors_version,
                     )
-                    print("[autosave] response:", resp, file=sys.stderr)
-                    st.session_state.saved_once = True
+                    st.session_state.saved_results = result
             except Exception as e:
-                import traceback, sys
+                import traceback
                 print("[autosave][ERROR]", e, file=sys.stderr)
                 traceback.print_exc()
 
@@ -1453,402 +1475,23 @@ def show_virtues():
     # PERSONALIZED TIPS
     # =======================
 
-    # Prendi i risultati
-    res = st.session_state.get("results", {})
-    if res:
-        # Ricostruisci il ranking categorie
-        df_plot = pd.DataFrame({
-            "Category": ["Devices", "Digital Activities", "Artificial Intelligence", "E-Waste"],
-            "CO₂e (kg)": [res.get("Devices", 0), res.get("Digital Activities", 0), res.get("AI Tools", 0), res.get("E-Waste", 0)]
-        })
-
-        most_impact_cat = df_plot.sort_values("CO₂e (kg)", ascending=False).iloc[0]["Category"]
-
-        # === 1) GENERIC (evergreen) TIPS, per categoria ===
-        GENERIC_TIPS = {
-                "Devices": [
-                        "<b>Update software regularly.</b> This enhances efficiency and performance, often reducing energy consumption.",
-                        "<b>Activate power-saving settings, reduce screen brightness and enable dark mode.</b> This lowers energy use.",
-                        "<b>Choose accessories made from recycled or sustainable materials.</b> This minimizes the environmental impact of your tech choices."
-                ],
-                "E-Waste": [
-                        "<b>Repair instead of replacing.</b> Fix broken electronics whenever possible to avoid unnecessary waste."
-                ],
-                "Digital Activities": [
-                        "<b>Use your internet mindfully:</b> close unused apps, avoid sending large attachments, and turn off video during calls when not essential."
-                ],
-                "Artificial Intelligence": [
-                        "<b>Use search engines for simple tasks: </b> They consume far less energy than AI tools.",
-                        "<b>Disable AI-generated results in search engines</b> (e.g., on Bing: go to Settings > Search > Uncheck \"Include AI-powered answers\" or similar option).",
-                        "<b>Prefer smaller AI models when possible.</b> For basic tasks, use lighter versions like GPT-4o-mini instead of more energy-intensive models.",
-                        "<b>Be concise in AI prompts and require concise answers:</b> short inputs and outputs require less processing."
-                ]
-        }
-        
-        # === 2) PERSONALIZED TIPS FACTORIES 
-        
-        # ===============================
-        # Helpers comuni
-        # ===============================
-        def _adj_years(years: float, used: str, shared: str) -> float:
-            if years <= 0:
-                return 0.0
-            if shared == "Personal":
-                return years * (1.5 if used == "Used" else 1.0)
-            elif shared == "Shared with family":
-                return years * (4.5 if used == "Used" else 3.0)
-            elif shared == "Shared in university":
-                return years * (15 if used == "Used" else 10.0)
-            else:
-                return years
-
-        def _fmt_kg(x: float) -> str:
-            # arrotonda "pulito": 0 decimali se grande, 1 decimale altrimenti
-            if x >= 10:
-                return f"{round(x):,}".replace(",", " ")
-            return f"{round(x, 1)}"
-
-        # ===============================
-        # Personalized Tips – DEVICES
-        # ===============================
-        def tip_devices_new_laptopdesktop_best(state) -> str | None:
-            """
-            Se esistono Laptop/Desktop nuovi, suggerisci il ricondizionato.
-            Mostra solo il device con risparmio annuo maggiore.
-            """
-            best_saving = 0.0
-            best_noun = None
-
-            for dev_id, vals in (state.get("device_inputs") or {}).items():
-                base = dev_id.rsplit("_", 1)[0]
-                if base not in ("Laptop Computer", "Desktop Computer"):
-                    continue
-                if vals.get("used") != "New":
-                    continue
-
-                try:
-                    years = float(vals.get("years", 0) or 0)
-                except Exception:
-                    years = 0.0
-                if years <= 0:
-                    continue
-
-                shared = vals.get("shared") or "Personal"
-                impact = float(device_ef.get(base, 0) or 0)
-                if impact <= 0:
-                    continue
-
-                adj_curr = _adj_years(years, used="New", shared=shared)
-                # scenario alternativo: stesso shared, ma 'Used'
-                adj_alt = _adj_years(years, used="Used", shared=shared)
-                if adj_curr <= 0 or adj_alt <= 0:
-                    continue
-
-                saving = impact * (1.0 / adj_curr - 1.0 / adj_alt)  # kg/anno
-                if saving > best_saving:
-                    best_saving = saving
-                    best_noun = "laptop" if base == "Laptop Computer" else "desktop"
-
-            if best_saving > 0 and best_noun:
-                X = _fmt_kg(best_saving)
-                return (
-                    f"<b>You bought a new {best_noun}: next time consider choosing a used or refurbished one.</b> "
-                    f"You could save about {X} kg CO₂e/year (vs a new device with the same usage)."
-                )
-            return None
-
-        def tip_devices_extend_life_any_device(state) -> str | None:
-            """
-            Qualsiasi device con lifespan <= 3 anni → suggerisci estensione di +2 anni.
-            Mostra solo il caso con risparmio annuo maggiore.
-            """
-            best = {"base": None, "years": None, "saving": 0.0}
-
-            for dev_id, vals in (state.get("device_inputs") or {}).items():
-                base = dev_id.rsplit("_", 1)[0]
-                try:
-                    years = float(vals.get("years", 0) or 0)
-                except Exception:
-                    years = 0.0
-                if years <= 0 or years > 3:
-                    continue
-
-                used = vals.get("used") or "New"
-                shared = vals.get("shared") or "Personal"
-                impact = float(device_ef.get(base, 0) or 0)
-                if impact <= 0:
-                    continue
-
-                adj_curr = _adj_years(years, used=used, shared=shared)
-                adj_ext = _adj_years(years + 2.0, used=used, shared=shared)
-                if adj_curr <= 0 or adj_ext <= 0:
-                    continue
-
-                saving = impact * (1.0 / adj_curr - 1.0 / adj_ext)  # kg CO2e/anno
-                if saving > best["saving"]:
-                    best.update({"base": base, "years": years, "saving": saving})
-
-            if best["saving"] > 0 and best["base"]:
-                X = _fmt_kg(best["saving"])
-                device_label = best["base"].lower()
-                return (
-                    f"<b>You plan to use your {device_label} for {best['years']:.0f} years.</b> "
-                    f"if you extend it to {best['years'] + 2:.0f}, you could save about {X} kg CO₂e/year."
-                )
-            return None
-
-
-        # ===============================
-        # Personalized Tips – E-WASTE
-        # ===============================
-        def tip_ewaste_stored_at_home(state) -> str | None:
-            """
-            Per tutti i device con eol == 'I store it at home, unused':
-            stima saving annuo passando da 'store' (0.402) a:
-              - centro raccolta (-0.224)  → delta min
-              - sell/donate (-0.445)      → delta max
-            Somma i risparmi e mostra range.
-            """
-            items = []
-            saving_min = 0.0
-            saving_max = 0.0
-
-            for dev_id, vals in (state.get("device_inputs") or {}).items():
-                if vals.get("eol") != "I store it at home, unused":
-                    continue
-
-                base = dev_id.rsplit("_", 1)[0]
-                try:
-                    years = float(vals.get("years", 0) or 0)
-                except Exception:
-                    years = 0.0
-                if years <= 0:
-                    continue
-
-                used = vals.get("used") or "New"
-                shared = vals.get("shared") or "Personal"
-                impact = float(device_ef.get(base, 0) or 0)
-                if impact <= 0:
-                    continue
-
-                adj = _adj_years(years, used=used, shared=shared)
-                if adj <= 0:
-                    continue
-
-                # delta verso alternative (per anno)
-                delta_min = impact * ((0.402 - (-0.224)) / adj)   # -> certified
-                delta_max = impact * ((0.402 - (-0.445)) / adj)   # -> sell/donate
-                saving_min += max(0.0, delta_min)
-                saving_max += max(0.0, delta_max)
-                items.append(base)
-
-            if items and (saving_min > 0 or saving_max > 0):
-                uniq = ", ".join(sorted(set(items)))
-                lo = _fmt_kg(saving_min)
-                hi = _fmt_kg(saving_max)
-                return (
-                    f"<b>You have {uniq} stored at home.</b> Recycling or reusing them could save between {lo} and {hi} kg CO₂e/year. Don’t let them gather dust!"
-                )
-            return None
-
-        def tip_ewaste_general_trash(state) -> str | None:
-            """
-            Per device con eol == 'I throw it away in general waste' (0.611):
-            stima il saving annuo se passassero alla miglior alternativa (sell/donate: -0.445)
-            e indica per quali device vale.
-            """
-            total_saving = 0.0
-            devices = []
-
-            for dev_id, vals in (state.get("device_inputs") or {}).items():
-                if vals.get("eol") != "I throw it away in general waste":
-                    continue
-
-                base = dev_id.rsplit("_", 1)[0]
-                devices.append(base)
-
-                try:
-                    years = float(vals.get("years", 0) or 0)
-                except Exception:
-                    years = 0.0
-                if years <= 0:
-                    continue
-
-                used = vals.get("used") or "New"
-                shared = vals.get("shared") or "Personal"
-                impact = float(device_ef.get(base, 0) or 0)
-                if impact <= 0:
-                    continue
-
-                adj = _adj_years(years, used=used, shared=shared)
-                if adj <= 0:
-                    continue
-
-                # delta verso best alternative (sell/donate: -0.445)
-                delta = impact * ((0.611 - (-0.445)) / adj)
-                total_saving += max(0.0, delta)
-
-            if devices and total_saving > 0:
-                names = ", ".join(sorted(set(devices)))
-                X = _fmt_kg(total_saving)
-                return (
-                    f"<b>You throw {names} away in general waste. this prevents proper recycling or reuse.</b> "
-                    f"Bringing it to a certified collection point could save about {X} kg CO₂e/year."
-                )
-            return None
-
-
-        # ===============================
-        # Personalized Tips – DIGITAL ACTIVITIES
-        # ===============================
-        def tip_emails_with_attachments_impact(state) -> str | None:
-                """
-                Mostra l'impatto annuo delle email con allegati
-                SOLO se > 10 email/giorno (soglia).
-                """
-                em_attach = int(state.get("da_em_attach", 0))  # soglia > 10
-                if em_attach <= 10:
-                        return None
-                impact_year = em_attach * 0.035 * DAYS  # kg CO2e/anno
-                X = _fmt_kg(impact_year)
-                return (
-                        f"<b>Currently, your emails with attachments emit around {X} kg CO₂e/year.</b> Try sharing links to OneDrive or Google Drive instead of large attachments."
-                )
-
-        def tip_emails_plain_impact(state) -> str | None:
-                """
-                Mostra l'impatto annuo delle email senza allegati
-                SOLO se > 10 email/giorno (soglia).
-                """
-                em_plain = int(state.get("da_em_plain", 0))  # soglia > 10
-                if em_plain <= 10:
-                        return None
-                impact_year = em_plain * 0.004 * DAYS  # kg CO2e/anno
-                X = _fmt_kg(impact_year)
-                return (
-                        f"<b>Currently, your emails without attachments emit around {X} kg CO₂e/year. </b> To reduce this, opt for instant messaging where possible."
-                )
-            
-        def tip_cloud_storage_impact(state) -> str | None:
-                """
-                Se lo storage cloud è >50GB, mostra l'impatto annuo attuale e consiglia di fare decluttering.
-                """
-                cld = float(state.get("da_cloud_gb", 0))  # soglia > 50
-                if cld <= 50:
-                        return None
-                impact_year = cld * 0.01  # kg CO2e/anno
-                X = _fmt_kg(impact_year)
-                return (
-                        f"<b>At the moment, your annual footprint from stored data is {X} kg CO₂e/year.</b> Try to declutter your digital space by regularly deleting unnecessary files and emptying trash and spam folders to reduce digital pollution."
-                )
-
-        def tip_idle_left_on(state) -> str | None:
-            """
-            Se 'I leave it on (idle mode)': saving passando a 'I turn it off'.
-            """
-            if not state.get("idle_is_left_on", False):
-                return None
-            saved = DAYS * 16.0 * (0.0104 - 0.0005204)
-            X = _fmt_kg(saved)
-            return (
-                f"<b>You usually leave your computer on in idle mode. </b> Turning it off at the end of the day could save up to {X} kg CO₂e/year and extend its lifespan."
-            )
-
-        # ===============================
-        # Personalized Tips – AI
-        # ===============================
-        def tip_ai_queries_volume(state) -> str | None:
-                """
-                Mostra il volume totale di query AI al giorno.
-                Se > 30, suggerisce di fare richieste più mirate per ridurre il numero e l'energia usata.
-                """
-                Q = int(state.get("ai_total_queries", 0) or 0)
-                if Q <= 30:
-                        return None
-                return (
-                        f"<b>You're asking about {Q} AI queries per day. </b> Try making more targeted requests to reduce this number and save energy."
-                )
-
-        # ===============================
-        # Registry + Aggregator + Rendering
-        # ===============================
-        PERSONALIZED_TIP_FACTORIES = {
-            "Devices": [
-                tip_devices_new_laptopdesktop_best,
-                tip_devices_extend_life_any_device,
-            ],
-            "E-Waste": [
-                tip_ewaste_stored_at_home,
-                tip_ewaste_general_trash,
-            ],
-            "Digital Activities": [
-                tip_cloud_storage_impact,
-                tip_emails_with_attachments_impact,
-                tip_idle_left_on,
-                tip_emails_plain_impact,
-            ],
-            "Artificial Intelligence": [
-                tip_ai_queries_volume,
-            ],
-        }
-
-        def gather_personalized_tips(state):
-            out = {k: [] for k in PERSONALIZED_TIP_FACTORIES}
-            for cat, funcs in PERSONALIZED_TIP_FACTORIES.items():
-                for f in funcs:
-                    try:
-                        tip = f(state)
-                    except Exception:
-                        tip = None
-                    if tip:
-                        out[cat].append(tip)
-            return out
-
-        def _dedup_keep_order(seq):
-            seen = set()
-            out = []
-            for x in seq:
-                if x not in seen:
-                    out.append(x)
-                    seen.add(x)
-            return out
-
-        # --- Build personalized tips
-        personalized = gather_personalized_tips(st.session_state)
-
-        # --- TOP CATEGORY → show ALL tips (personalized + generic)
-        top_personal = personalized.get(most_impact_cat, [])
-        top_generic  = GENERIC_TIPS.get(most_impact_cat, [])
-        top_tips = _dedup_keep_order(top_personal + top_generic)
-
-        with st.expander(f"📌 Tips for top impact area: {most_impact_cat}", expanded=True):
-            for tip in top_tips:
+    # tips già calcolati in show_main (results.build_results)
+    result = st.session_state.results
+    if result is not None:
+        with st.expander(f"📌 Tips for top impact area: {result.top_category}", expanded=True):
+            for tip in result.top_tips:
                 st.markdown(
                     f"<div style='background:#e3fced; padding:15px; border-radius:10px; margin-bottom:10px;'>{tip}</div>",
                     unsafe_allow_html=True
                 )
 
-        # --- OTHER CATEGORIES → up to 2 tips each, prioritize personalized
-        seed = f"{st.session_state.get('name','')}|{st.session_state.get('role','')}"
-        rnd = random.Random(seed)  # stable per utente
-
-        for cat in [c for c in GENERIC_TIPS.keys() if c != most_impact_cat]:
-            pers = personalized.get(cat, [])
-            picked = pers[:2]  # take up to 2 personalized
-
-            if len(picked) < 2:
-                remaining = 2 - len(picked)
-                gen_pool = [g for g in GENERIC_TIPS.get(cat, []) if g not in picked]
-                if gen_pool:
-                    picked += gen_pool if len(gen_pool) <= remaining else rnd.sample(gen_pool, remaining)
-
-            if picked:  # se resta solo 1 tip va bene
-                with st.expander(f"📌 More to improve in {cat}", expanded=False):
-                    for tip in picked:
-                        st.markdown(
-                            f"<div style='background:#e3fced; padding:15px; border-radius:10px; margin-bottom:10px;'>{tip}</div>",
-                            unsafe_allow_html=True
-                        )
+        for cat, picked in result.other_tips:
+            with st.expander(f"📌 More to improve in {cat}", expanded=False):
+                for tip in picked:
+                    st.markdown(
+                        f"<div style='background:#e3fced; padding:15px; border-radius:10px; margin-bottom:10px;'>{tip}</div>",
+                        unsafe_allow_html=True
+                    )
 
     st.markdown("""
         <div style="background-color:#fefae0; border-left: 6px solid #e09f3e; 
@@ -1863,94 +1506,8 @@ def show_virtues():
 
 
 
-    st.markdown("""
-        <style>
-        .virtue-card {
-            background-color: #e7f5ff;
-            border-radius: 12px;
-            padding: 14px 16px;
-            margin-bottom: 10px;
-            border-left: 6px solid #74C0FC;
-        }
-        </style>
-    """, unsafe_allow_html=True)
-
-    name = st.session_state.get("name", "").strip() or "there"
-
-    # Raccogli virtù
-    virtues = []
-
-    # 1) Devices usati: elenca i device usati
-    used_devices = []
-    for dev_id, vals in st.session_state.get("device_inputs", {}).items():
-        if vals.get("used") == "Used":
-            base = dev_id.rsplit("_", 1)[0]
-            used_devices.append(base)
-    if used_devices:
-        unique_used = ", ".join(sorted(set(used_devices)))
-        virtues.append(f"You chose a used device for your {unique_used}! This typically reduces manufacturing emissions by 30–50% per device.")
-
-    # 2) Device longevity: usati per più di 5 anni
-    long_lived_devices = []
-    for dev_id, vals in st.session_state.get("device_inputs", {}).items():
-        try:
-            if float(vals.get("years", 0)) > 5:
-                base = dev_id.rsplit("_", 1)[0]
-                long_lived_devices.append(base)
-        except Exception:
-            pass
-
-    if long_lived_devices:
-        names = ", ".join(sorted(set(long_lived_devices)))
-        virtues.append(f"You use your {names} for more than 5 years! Extending device life reduces the need for new production and saves valuable resources.")
-
-    
-    # 3) End-of-life virtuoso (almeno uno dei device)
-    good_eols = {
-        "I bring it to a certified e-waste collection center",
-        "I return it to manufacturer for recycling or reuse",
-        "I sell or donate it to someone else",
-        "Device provided by the university, I return it after use",
-    }
-    has_good_eol = any(
-        vals.get("eol") in good_eols
-        for vals in st.session_state.get("device_inputs", {}).values()
-    )
-    if has_good_eol:
-        virtues.append("You dispose some of devices responsibly! EU aims to achieve a correct e-waste disposal rate of 65%, but many countries are still below this threshold.")
-
-    # 4) Poche email con allegato (1–10)
-    da_em_attach = int(st.session_state.get("da_em_attach", 0) or 0)
-    if da_em_attach <= 10:
-        virtues.append(
-            "You keep the exchange of emails with attachments low. An email with an attachment typically weighs almost ten times more than one without."
-        )
-  
-    # 5) Cloud storage basso (<5GB o 5–20GB)
-    da_cloud_gb = float(st.session_state.get("da_cloud_gb", 0) or 0.0)
-    if da_cloud_gb <= 20:
-        virtues.append(
-            "You keep your cloud storage light by cleaning up files you no longer need! This reduces the energy required to store and maintain them."
-        )
-
-    # 6) Spegnere il computer quando non usato
-    if st.session_state.get("idle_turns_off"):
-        virtues.append("You turn off your computer when not in use. This single action can save over 150 kWh of energy per year for a single computer!")
-
-    # 7) Zero stampe
-    pages = int(st.session_state.get("da_pages", 0) or 0)
-    if pages == 0:
-        virtues.append(
-            "You never print. This saves paper, ink, and the energy needed for printing... the trees thank you!"
-        )
-
-    # 8) Uso moderato dell’AI (< 20 query/giorno)
-    ai_total_queries = int(st.session_state.get("ai_total_queries", 0))
-    if ai_total_queries <= 20:
-        virtues.append(
-            "You use AI sparingly, staying under 20 queries a day. This reduces the energy consumed by high-compute AI models."
-        )
 
+    virtues = result.virtues if result is not None else ()
     if virtues:
         st.markdown("#### You’re already making smart choices")
         st.markdown(
@@ -2040,11 +1597,39 @@ def show_final():
     _, _, right = st.columns([1, 4, 1])        
     with right:
         if st.button("🔄 Restart", key="final_restart_btn", use_container_width=True):
-            st.session_state.clear() 
+            st.session_state.clear()  # nuova persona, nuova submission
             st.session_state.page = "intro"
             st.rerun()
 
 
+# --- Pannello diagnostico (aprire l'app con ?debug=<DEBUG_TOKEN>) ---
+def show_ops_panel():
+    with st.sidebar:
+        st.markdown("**Autosave queue**")
+        st.json(get_writer().stats())
+        st.markdown("**Stats cache**")
+        st.json(get_stats_cache().stats())
+        st.markdown("**Results cache**")
+        st.json(get_results_cache().stats())
+        st.markdown("**Local role averages**")
+        st.json(get_aggregates().snapshot())
+        st.markdown("**HTTP (Sheet.best)**")
+        st.json(get_http().stats())
+        st.markdown("**Circuit breakers**")
+        st.json({name: b.stats() for name, b in get_breakers().items()})
+
+
+st.markdown(app_css(), unsafe_allow_html=True)
+
+def ops_panel_allowed():
+    """Pannello diagnostico solo con ?debug=<DEBUG_TOKEN dei secrets>; senza token è disattivato."""
+    token = secret("DEBUG_TOKEN")
+    given = st.query_params.get("debug")
+    return bool(token) and given is not None and hmac.compare_digest(given.encode(), str(token).encode())
+
+if ops_panel_allowed():
+    show_ops_panel()
+
 # === PAGE NAVIGATION ===
 if st.session_state.page == "intro":
     show_intro()
@@ -0,0 +1,88 @@
+"""File statici dell'app serviti da Streamlit (server.enableStaticServing, vedi
+.streamlit/config.toml) invece che dal media file manager di st.image.
+
+Tutto quello che sta in static/ è servito come app/static/<percorso>, con lo
+stesso URL per ogni sessione: browser e proxy possono riusarlo. I nomi contengono
+l'hash del contenuto (images.variant_name, write_hashed), quindi un file pubblicato non
+cambia mai e un asset modificato ha un URL nuovo. Lo stesso hash va anche in ?v=:
+il server Tornado di Streamlit risponde allora con max-age di 10 anni; quello
+Starlette non manda Cache-Control (solo Last-Modified), quindi davanti a un proxy
+conviene "Cache-Control: public, max-age=31536000, immutable" su /app/static/.
+"""
+import hashlib
+import os
+import re
+import sys
+
+import streamlit as st
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(HERE, "static")
+URL_PREFIX = "app/static"
+
+
+def static_serving():
+    """True se Streamlit serve static/ (altrimenti gli URL app/static/... darebbero 404)."""
+    return bool(st.get_option("server.enableStaticServing"))
+
+
+def static_images():
+    """True se st.image può ricevere URL /app/static/... (le versioni vecchie li aprono come file)."""
+    try:
+        from streamlit import url_util
+    except ImportError:
+        return False
+    return static_serving() and hasattr(url_util, "is_relative_static_url")
+
+
+def static_url(path):
+    """URL relativo (app/static/...) di un file dentro static/, con ?v=<hash> se il nome ne ha uno."""
+    rel = os.path.relpath(path, STATIC_DIR)
+    if rel.startswith(os.pardir):
+        raise ValueError(f"{path} is not under {STATIC_DIR}")
+    url = f"{URL_PREFIX}/{rel.replace(os.sep, '/')}"
+    parts = os.path.basename(path).split(".")  # <nome>.<hash>.<ext>
+    return f"{url}?v={parts[-2]}" if len(parts) >= 3 else url
+
+
+def image_url(path):
+    """URL per st.image, che riconosce come statici solo gli URL che iniziano con /app/static/."""
+    return "/" + static_url(path)
+
+
+def write_hashed(data, name, subdir):
+    """Scrive data in static/<subdir>/<nome>.<hash>.<ext> (se non c'è già); ritorna il percorso."""
+    stem, ext = os.path.splitext(name)
+    out_dir = os.path.join(STATIC_DIR, subdir)
+    path = os.path.join(out_dir, f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}")
+    if not os.path.exists(path):
+        os.makedirs(out_dir, exist_ok=True)
+        tmp = f"{path}.tmp-{os.getpid()}"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return path
+
+
+def minify_css(text):
+    """Toglie commenti e spazi superflui (basta per style.css: niente stringhe con questi caratteri)."""
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r" ?([{};,>]) ?", r"\1", text)
+    text = re.sub(r": ", ":", text)
+    return text.replace(";}", "}").strip()
+
+
+def stylesheet_html(source="style.css"):
+    """HTML che carica il foglio di stile minificato: <link> al file statico, o <style> inline senza static serving."""
+    with open(os.path.join(HERE, source), encoding="utf-8") as f:
+        css = minify_css(f.read())
+    if static_serving():
+        try:
+            path = write_hashed(css.encode("utf-8"), os.path.basename(source), "css")
+        except OSError as e:
+            print(f"[assets] cannot publish {source} ({e}), inlining it", file=sys.stderr)
+        else:
+            return f'<link rel="stylesheet" href="{static_url(path)}">'
+    return f"<style>{css}</style>"
+
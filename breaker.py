@@ -0,0 +1,95 @@
+"""Circuit breaker condiviso tra le sessioni, per le chiamate a Sheet.best.
+
+- closed: le chiamate passano; dopo failure_threshold errori consecutivi -> open;
+- open: le chiamate falliscono subito con CircuitOpen (il chiamante usa il fallback)
+  per reset_timeout secondi, poi -> half_open;
+- half_open: passa una sola chiamata di prova; se riesce -> closed, altrimenti -> open.
+
+Le transizioni vengono stampate su stderr e contate in stats().
+"""
+import sys
+import threading
+import time
+
+
+class CircuitOpen(Exception):
+    """Il circuito è aperto: la chiamata non è stata eseguita."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=3, reset_timeout=30.0, ignore=()):
+        """ignore: eccezioni che non indicano un servizio degradato (es. errori di validazione)."""
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.ignore = tuple(ignore)
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._stats = {"calls": 0, "failures": 0, "short_circuited": 0, "transitions": {}}
+
+    def _transition(self, new_state):
+        old, self.state = self.state, new_state
+        key = f"{old}->{new_state}"
+        self._stats["transitions"][key] = self._stats["transitions"].get(key, 0) + 1
+        print(f"[breaker:{self.name}] {old} -> {new_state}", file=sys.stderr)
+
+    def _before_call(self):
+        """Registra la chiamata o solleva CircuitOpen; ritorna True se è la chiamata di prova (half_open)."""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self._stats["short_circuited"] += 1
+                    raise CircuitOpen(f"{self.name} circuit is open")
+                self._transition("half_open")
+            if self.state == "half_open":
+                if self._probing:
+                    self._stats["short_circuited"] += 1
+                    raise CircuitOpen(f"{self.name} circuit is half-open, probe in flight")
+                self._probing = True
+            self._stats["calls"] += 1
+            return self.state == "half_open"
+
+    def _on_success(self):
+        with self._lock:
+            self._failures = 0
+            if self.state != "closed":
+                self._transition("closed")
+
+    def _on_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._stats["failures"] += 1
+            if self.state == "half_open" or (self.state == "closed" and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition("open")
+
+    def call(self, fn, *args, **kwargs):
+        """Esegue fn(*args, **kwargs) attraverso il breaker; solleva CircuitOpen se è aperto."""
+        probe = self._before_call()
+        try:
+            try:
+                result = fn(*args, **kwargs)
+            except self.ignore:
+                self._on_success()
+                raise
+            except Exception:
+                self._on_failure()
+                raise
+            self._on_success()
+            return result
+        finally:
+            # la prova finisce anche con un BaseException (KeyboardInterrupt, SystemExit):
+            # altrimenti il circuito resterebbe half_open con una prova "in corso" per sempre
+            if probe:
+                with self._lock:
+                    self._probing = False
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats, transitions=dict(self._stats["transitions"]))
+            out["state"] = self.state
+            out["consecutive_failures"] = self._failures
+        return out
@@ -0,0 +1,99 @@
+"""Modalità tabella dei device di show_main: una riga per device in un DataFrame
+(st.data_editor), per inventari grandi (laboratori, uffici).
+
+La validazione avviene per colonne: le etichette diventano indici delle tabelle
+dei fattori con pd.Categorical e i controlli sono un insieme di maschere, quindi
+200 righe costano quanto 2. La lista dei device per la risposta è la stessa delle
+card: le due modalità alimentano lo stesso Results, calcolato al Next.
+"""
+import collections
+
+import numpy as np
+import pandas as pd
+
+from footprint import DEVICE_TYPES, EOL_OPTIONS, SHARED_OPTIONS, USED_OPTIONS
+
+COLUMNS = ["Device", "Ownership", "Condition", "Lifespan (years)", "I don't know", "End of life"]
+MIN_YEARS, MAX_YEARS = 0.5, 20.0
+MAX_ROWS = 255  # massimo di device per risposta (answer_codec)
+UNIVERSITY_EOL = "Device provided by the university, I return it after use"
+STUDENT_HIDDEN = ["Maxi-screen", "Projector"]
+
+# esito di check(): anni effettivi (come salvati nel codice) ed errori per riga
+TableCheck = collections.namedtuple("TableCheck", "ok years errors")
+
+
+def options_for(role):
+    """Tipi di device e opzioni di fine vita che il ruolo può scegliere (come nelle card)."""
+    staff = role in ("Professor", "Staff Member")
+    types = list(DEVICE_TYPES) if staff else [t for t in DEVICE_TYPES if t not in STUDENT_HIDDEN]
+    eol = [e for e in EOL_OPTIONS[1:] if staff or e != UNIVERSITY_EOL]
+    return types, eol
+
+
+def empty_table():
+    df = pd.DataFrame({c: pd.Series(dtype=object) for c in COLUMNS})
+    df["Lifespan (years)"] = df["Lifespan (years)"].astype(float)
+    df["I don't know"] = df["I don't know"].astype(bool)
+    return df
+
+
+def table_from_devices(devices):
+    """Tabella da una lista di device (dict come in footprint.encode_answers); '-- Select --' diventa vuoto."""
+    df = empty_table()
+    if not devices:
+        return df
+    rows = pd.DataFrame({
+        "Device": [d.get("type") for d in devices],
+        "Ownership": [d.get("shared") for d in devices],
+        "Condition": [d.get("used") for d in devices],
+        "Lifespan (years)": [float(d.get("years") or 0) or None for d in devices],
+        "I don't know": [False] * len(devices),
+        "End of life": [d.get("eol") for d in devices],
+    })
+    return pd.concat([df, rows.replace({"-- Select --": None})], ignore_index=True)
+
+
+def _codes(col, labels):
+    """Etichette -> indice nella lista labels (quella delle tabelle dei fattori), -1 se vuote o sconosciute."""
+    return pd.Categorical(col, categories=labels).codes.astype(np.intp)
+
+
+def check(df, role, factors):
+    """Valida tutte le righe insieme; gli anni con "I don't know" sono la vita media del tipo."""
+    types, eols = options_for(role)
+    dev = _codes(df["Device"], DEVICE_TYPES)
+    used = _codes(df["Condition"], USED_OPTIONS)
+    shared = _codes(df["Ownership"], SHARED_OPTIONS)
+    idk = df["I don't know"].fillna(False).to_numpy(dtype=bool)
+    years = pd.to_numeric(df["Lifespan (years)"], errors="coerce").to_numpy(dtype=float)
+    years = np.where(idk & (dev >= 0), factors.lifespan[np.maximum(dev, 0)], years)
+    years = np.round(years * 100) / 100  # answer_codec.quantize_years, su tutta la colonna
+
+    problems = {
+        "device": ~df["Device"].isin(types).to_numpy(),
+        "ownership": shared <= 0,
+        "condition": used <= 0,
+        "lifespan": ~((years >= MIN_YEARS) & (years <= MAX_YEARS)),
+        "end of life": ~df["End of life"].isin(eols).to_numpy(),
+    }
+    bad = np.zeros(len(df), dtype=bool)
+    for mask in problems.values():
+        bad |= mask
+    errors = []
+    for i in np.flatnonzero(bad):
+        missing = [name for name, mask in problems.items() if mask[i]]
+        errors.append(f"Row {i + 1}: check {', '.join(missing)}")
+    if len(df) > MAX_ROWS:
+        errors.append(f"At most {MAX_ROWS} devices can be entered.")
+    return TableCheck(not errors, years, errors)
+
+
+def table_devices(df, chk):
+    """Lista dei device (dict come nelle card) per la risposta salvata; anni effettivi, "I don't know" compreso."""
+    return [
+        {"type": t, "years": float(y), "used": u, "shared": s, "eol": e}
+        for t, y, u, s, e in zip(
+            df["Device"], chk.years, df["Condition"], df["Ownership"], df["End of life"],
+        )
+    ]
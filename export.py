@@ -0,0 +1,296 @@
+"""Export colonnare delle submission, partizionato per ruolo e mese, per le analisi.
+
+Struttura (root = cartella dell'export):
+
+    root/manifest.json                         partizioni, righe, watermark
+    root/role=Student/month=2026-10/part-*.npz una colonna NumPy per campo
+
+Ogni append scrive un nuovo part file solo nelle partizioni toccate (niente
+riscritture); leggere un ruolo in un mese apre solo la sua cartella. Le modifiche
+di una submission vengono aggiunte come nuova versione: in lettura vale l'ultima
+per 'Submission ID'.
+
+I part file hanno un livello nel nome (part-<ns>.npz = 0, part-<ns>-L<k>.npz = k),
+che dal più vecchio al più recente non cresce mai. Quando i fanout part più recenti
+hanno lo stesso livello k vengono riuniti in uno di livello k+1, come le cifre di un
+contatore in base fanout: ogni riga viene riscritta al più una volta per livello,
+cioè log_fanout(append) volte, e una partizione ha al più fanout-1 file per livello.
+Così i tanti append piccoli dell'app non rallentano la lettura senza riscrivere
+ogni volta tutta la partizione; compact() riunisce tutto in un unico file con le
+sole ultime versioni.
+
+Il watermark del backfill è la revisione delle righe ('Updated At', scritto a ogni
+salvataggio; 'Timestamp' per le righe più vecchie), non la data del primo invio:
+così anche le modifiche di submission già esportate vengono riprese.
+
+L'app aggiunge le righe a ogni invio confermato (EXPORT_PATH nei secrets); per lo
+storico c'è il backfill da un backend di storage.py:
+
+    python export.py backfill --out export/ --backend sheetbest --url https://...
+    python export.py read --out export/ --role Student --month 2026-10 > student-oct.csv
+    python export.py compact --out export/
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import time
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from storage import BACKENDS, FLOAT_FIELDS, KEY_FIELD, _num, open_storage
+
+TS_FIELD = "Timestamp"
+REV_FIELD = "Updated At"
+NO_MONTH = "unknown"  # righe senza Timestamp (salvate prima che esistesse la colonna)
+
+
+def _month(row):
+    ts = str(row.get(TS_FIELD) or "")
+    return ts[:7] if len(ts) >= 7 and ts[4] == "-" else NO_MONTH
+
+
+def _revision(row):
+    """Revisione della riga per il watermark: 'Updated At', o il Timestamp se manca."""
+    return str(row.get(REV_FIELD) or row.get(TS_FIELD) or "")
+
+
+def _level(path):
+    m = re.search(r"-L(\d+)\.npz$", path)
+    return int(m.group(1)) if m else 0
+
+
+def _columns(rows):
+    """Righe (dict) -> colonne NumPy: float64 per FLOAT_FIELDS, stringhe a larghezza fissa per il resto."""
+    names = []
+    for r in rows:
+        names.extend(k for k in r if k not in names)
+    cols = {}
+    for name in names:
+        if name in FLOAT_FIELDS:
+            cols[name] = np.array([_num(r.get(name)) for r in rows], dtype="<f8")
+        else:
+            cols[name] = np.array(["" if r.get(name) is None else str(r.get(name)) for r in rows], dtype=str)
+    return cols
+
+
+def _latest(cols):
+    """Tiene solo l'ultima versione di ogni submission (le righe senza ID restano tutte)."""
+    if KEY_FIELD not in cols or not len(cols[KEY_FIELD]):
+        return cols
+    keys = cols[KEY_FIELD]
+    n = len(keys)
+    # indice dell'ultima occorrenza: np.unique sull'array rovesciato
+    _, first_rev = np.unique(keys[::-1], return_index=True)
+    keep = np.zeros(n, dtype=bool)
+    keep[n - 1 - first_rev] = True
+    keep |= keys == ""
+    return {k: v[keep] for k, v in cols.items()}
+
+
+class ColumnarExport:
+    def __init__(self, root, fanout=8):
+        self.root = root
+        self.fanout = fanout
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    # --- percorsi e manifest ---
+    def _dir(self, role, month):
+        return os.path.join(self.root, f"role={quote(role, safe='')}", f"month={month}")
+
+    def _parts(self, d):
+        # i nomi part-<ns>... sono in ordine di scrittura, quindi di versione
+        return sorted(glob.glob(os.path.join(d, "part-*.npz")))
+
+    def _manifest_path(self):
+        return os.path.join(self.root, "manifest.json")
+
+    def manifest(self):
+        try:
+            with open(self._manifest_path(), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"partitions": {}, "rows": 0, "watermark": None, "watermark_ids": []}
+
+    def _save_manifest(self, m):
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(m, f, indent=1, sort_keys=True)
+        os.replace(tmp, self._manifest_path())
+
+    @staticmethod
+    def _write_part(path, cols):
+        # il file temporaneo non corrisponde a part-*.npz, quindi un crash a metà non viene mai letto
+        tmp = os.path.join(os.path.dirname(path), ".tmp-" + os.path.basename(path))
+        np.savez(tmp, **cols)
+        os.replace(tmp, path)
+
+    # --- scrittura ---
+    def append(self, rows):
+        """Aggiunge le righe (dict come build_row in app.py) alle loro partizioni; ritorna quante."""
+        groups = {}
+        for r in rows:
+            role = (r.get("Role") or "").strip() or "unknown"
+            groups.setdefault((role, _month(r)), []).append(r)
+        if not groups:
+            return 0
+        with self._lock:
+            m = self.manifest()
+            stamp = time.time_ns()
+            for (role, month), part_rows in groups.items():
+                d = self._dir(role, month)
+                os.makedirs(d, exist_ok=True)
+                self._write_part(os.path.join(d, f"part-{stamp}.npz"), _columns(part_rows))
+                self._merge_levels(d)
+                key = f"{role}/{month}"
+                m["partitions"][key] = m["partitions"].get(key, 0) + len(part_rows)
+            m["rows"] += sum(len(v) for v in groups.values())
+            self._advance_watermark(m, rows)
+            self._save_manifest(m)
+        return sum(len(v) for v in groups.values())
+
+    @staticmethod
+    def _advance_watermark(m, rows):
+        # watermark = revisione più alta esportata, con gli ID esportati proprio a quella revisione:
+        # il backfill riprende le righe a pari revisione che non sono tra questi
+        revs = [(_revision(r), str(r.get(KEY_FIELD) or "")) for r in rows if _revision(r)]
+        if not revs:
+            return
+        top = max(rev for rev, _ in revs)
+        ids = {key for rev, key in revs if rev == top}
+        if not m.get("watermark") or top > m["watermark"]:
+            m["watermark"], m["watermark_ids"] = top, sorted(ids)
+        elif top == m["watermark"]:
+            m["watermark_ids"] = sorted(set(m.get("watermark_ids") or []) | ids)
+
+    def _merge(self, d, parts, level):
+        # parts è un tratto contiguo che arriva al più recente: il file nuovo prende il suo posto nell'ordine
+        cols = _latest(self._concat(parts))
+        self._write_part(os.path.join(d, f"part-{time.time_ns()}-L{level}.npz"), cols)
+        for p in parts:
+            os.remove(p)
+
+    def _merge_levels(self, d):
+        """Riunisce i part più recenti finché non ce ne sono fanout dello stesso livello in fondo."""
+        while True:
+            parts = self._parts(d)
+            levels = [_level(p) for p in parts]
+            run = 0
+            while run < len(parts) and levels[-1 - run] == levels[-1]:
+                run += 1
+            if run < self.fanout:
+                return
+            self._merge(d, parts[-run:], levels[-1] + 1)
+
+    def compact(self, role=None, month=None):
+        """Riunisce i part file di ogni partizione (o di una sola) in un unico file, solo ultime versioni."""
+        merged = 0
+        with self._lock:
+            for d in self._partition_dirs(role, month):
+                parts = self._parts(d)
+                if len(parts) >= 2:
+                    self._merge(d, parts, max(_level(p) for p in parts) + 1)
+                    merged += 1
+        return merged
+
+    # --- lettura ---
+    def _partition_dirs(self, role=None, month=None):
+        r = f"role={quote(role, safe='')}" if role else "role=*"
+        mo = f"month={month}" if month else "month=*"
+        return sorted(glob.glob(os.path.join(self.root, r, mo)))
+
+    def partitions(self):
+        """[(ruolo, mese)] presenti su disco."""
+        out = []
+        for d in self._partition_dirs():
+            month_dir, role_dir = os.path.basename(d), os.path.basename(os.path.dirname(d))
+            out.append((unquote(role_dir[len("role="):]), month_dir[len("month="):]))
+        return out
+
+    @staticmethod
+    def _concat(parts):
+        loaded = []
+        for p in parts:
+            with np.load(p, allow_pickle=False) as z:
+                loaded.append({k: z[k] for k in z.files})
+        names = []
+        for c in loaded:
+            names.extend(k for k in c if k not in names)
+        out = {}
+        for name in names:
+            pieces = []
+            for c in loaded:
+                n = len(next(iter(c.values())))
+                if name in c:
+                    pieces.append(c[name])
+                else:  # colonna aggiunta dopo: valori mancanti nei part file più vecchi
+                    pieces.append(np.full(n, np.nan) if name in FLOAT_FIELDS else np.full(n, "", dtype=str))
+            out[name] = np.concatenate(pieces)
+        return out
+
+    def read(self, role=None, month=None, latest=True):
+        """Colonne ({nome: array}) delle partizioni richieste; apre solo le cartelle che corrispondono."""
+        parts = [p for d in self._partition_dirs(role, month) for p in self._parts(d)]
+        if not parts:
+            return {}
+        cols = self._concat(parts)
+        return _latest(cols) if latest else cols
+
+
+def backfill(exp, store):
+    """Aggiunge dal backend le righe con revisione oltre il watermark (tutte, se l'export è vuoto).
+
+    A pari revisione (i timestamp sono al secondo) si saltano solo gli ID già esportati a
+    quella revisione; una modifica ha una revisione nuova e viene aggiunta come nuova versione.
+    """
+    m = exp.manifest()
+    rows = store.fetch_all()
+    if m["rows"]:
+        wm = m["watermark"] or ""
+        seen = set(m.get("watermark_ids") or [])
+        rows = [
+            r for r in rows
+            if _revision(r) and (_revision(r) > wm or (_revision(r) == wm and str(r.get(KEY_FIELD) or "") not in seen))
+        ]
+    return exp.append(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Columnar, partitioned export of the saved submissions.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("backfill", help="append rows saved or edited after the watermark from a storage backend")
+    p.add_argument("--out", required=True, help="export directory")
+    p.add_argument("--backend", choices=BACKENDS, default="sheetbest")
+    p.add_argument("--url", help="Sheet.best URL")
+    p.add_argument("--path", help="SQLite file or columnar directory")
+    p = sub.add_parser("compact", help="merge the part files of each partition")
+    p.add_argument("--out", required=True)
+    p = sub.add_parser("read", help="write one role/month as CSV to stdout")
+    p.add_argument("--out", required=True)
+    p.add_argument("--role")
+    p.add_argument("--month", help="YYYY-MM")
+    args = parser.parse_args(argv)
+
+    exp = ColumnarExport(args.out)
+    if args.cmd == "backfill":
+        n = backfill(exp, open_storage(args.backend, url=args.url, path=args.path))
+        print(f"appended {n} rows; manifest: {json.dumps(exp.manifest())}", file=sys.stderr)
+    elif args.cmd == "compact":
+        print(f"compacted {exp.compact()} partitions", file=sys.stderr)
+    else:
+        cols = exp.read(args.role, args.month)
+        names = list(cols)
+        w = csv.writer(sys.stdout)
+        w.writerow(names)
+        w.writerows(zip(*(cols[k].tolist() for k in names)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,360 @@
+"""Motore di calcolo dell'impronta digitale, senza Streamlit.
+
+Le stesse formule di show_main() ma in forma vettoriale: le risposte arrivano come
+array (una riga per rispondente) e si ottengono i quattro totali per categoria.
+La pagina Streamlit usa score_answer() per il singolo utente, quindi i numeri
+sono identici a quelli del calcolo batch.
+
+I fattori di emissione stanno in factors.json, per versione: ogni versione è un
+set completo oppure {"base": <versione>, ...} con le sole voci che cambiano (le
+tabelle per etichetta si fondono con quelle della base). Il file viene letto e
+validato all'import; compile_factors() trasforma una versione in tabelle dense
+(indice categoria -> fattore), una volta per processo. La versione si sceglie
+con la configurazione (secret FACTORS_VERSION nell'app, --version negli script),
+il default è quello del file. I risultati salvati indicano la versione usata;
+rescore.py li ricalcola con un'altra.
+"""
+import collections
+import functools
+import json
+import math
+import os
+from types import MappingProxyType
+
+import numpy as np
+
+FACTORS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "factors.json")
+
+with open(FACTORS_FILE, encoding="utf-8") as _f:
+    _DATA = json.load(_f)
+FACTOR_SETS = _DATA["versions"]
+FACTORS_VERSION = _DATA["default"]  # versione di default, se la configurazione non ne indica un'altra
+
+# campi numerici e tabelle di ogni versione (oltre a "base" e a una "note" facoltativa)
+_SCALARS = ("days", "email_plain", "email_attach", "cloud_gb", "wifi", "print", "idle_on", "idle_off", "idle_hours")
+_TABLES = ("activity", "ai", "device", "eol", "lifespan", "equivalences", "life_multiplier")
+EQUIVALENCES = ("burgers", "led_hours", "car_km", "netflix_hours")  # kg CO2e per unità
+
+
+def _resolve(version, seen=()):
+    try:
+        spec = dict(FACTOR_SETS[version])
+    except KeyError:
+        raise ValueError(f"Unknown factors version: {version!r}") from None
+    spec.pop("note", None)
+    base = spec.pop("base", None)
+    unknown = [k for k in spec if k not in _SCALARS + _TABLES]
+    if unknown:
+        raise ValueError(f"Factors {version!r}: unknown keys {unknown}")
+    if base is None:
+        return spec
+    if base in seen + (version,):
+        raise ValueError(f"Circular base for factors version {version!r}")
+    merged = _resolve(base, seen + (version,))
+    for k, v in spec.items():
+        if k == "activity":
+            merged[k] = {r: {**merged[k].get(r, {}), **v.get(r, {})} for r in {**merged[k], **v}}
+        elif isinstance(v, dict):
+            merged[k] = {**merged[k], **v}
+        else:
+            merged[k] = v
+    return merged
+
+
+# --- Il questionario: etichette e ordine dei widget, dalla versione di default ---
+# (ogni altra versione deve avere le stesse etichette: lo controlla compile_factors)
+_QUESTIONNAIRE = _resolve(FACTORS_VERSION)
+ROLE_ACTIVITIES = {r: list(acts) for r, acts in _QUESTIONNAIRE["activity"].items()}
+ROLES = list(ROLE_ACTIVITIES)
+ACTIVITIES = list(dict.fromkeys(a for acts in ROLE_ACTIVITIES.values() for a in acts))
+AI_TASKS = list(_QUESTIONNAIRE["ai"])
+DEVICE_TYPES = list(_QUESTIONNAIRE["device"])
+USED_OPTIONS = ["-- Select --", "New", "Used"]
+SHARED_OPTIONS = ["-- Select --", "Personal", "Shared with family", "Shared in university"]
+EOL_OPTIONS = ["-- Select --"] + list(_QUESTIONNAIRE["eol"])
+IDLE_OPTIONS = ["I turn it off", "I leave it on (idle mode)", "I don’t have a computer"]
+
+# bucket delle risposte (etichetta -> valore rappresentativo): fanno parte del questionario, non dei fattori
+emails = {
+    "-- Select option --": 0,
+    "0": 0,
+    "1–10": 5,
+    "11–20": 15,
+    "21–30": 25,
+    "31–40": 35,
+    "41–80": 60,
+    "81–100": 90,
+    ">100": 150,
+}
+cloud_gb = {
+    "-- Select option --": 0,
+    "<5GB": 2.5,
+    "5–20GB": 12.5,
+    "20–50GB": 35,
+    "50–100GB": 75,
+    "100–200GB": 150,
+}
+
+# etichetta -> indice, per la codifica veloce delle risposte
+_ROLE_IDX = {v: i for i, v in enumerate(ROLES)}
+_ACTIVITY_IDX = {v: i for i, v in enumerate(ACTIVITIES)}
+_AI_IDX = {v: i for i, v in enumerate(AI_TASKS)}
+_DEVICE_IDX = {v: i for i, v in enumerate(DEVICE_TYPES)}
+_USED_IDX = {v: i for i, v in enumerate(USED_OPTIONS)}
+_SHARED_IDX = {v: i for i, v in enumerate(SHARED_OPTIONS)}
+_EOL_IDX = {v: i for i, v in enumerate(EOL_OPTIONS)}
+_IDLE_IDX = {v: i for i, v in enumerate(IDLE_OPTIONS)}
+
+# per ruolo, le colonne di ACTIVITIES nell'ordine dei suoi widget (-1 = nessuna): score_activities
+# somma le ore in quest'ordine, come show_main, così i totali coincidono bit per bit
+_ROLE_ACT_COLS = np.full((len(ROLES), max(map(len, ROLE_ACTIVITIES.values()))), -1, dtype=np.intp)
+for _i, _r in enumerate(ROLES):
+    _ROLE_ACT_COLS[_i, :len(ROLE_ACTIVITIES[_r])] = [_ACTIVITY_IDX[a] for a in ROLE_ACTIVITIES[_r]]
+
+
+class Factors(collections.namedtuple(
+    "Factors",
+    "version device eol life_mult act ai idle_total lifespan days email_plain email_attach cloud_gb wifi print "
+    "equivalences",
+)):
+    """Tabelle dense di una versione (vedi compile_factors), più l'accesso per etichetta per UI e tips."""
+    __slots__ = ()
+
+    def device_ef(self, device):
+        """kg CO2e di produzione del device (0 se sconosciuto)."""
+        i = _DEVICE_IDX.get(device)
+        return 0.0 if i is None else float(self.device[i])
+
+    def default_lifespan(self, device, fallback=5.0):
+        i = _DEVICE_IDX.get(device)
+        return fallback if i is None else float(self.lifespan[i])
+
+    def eol_modifier(self, eol):
+        return float(self.eol[_EOL_IDX.get(eol, 0)])
+
+    def life_multiplier(self, used, shared):
+        """Moltiplicatore degli anni per condizione e ownership (1 per le combinazioni incomplete)."""
+        return float(self.life_mult[_USED_IDX.get(used, 0), _SHARED_IDX.get(shared, 0)])
+
+
+def _table(values, labels, what, version):
+    missing = [l for l in labels if l not in values]
+    extra = [k for k in values if k not in labels]
+    if missing or extra:
+        raise ValueError(f"Factors {version!r}, {what}: missing {missing}, unknown {extra}")
+    return np.array([float(values[l]) for l in labels])
+
+
+def compile_factors(version=None):
+    """Factors di una versione (default FACTORS_VERSION), validati e compilati una volta per processo."""
+    return _compile(version or FACTORS_VERSION)
+
+
+@functools.lru_cache(maxsize=None)
+def _compile(version):
+    spec = _resolve(version)
+    missing = [k for k in _SCALARS + _TABLES if k not in spec]
+    if missing:
+        raise ValueError(f"Factors {version!r}: missing {missing}")
+    for k in _SCALARS:
+        if isinstance(spec[k], bool) or not isinstance(spec[k], (int, float)) or not math.isfinite(spec[k]):
+            raise ValueError(f"Factors {version!r}: {k} must be a number")
+    act = spec["activity"]
+    if sorted(act) != sorted(ROLES):
+        raise ValueError(f"Factors {version!r}, activity: roles must be {ROLES}")
+    for r in ROLES:
+        unknown = [a for a in act[r] if a not in _ACTIVITY_IDX]
+        if unknown:
+            raise ValueError(f"Factors {version!r}, activity {r}: unknown {unknown}")
+    life = np.array(spec["life_multiplier"], dtype=float)
+    if life.shape != (len(USED_OPTIONS), len(SHARED_OPTIONS)):
+        raise ValueError(f"Factors {version!r}: life_multiplier must be {len(USED_OPTIONS)}x{len(SHARED_OPTIONS)}")
+    days = float(spec["days"])
+    f = Factors(
+        version=version,
+        device=_table(spec["device"], DEVICE_TYPES, "device", version),
+        eol=np.concatenate([[0.0], _table(spec["eol"], EOL_OPTIONS[1:], "eol", version)]),
+        life_mult=life,
+        act=np.array([[float(act[r].get(a, 0.0)) for a in ACTIVITIES] for r in ROLES]),
+        ai=_table(spec["ai"], AI_TASKS, "ai", version),
+        idle_total=np.array([
+            days * spec["idle_off"] * spec["idle_hours"], days * spec["idle_on"] * spec["idle_hours"], 0.0,
+        ]),
+        lifespan=_table(spec["lifespan"], DEVICE_TYPES, "lifespan", version),
+        days=days,
+        email_plain=float(spec["email_plain"]),
+        email_attach=float(spec["email_attach"]),
+        cloud_gb=float(spec["cloud_gb"]),
+        wifi=float(spec["wifi"]),
+        print=float(spec["print"]),
+        equivalences=MappingProxyType(dict(zip(
+            EQUIVALENCES, _table(spec["equivalences"], EQUIVALENCES, "equivalences", version).tolist()
+        ))),
+    )
+    arrays = (f.device, f.eol, f.life_mult, f.act, f.ai, f.idle_total, f.lifespan)
+    if not all(np.isfinite(a).all() for a in arrays):
+        raise ValueError(f"Factors {version!r}: all factors must be finite numbers")
+    if (f.lifespan <= 0).any() or min(f.equivalences.values()) <= 0 or days <= 0:
+        raise ValueError(f"Factors {version!r}: days, lifespans and equivalences must be positive")
+    for a in arrays:
+        a.setflags(write=False)  # condivise tra sessioni e thread
+    return f
+
+
+# un file non valido fa fallire l'import, non il primo calcolo
+for _v in FACTOR_SETS:
+    compile_factors(_v)
+
+
+def _lookup(table, value, what):
+    try:
+        return table[value]
+    except KeyError:
+        raise ValueError(f"Unknown {what}: {value!r}") from None
+
+
+def adjusted_years(years, used, shared, factors=None):
+    """Anni di vita effettivi del device (uso condiviso / usato), come in show_main()."""
+    f = factors or compile_factors()
+    return years * f.life_mult[used, shared]
+
+
+def score_devices(n, owner, dev_type, years, used, shared, eol, factors=None):
+    """Ritorna (Devices, E-Waste) per n rispondenti; ogni device indica il suo rispondente in owner."""
+    f = factors or compile_factors()
+    impact = f.device[dev_type]
+    adj = adjusted_years(np.asarray(years, dtype=float), used, shared, f)
+    safe = np.where(adj != 0, adj, 1.0)
+    prod = np.where(adj != 0, impact / safe, 0.0)
+    eol_impact = np.where(adj != 0, (impact * f.eol[eol]) / safe, 0.0)
+    return (
+        np.bincount(owner, weights=prod, minlength=n),
+        np.bincount(owner, weights=eol_impact, minlength=n),
+    )
+
+
+def score_activities(role, hours, email_plain, email_attach, cloud, wifi, pages, idle, factors=None):
+    """Totale Digital Activities: ore per attività + email, cloud, wifi, stampa e idle."""
+    f = factors or compile_factors()
+    rows = np.arange(len(role))
+    # somma in sequenza, un'attività del ruolo alla volta (non .sum(), che è a coppie)
+    hours_total = np.zeros(len(role))
+    for cols in _ROLE_ACT_COLS[role].T:
+        hours_total += np.where(cols >= 0, hours[rows, cols] * f.act[role, cols] * f.days, 0.0)
+    mail_total = (email_plain * f.email_plain + email_attach * f.email_attach + cloud * f.cloud_gb) * f.days
+    wifi_total = wifi * f.wifi * f.days
+    print_total = pages * f.print * (f.days / 5)
+    return hours_total + mail_total + wifi_total + print_total + f.idle_total[idle]
+
+
+def score_ai(queries, factors=None):
+    """Totale AI Tools: query giornaliere per task × fattore × giorni."""
+    f = factors or compile_factors()
+    # somma in sequenza nell'ordine dei widget (AI_TASKS), come show_main: non .sum(), che è a coppie
+    total = np.zeros(len(queries))
+    for j in range(len(AI_TASKS)):
+        total += queries[:, j] * f.ai[j] * f.days
+    return total
+
+
+def score(cols, version=None):
+    """Calcola i quattro totali per categoria da un dizionario di colonne (vedi encode_answers).
+
+    version: versione dei fattori (default FACTORS_VERSION).
+    """
+    f = compile_factors(version)
+    n = len(cols["role"])
+    devices, ewaste = score_devices(
+        n, cols["dev_owner"], cols["dev_type"], cols["dev_years"],
+        cols["dev_used"], cols["dev_shared"], cols["dev_eol"], f,
+    )
+    digital = score_activities(
+        cols["role"], cols["hours"], cols["email_plain"], cols["email_attach"],
+        cols["cloud"], cols["wifi"], cols["pages"], cols["idle"], f,
+    )
+    return {
+        "Devices": devices,
+        "E-Waste": ewaste,
+        "Digital Activities": digital,
+        "AI Tools": score_ai(cols["ai"], f),
+    }
+
+
+def _device_codes(d):
+    """(tipo, anni, condizione, uso, fine vita) di un device, come indici delle tabelle dei fattori."""
+    return (
+        _lookup(_DEVICE_IDX, d.get("type"), "device"),
+        float(d.get("years", 0) or 0),
+        _lookup(_USED_IDX, d.get("used", "-- Select --"), "condition"),
+        _lookup(_SHARED_IDX, d.get("shared", "-- Select --"), "ownership"),
+        _lookup(_EOL_IDX, d.get("eol", "-- Select --"), "end-of-life option"),
+    )
+
+
+def encode_answers(answers):
+    """
+    Converte una lista di risposte (dict con etichette come nei widget) in colonne NumPy.
+
+    Formato di una risposta:
+      {"role": "Student",
+       "devices": [{"type": "Laptop Computer", "years": 5, "used": "New",
+                    "shared": "Personal", "eol": "I sell or donate it to someone else"}],
+       "hours": {"Web browsing": 2.0, ...}, "email_plain": "1–10", "email_attach": "0",
+       "cloud": "<5GB", "wifi": 4.0, "pages": 0, "idle": "I turn it off",
+       "ai": {"Explain a concept": 5, ...}}
+    """
+    n = len(answers)
+    role = np.empty(n, dtype=np.intp)
+    hours = np.zeros((n, len(ACTIVITIES)))
+    ai = np.zeros((n, len(AI_TASKS)))
+    email_plain = np.empty(n)
+    email_attach = np.empty(n)
+    cloud = np.empty(n)
+    wifi = np.empty(n)
+    pages = np.empty(n)
+    idle = np.empty(n, dtype=np.intp)
+    dev_owner, dev_type, dev_years, dev_used, dev_shared, dev_eol = [], [], [], [], [], []
+
+    for i, a in enumerate(answers):
+        role[i] = _lookup(_ROLE_IDX, a.get("role"), "role")
+        for act, h in (a.get("hours") or {}).items():
+            hours[i, _lookup(_ACTIVITY_IDX, act, "activity")] = float(h or 0)
+        for task, q in (a.get("ai") or {}).items():
+            ai[i, _lookup(_AI_IDX, task, "AI task")] = float(q or 0)
+        email_plain[i] = _lookup(emails, a.get("email_plain", "-- Select option --"), "email bucket")
+        email_attach[i] = _lookup(emails, a.get("email_attach", "-- Select option --"), "email bucket")
+        cloud[i] = _lookup(cloud_gb, a.get("cloud", "-- Select option --"), "cloud bucket")
+        wifi[i] = float(a.get("wifi", 4.0))
+        pages[i] = int(a.get("pages", 0) or 0)
+        idle[i] = _lookup(_IDLE_IDX, a.get("idle", IDLE_OPTIONS[2]), "idle option")
+        for d in a.get("devices") or []:
+            t, y, u, s, e = _device_codes(d)
+            dev_owner.append(i)
+            dev_type.append(t)
+            dev_years.append(y)
+            dev_used.append(u)
+            dev_shared.append(s)
+            dev_eol.append(e)
+
+    return {
+        "role": role, "hours": hours, "ai": ai,
+        "email_plain": email_plain, "email_attach": email_attach, "cloud": cloud,
+        "wifi": wifi, "pages": pages, "idle": idle,
+        "dev_owner": np.array(dev_owner, dtype=np.intp),
+        "dev_type": np.array(dev_type, dtype=np.intp),
+        "dev_years": np.array(dev_years, dtype=float),
+        "dev_used": np.array(dev_used, dtype=np.intp),
+        "dev_shared": np.array(dev_shared, dtype=np.intp),
+        "dev_eol": np.array(dev_eol, dtype=np.intp),
+    }
+
+
+def score_answers(answers, version=None):
+    """Scorciatoia: encode_answers() + score()."""
+    return score(encode_answers(answers), version)
+
+
+def score_answer(answer, version=None):
+    """Totali per un singolo rispondente, come float (usato dalla pagina Streamlit)."""
+    totals = score_answers([answer], version)
+    return {k: float(v[0]) for k, v in totals.items()}
@@ -0,0 +1,138 @@
+"""Client HTTP condiviso per tutto il traffico verso Sheet.best.
+
+Una sola requests.Session (thread-safe per l'uso che ne facciamo) con pool di
+connessioni keep-alive limitato, timeout diversi per endpoint e misure separate
+del tempo di connessione (TCP+TLS, solo per le connessioni nuove) e del tempo di
+risposta/trasferimento, così si vede quanto fa risparmiare il riuso.
+"""
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+
+# tempo di connect() accumulato dal thread corrente durante la richiesta in corso
+_tls = threading.local()
+
+
+def _timed_connect(connect):
+    t0 = time.perf_counter()
+    try:
+        connect()
+    finally:
+        _tls.connect_s = getattr(_tls, "connect_s", 0.0) + (time.perf_counter() - t0)
+        _tls.new_conns = getattr(_tls, "new_conns", 0) + 1
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        _timed_connect(super().connect)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        _timed_connect(super().connect)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+def maybe_sent(exc):
+    """
+    True se una richiesta fallita con exc può essere arrivata al server: read timeout,
+    connessione chiusa dopo l'invio, risposta troncata, 504 (il gateway non sa com'è finita).
+    False se di sicuro non è partita o è stata respinta: connect fallita, risposte di
+    errore (429, 503, ...) e tutto ciò che non viene da requests (es. CircuitOpen).
+    """
+    if isinstance(exc, requests.HTTPError):
+        return exc.response is not None and exc.response.status_code == 504
+    if isinstance(exc, requests.ConnectTimeout):
+        return False
+    if isinstance(exc, requests.ConnectionError):
+        reason = getattr(exc.args[0], "reason", None) if exc.args else None
+        return not isinstance(reason, NewConnectionError)
+    return isinstance(exc, (requests.ReadTimeout, requests.exceptions.ChunkedEncodingError))
+
+
+class PooledClient:
+    def __init__(self, timeouts=None, default_timeout=(3.05, 10), pool_size=10):
+        """timeouts: {endpoint: (connect, read)} in secondi; pool_size: connessioni massime per host."""
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout = default_timeout
+        self._session = requests.Session()
+        adapter = _TimedAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def request(self, endpoint, method, url, **kwargs):
+        """Come requests.request(); endpoint è un nome logico ('save', 'stats', ...) per timeout e metriche."""
+        kwargs.setdefault("timeout", self.timeouts.get(endpoint, self.default_timeout))
+        _tls.connect_s, _tls.new_conns = 0.0, 0
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            r = self._session.request(method, url, stream=True, **kwargs)
+            t_headers = time.perf_counter()
+            r.content  # legge il corpo qui, per misurare il trasferimento
+            ok = True
+            return r
+        finally:
+            t_end = time.perf_counter()
+            self._record(endpoint, ok, _tls.connect_s, _tls.new_conns,
+                         (t_headers - t0) if ok else (t_end - t0), (t_end - t_headers) if ok else 0.0)
+
+    def get(self, endpoint, url, **kwargs):
+        return self.request(endpoint, "GET", url, **kwargs)
+
+    def post(self, endpoint, url, **kwargs):
+        return self.request(endpoint, "POST", url, **kwargs)
+
+    def patch(self, endpoint, url, **kwargs):
+        return self.request(endpoint, "PATCH", url, **kwargs)
+
+    def _record(self, endpoint, ok, connect_s, new_conns, wait_s, transfer_s):
+        with self._lock:
+            s = self._stats.setdefault(endpoint, {
+                "requests": 0, "errors": 0, "new_connections": 0,
+                "connect_ms": 0.0, "wait_ms": 0.0, "transfer_ms": 0.0,
+            })
+            s["requests"] += 1
+            s["errors"] += 0 if ok else 1
+            s["new_connections"] += new_conns
+            s["connect_ms"] += connect_s * 1000
+            # wait = dall'invio agli header, esclusa la connessione
+            s["wait_ms"] += max(0.0, wait_s - connect_s) * 1000
+            s["transfer_ms"] += transfer_s * 1000
+
+    def stats(self):
+        """Per endpoint: totali e medie (ms) di connessione, attesa della risposta e trasferimento."""
+        with self._lock:
+            out = {}
+            for ep, s in self._stats.items():
+                n = s["requests"] or 1
+                out[ep] = {
+                    "requests": s["requests"], "errors": s["errors"], "new_connections": s["new_connections"],
+                    "avg_connect_ms": round(s["connect_ms"] / n, 2),
+                    "avg_wait_ms": round(s["wait_ms"] / n, 2),
+                    "avg_transfer_ms": round(s["transfer_ms"] / n, 2),
+                }
+            return out
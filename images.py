@@ -0,0 +1,135 @@
+"""Varianti delle immagini dell'app già ridimensionate, in WebP (o AVIF), con hash nel nome.
+
+st.image() con un file PNG lo rilegge, decodifica, ridimensiona e ricodifica a
+ogni render: sulla pagina guess sono 7 MB di PNG e ~240 ms di CPU a ogni rerun.
+Qui ogni coppia (immagine, larghezza) viene prodotta una volta sola:
+
+    static/img/<nome>-<larghezza>w.<hash>.webp
+
+L'hash dipende dal sorgente e dai parametri di codifica, quindi un'immagine
+modificata ha un nome nuovo e un file già presente non viene rifatto. In memoria
+ogni variante è caricata una volta per processo (get_variant); a st.image va il
+suo URL statico (assets.static_url) o, senza static serving, il suo data URI:
+Streamlit li passa al browser così come sono, senza ricodificarli.
+
+Build (facoltativa, altrimenti le varianti si creano al primo uso) e riepilogo
+dei byte per pagina:
+
+    python images.py [--format avif]
+"""
+import argparse
+import base64
+import collections
+import functools
+import hashlib
+import io
+import os
+import sys
+
+from PIL import Image, features
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+OUT_DIR = os.path.join(HERE, "static", "img")
+
+# formato -> (formato Pillow, mime, opzioni di salvataggio)
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 82, "method": 6}),
+    "avif": ("AVIF", "image/avif", {"quality": 60, "speed": 4}),
+}
+
+ARCHETYPE_IMAGES = [
+    "lord_of_the_latest_gadgets.png", "prompt_pirate.png", "guardian_ewaste.png", "master_endless_streams.png",
+]
+# (immagine, larghezza in px) di ogni chiamata a st.image di app.py
+VARIANTS = (
+    [("logo.png", 300), ("logo2.png", 300)]
+    + [(name, 290) for name in ARCHETYPE_IMAGES]
+    + [(name, 180) for name in ARCHETYPE_IMAGES]
+)
+# cosa carica ogni pagina, per il riepilogo (results_cards mostra solo l'archetipo dell'utente)
+PAGES = {
+    "intro": [("logo.png", 300), ("logo2.png", 300)],
+    "guess": [(name, 290) for name in ARCHETYPE_IMAGES],
+    "results_cards": [(ARCHETYPE_IMAGES[0], 180)],
+}
+
+Variant = collections.namedtuple("Variant", "source width format mime path data")
+
+
+def available_format(fmt):
+    """Il formato richiesto se Pillow lo sa scrivere, altrimenti webp."""
+    if fmt in FORMATS and features.check(FORMATS[fmt][0].lower()):
+        return fmt
+    print(f"[images] format {fmt!r} not available, using webp", file=sys.stderr)
+    return "webp"
+
+
+def variant_name(source, width, fmt, src_bytes):
+    pil_format, _, opts = FORMATS[fmt]
+    h = hashlib.sha256(src_bytes)
+    h.update(repr((width, pil_format, sorted(opts.items()))).encode())
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return f"{stem}-{width}w.{h.hexdigest()[:12]}.{fmt}"
+
+
+def encode_variant(src_bytes, width, fmt):
+    """Ridimensiona (mai ingrandisce) e codifica; l'alpha resta se c'è."""
+    pil_format, _, opts = FORMATS[fmt]
+    with Image.open(io.BytesIO(src_bytes)) as im:
+        im = im.convert("RGBA" if "A" in im.getbands() or "transparency" in im.info else "RGB")
+        if im.width > width:
+            im = im.resize((width, round(im.height * width / im.width)), Image.LANCZOS)
+        buf = io.BytesIO()
+        im.save(buf, pil_format, **opts)
+    return buf.getvalue()
+
+
+@functools.lru_cache(maxsize=None)
+def get_variant(source, width, fmt="webp", out_dir=OUT_DIR):
+    """Variante di source larga width px: dal disco se già prodotta, altrimenti creata e salvata."""
+    fmt = available_format(fmt)
+    with open(os.path.join(HERE, source), "rb") as f:
+        src_bytes = f.read()
+    path = os.path.join(out_dir, variant_name(source, width, fmt, src_bytes))
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        data = encode_variant(src_bytes, width, fmt)
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+            tmp = f"{path}.tmp-{os.getpid()}"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:  # disco in sola lettura: la variante resta solo in memoria
+            print(f"[images] cannot write {path}: {e}", file=sys.stderr)
+    return Variant(source, width, fmt, FORMATS[fmt][1], path, data)
+
+
+def data_uri(variant):
+    return f"data:{variant.mime};base64,{base64.b64encode(variant.data).decode('ascii')}"
+
+
+def build_all(fmt="webp"):
+    """Prepara tutte le varianti usate dall'app; ritorna {(sorgente, larghezza): Variant}."""
+    return {(src, w): get_variant(src, w, fmt) for src, w in VARIANTS}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the resized image variants used by the app.")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="webp")
+    args = parser.parse_args(argv)
+    variants = build_all(args.format)
+    for v in variants.values():
+        print(f"{os.path.relpath(v.path, HERE)}  {len(v.data):,} bytes")
+    print(f"{'page':<15}{'PNG read/render':>16}{'variant bytes':>15}")
+    for page, imgs in PAGES.items():
+        src = sum(os.path.getsize(os.path.join(HERE, s)) for s, _ in imgs)
+        out = sum(len(variants[(s, w)].data) for s, w in imgs)
+        print(f"{page:<15}{src:>16,}{out:>15,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
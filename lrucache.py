@@ -0,0 +1,54 @@
+"""Cache LRU di processo, limitata, condivisa da tutte le sessioni.
+
+Pensata per valori immutabili calcolati da una chiave (es. results.Results per
+risposta canonica): oltre maxsize voci viene scartata quella usata meno di
+recente. Il calcolo avviene fuori dal lock, quindi due sessioni che chiedono
+insieme la stessa chiave mancante possono calcolarla entrambe: il risultato è
+identico e ne resta una sola copia.
+"""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, maxsize=4096, name="lru"):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.name = name
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get_or_compute(self, key, compute):
+        """Valore per key dalla cache, oppure compute() (salvato in cache) se manca."""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self._stats["misses"] += 1
+            else:
+                self._data.move_to_end(key)
+                self._stats["hits"] += 1
+                return value
+        value = compute()
+        with self._lock:
+            value = self._data.setdefault(key, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            s["size"] = len(self._data)
+        s["maxsize"] = self.maxsize
+        lookups = s["hits"] + s["misses"]
+        s["hit_rate"] = round(s["hits"] / lookups, 4) if lookups else None
+        return s
@@ -0,0 +1,155 @@
+"""Outbox locale e durevole (SQLite in modalità WAL) per le righe da inviare.
+
+Ogni invio viene prima salvato qui; il worker di writebehind lo rimuove solo dopo
+la conferma del server, quindi le righe sopravvivono a timeout, rate limit e
+riavvii del processo.
+
+Le righe con una chiave (l'ID della submission) sono deduplicate: un nuovo add()
+con la stessa chiave sostituisce la riga ancora in attesa invece di accodarne
+un'altra, e le chiavi già confermate restano nella tabella sent, così il worker
+sa che la riga va aggiornata sul server e non inserita di nuovo. Lo stesso vale per
+le righe con uncertain: un invio precedente potrebbe essere arrivato al server.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    created REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_try REAL NOT NULL DEFAULT 0,
+    solo INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS outbox_next_try ON outbox (next_try, id);
+CREATE TABLE IF NOT EXISTS sent (
+    key TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    sent REAL NOT NULL
+);
+"""
+
+# riga presa dal worker; prev è l'ultima versione confermata dal server per la stessa chiave (o None)
+Entry = namedtuple("Entry", "id row created attempts solo key rev prev uncertain")
+
+
+class Outbox:
+    def __init__(self, path, lease=60.0):
+        self.path = path
+        self.lease = lease  # secondi in cui una riga presa dal worker non viene ripresa
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        cols = {r[1] for r in self._db.execute("PRAGMA table_info(outbox)")}
+        if "solo" not in cols:
+            self._db.execute("ALTER TABLE outbox ADD COLUMN solo INTEGER NOT NULL DEFAULT 0")
+        if "key" not in cols:
+            self._db.execute("ALTER TABLE outbox ADD COLUMN key TEXT")
+            self._db.execute("ALTER TABLE outbox ADD COLUMN rev INTEGER NOT NULL DEFAULT 0")
+        if "uncertain" not in cols:
+            self._db.execute("ALTER TABLE outbox ADD COLUMN uncertain INTEGER NOT NULL DEFAULT 0")
+        self._db.execute("CREATE UNIQUE INDEX IF NOT EXISTS outbox_key ON outbox (key) WHERE key IS NOT NULL")
+
+    def add(self, row, key=None):
+        """
+        Salva la riga (commit immediato) e ritorna il suo id. Con una chiave già in attesa
+        sostituisce il payload di quella riga (rev + 1) invece di aggiungerne un'altra.
+        """
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO outbox (payload, created, key) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) WHERE key IS NOT NULL DO UPDATE SET payload = excluded.payload, rev = rev + 1 "
+                "RETURNING id",
+                (json.dumps(row, ensure_ascii=False), time.time(), key),
+            )
+            (row_id,) = cur.fetchone()
+            return row_id
+
+    def take(self, limit):
+        """
+        Prende fino a limit righe pronte (in ordine di arrivo) e le "affitta" per lease
+        secondi, così un altro processo sullo stesso file non le invia due volte.
+        Ritorna una lista di Entry.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT o.id, o.payload, o.created, o.attempts, o.solo, o.key, o.rev, s.payload, o.uncertain "
+                    "FROM outbox o LEFT JOIN sent s ON s.key = o.key "
+                    "WHERE o.next_try <= ? ORDER BY o.id LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                self._db.executemany(
+                    "UPDATE outbox SET next_try = ? WHERE id = ?", [(now + self.lease, r[0]) for r in rows]
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return [
+            Entry(i, json.loads(p), created, attempts, solo, key, rev, json.loads(prev) if prev else None, bool(unc))
+            for i, p, created, attempts, solo, key, rev, prev, unc in rows
+        ]
+
+    def ack(self, entries):
+        """
+        Righe confermate dal server: vengono cancellate e la loro chiave finisce in sent.
+        Se nel frattempo la riga è stata sostituita (rev diverso) resta in coda e parte subito,
+        come aggiornamento.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for e in entries:
+                    if e.key is not None:
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO sent (key, payload, sent) VALUES (?, ?, ?)",
+                            (e.key, json.dumps(e.row, ensure_ascii=False), now),
+                        )
+                    cur = self._db.execute("DELETE FROM outbox WHERE id = ? AND rev = ?", (e.id, e.rev))
+                    if cur.rowcount == 0:
+                        self._db.execute("UPDATE outbox SET next_try = 0, attempts = 0 WHERE id = ?", (e.id,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def retry_later(self, ids, delay, solo=False, uncertain=False):
+        """
+        Invio fallito: ritenta tra delay secondi. solo=True: la riga sarà inviata da sola;
+        uncertain=True: l'invio potrebbe essere arrivato al server, il prossimo sarà un upsert.
+        """
+        with self._lock:
+            self._db.executemany(
+                "UPDATE outbox SET attempts = attempts + 1, next_try = ?, solo = MAX(solo, ?), "
+                "uncertain = MAX(uncertain, ?) WHERE id = ?",
+                [(time.time() + delay, int(solo), int(uncertain), i) for i in ids],
+            )
+
+    def ready(self):
+        """(righe pronte da inviare, timestamp di creazione della più vecchia)."""
+        with self._lock:
+            n, oldest = self._db.execute(
+                "SELECT COUNT(*), MIN(created) FROM outbox WHERE next_try <= ?", (time.time(),)
+            ).fetchone()
+        return n, oldest
+
+    def next_due(self):
+        """Timestamp del prossimo tentativo in programma, o None se l'outbox è vuoto."""
+        with self._lock:
+            (t,) = self._db.execute("SELECT MIN(next_try) FROM outbox").fetchone()
+        return t
+
+    def count(self):
+        with self._lock:
+            (n,) = self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()
+        return n
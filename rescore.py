@@ -0,0 +1,209 @@
+"""Ricalcolo delle submission salvate con un'altra versione dei fattori (factors.json).
+
+Esempi:
+    python rescore.py --version v2 --export export/ -o rescore-v2.csv
+    python rescore.py --version v2 --backend sqlite --path submissions.sqlite3 -o rescore-v2.csv
+
+Le risposte complete (colonna 'Answers', vedi answer_codec.py) vengono decodificate
+a blocchi con decode_many() e ricalcolate con footprint.score(): tutto vettoriale,
+quindi anche milioni di righe richiedono pochi minuti su una macchina. Dall'export
+colonnare si legge una partizione alla volta e la memoria resta limitata.
+
+L'output CSV ha, per ogni submission, i totali salvati accanto a quelli ricalcolati
+('CO2 Total' e 'CO2 Total [v2]', ...). Il riepilogo su stderr riporta per categoria
+la media prima/dopo, la differenza media, la variazione % e la differenza massima,
+e la differenza media del totale per ruolo. Le righe senza 'Answers' (salvate prima
+che esistesse la colonna) vengono saltate e contate; così anche quelle con un codice
+che non si decodifica (troncato, o con un'opzione che non viene più calcolata), che
+vengono anche segnalate una per una, come con score_batch.py --skip-invalid.
+
+I totali salvati sono arrotondati a 6 decimali: a parità di versione le
+differenze restano sotto 1e-6.
+"""
+import argparse
+import csv
+import sys
+import time
+
+import numpy as np
+
+import answer_codec
+from export import ColumnarExport
+from footprint import FACTORS_VERSION, compile_factors, score
+from storage import BACKENDS, FLOAT_FIELDS, KEY_FIELD, _num, open_storage
+
+ANSWERS_FIELD = "Answers"
+VERSION_FIELD = "Factors Version"
+ID_FIELDS = [KEY_FIELD, "Timestamp", "Role", VERSION_FIELD]
+# colonna salvata -> categoria di footprint.score() (None = totale)
+CATEGORIES = {
+    "CO2 Devices": "Devices",
+    "CO2 E-Waste": "E-Waste",
+    "CO2 AI": "AI Tools",
+    "CO2 Digital Activities": "Digital Activities",
+    "CO2 Total": None,
+}
+
+
+def _decode_valid(answers, ids):
+    """decode_many() del blocco; se fallisce, riga per riga: ritorna (colonne, maschera dei codici validi)."""
+    try:
+        return answer_codec.decode_many(answers), np.ones(len(answers), dtype=bool)
+    except (ValueError, IndexError):
+        pass
+    ok = np.zeros(len(answers), dtype=bool)
+    for i, a in enumerate(answers):
+        try:
+            answer_codec.decode_many([a])
+        except (ValueError, IndexError) as e:
+            print(f"[rescore] skipping submission {ids[i] or '(no id)'}: {e}", file=sys.stderr)
+            continue
+        ok[i] = True
+    return answer_codec.decode_many([a for a, k in zip(answers, ok) if k]), ok
+
+
+def rescore_columns(cols, version):
+    """Colonne di submission -> (maschera righe ricalcolate, {campo: array ricalcolato}, n. codici invalidi)."""
+    answers = cols[ANSWERS_FIELD]
+    mask = np.array([bool(a) for a in answers], dtype=bool)
+    ids = cols[KEY_FIELD] if KEY_FIELD in cols else [""] * len(answers)
+    present = np.flatnonzero(mask)
+    decoded, ok = _decode_valid([answers[i] for i in present], [ids[i] for i in present])
+    mask[present[~ok]] = False
+    totals = score(decoded, version)
+    new = {field: totals[cat] for field, cat in CATEGORIES.items() if cat}
+    new["CO2 Total"] = sum(totals.values())
+    return mask, new, int((~ok).sum())
+
+
+class Report:
+    """Somme per categoria e per ruolo, accumulate blocco per blocco."""
+
+    def __init__(self, version):
+        self.version = version
+        self.rows = 0
+        self.skipped = 0
+        self.invalid = 0
+        self.old = dict.fromkeys(FLOAT_FIELDS, 0.0)
+        self.new = dict.fromkeys(FLOAT_FIELDS, 0.0)
+        self.max_abs = dict.fromkeys(FLOAT_FIELDS, 0.0)
+        self.changed = 0
+        self.roles = {}  # ruolo -> [righe, somma totale salvato, somma totale nuovo]
+
+    def add(self, roles, old, new, skipped, invalid=0):
+        n = len(roles)
+        self.rows += n
+        self.skipped += skipped
+        self.invalid += invalid
+        if not n:
+            return
+        for field in FLOAT_FIELDS:
+            delta = new[field] - old[field]
+            self.old[field] += float(old[field].sum())
+            self.new[field] += float(new[field].sum())
+            self.max_abs[field] = max(self.max_abs[field], float(np.abs(delta).max()))
+        self.changed += int((np.abs(new["CO2 Total"] - old["CO2 Total"]) > 1e-6).sum())
+        keys, inv = np.unique(roles, return_inverse=True)
+        n_role = np.bincount(inv, minlength=len(keys))
+        old_role = np.bincount(inv, weights=old["CO2 Total"], minlength=len(keys))
+        new_role = np.bincount(inv, weights=new["CO2 Total"], minlength=len(keys))
+        for k, c, o, w in zip(keys.tolist(), n_role, old_role, new_role):
+            acc = self.roles.setdefault(k, [0, 0.0, 0.0])
+            acc[0] += int(c)
+            acc[1] += float(o)
+            acc[2] += float(w)
+
+    def print(self, out=sys.stderr):
+        n = max(self.rows, 1)
+        print(f"rescored {self.rows} rows with factors {self.version} "
+              f"({self.changed} changed, {self.skipped} skipped without {ANSWERS_FIELD}, "
+              f"{self.invalid} skipped with an undecodable {ANSWERS_FIELD})", file=out)
+        print(f"{'category':<24}{'mean before':>12}{'mean after':>12}{'mean delta':>12}{'change':>9}{'max |delta|':>13}",
+              file=out)
+        for field in FLOAT_FIELDS:
+            before, after = self.old[field] / n, self.new[field] / n
+            pct = (after - before) / before * 100 if before else 0.0
+            print(f"{field:<24}{before:>12.3f}{after:>12.3f}{after - before:>+12.3f}{pct:>+8.2f}%"
+                  f"{self.max_abs[field]:>13.3f}", file=out)
+        for role, (c, o, w) in sorted(self.roles.items()):
+            print(f"  {role or '(no role)'}: {c} rows, mean total {o / c:.3f} -> {w / c:.3f} ({(w - o) / c:+.3f})",
+                  file=out)
+
+
+def chunks_from_export(exp, chunk_size):
+    """Blocchi di colonne dall'export, una partizione alla volta (solo ultime versioni)."""
+    for role, month in exp.partitions():
+        cols = exp.read(role, month)
+        n = len(cols.get(KEY_FIELD, ()))
+        for i in range(0, n, chunk_size):
+            yield {k: v[i:i + chunk_size] for k, v in cols.items()}
+
+
+def chunks_from_storage(store, chunk_size):
+    rows = store.fetch_all()
+    for i in range(0, len(rows), chunk_size):
+        part = rows[i:i + chunk_size]
+        cols = {k: np.array([str(r.get(k) or "") for r in part], dtype=object) for k in ID_FIELDS + [ANSWERS_FIELD]}
+        for field in FLOAT_FIELDS:
+            cols[field] = np.array([_num(r.get(field)) for r in part], dtype=float)
+        yield cols
+
+
+def run(chunks, version, out, report, progress=sys.stderr):
+    """Ricalcola ogni blocco e scrive le righe (salvato accanto a ricalcolato); ritorna i secondi."""
+    compile_factors(version)  # versione sconosciuta o non valida: errore prima di leggere i dati
+    w = csv.writer(out, lineterminator="\n")
+    w.writerow(ID_FIELDS + [name for field in FLOAT_FIELDS for name in (field, f"{field} [{version}]")])
+    t0 = time.perf_counter()
+    for cols in chunks:
+        n = len(cols.get(KEY_FIELD, ()))
+        if ANSWERS_FIELD not in cols:
+            report.add(np.array([], dtype=str), {}, {}, n)
+            continue
+        mask, new, invalid = rescore_columns(cols, version)
+        old = {f: np.asarray(cols[f], dtype=float)[mask] if f in cols else np.full(mask.sum(), np.nan)
+               for f in FLOAT_FIELDS}
+        ids = [np.asarray(cols[f])[mask] if f in cols else np.full(mask.sum(), "") for f in ID_FIELDS]
+        report.add(np.asarray(ids[2], dtype=str), old, new, int(n - mask.sum()) - invalid, invalid)
+        values = [x for field in FLOAT_FIELDS for x in (old[field], new[field])]
+        w.writerows(zip(*(a.tolist() for a in ids), *(np.round(v, 6).tolist() for v in values)))
+        if progress:
+            elapsed = time.perf_counter() - t0
+            print(f"[rescore] {report.rows} rows, {report.rows / elapsed:,.0f} rows/s", file=progress)
+    return time.perf_counter() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score saved submissions with another factors version.")
+    parser.add_argument("--version", default=FACTORS_VERSION, help=f"factors version (default: {FACTORS_VERSION})")
+    parser.add_argument("--export", help="columnar export directory (see export.py)")
+    parser.add_argument("--backend", choices=BACKENDS, help="read from a storage backend instead of an export")
+    parser.add_argument("--url", help="Sheet.best URL")
+    parser.add_argument("--path", help="SQLite file or columnar directory")
+    parser.add_argument("-o", "--output", default="-", help="output CSV file (default: stdout)")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="rows per batch (default: 50000)")
+    parser.add_argument("--quiet", action="store_true", help="do not print progress")
+    args = parser.parse_args(argv)
+    if bool(args.export) == bool(args.backend):
+        parser.error("give exactly one of --export or --backend")
+
+    if args.export:
+        chunks = chunks_from_export(ColumnarExport(args.export), args.chunk_size)
+    else:
+        chunks = chunks_from_storage(open_storage(args.backend, url=args.url, path=args.path), args.chunk_size)
+    report = Report(args.version)
+    fout = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    try:
+        secs = run(chunks, args.version, fout, report, progress=None if args.quiet else sys.stderr)
+    except ValueError as e:
+        parser.exit(1, f"rescore: {e}\n")
+    finally:
+        if fout is not sys.stdout:
+            fout.close()
+    report.print()
+    print(f"[rescore] done in {secs:.2f}s ({report.rows / max(secs, 1e-9):,.0f} rows/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,578 @@
+"""Contenuto delle pagine dei risultati (categoria principale, equivalenze, tips, virtù).
+
+Tutto è calcolato una sola volta, quando l'utente preme Next nella pagina
+principale, e salvato in sessione come oggetto immutabile (Results): le pagine
+dei risultati si limitano a visualizzarlo. Nessuna dipendenza da Streamlit.
+
+results_for_answer() ricava tutto dalla sola risposta canonica (canonical_answer)
+e dalla versione dei fattori, anche la scelta casuale dei tips: risposte
+identiche danno lo stesso Results, che l'app tiene in una cache LRU condivisa
+tra le sessioni con chiave answer_key().
+"""
+import hashlib
+import random
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from answer_codec import decode, encode
+from footprint import cloud_gb, compile_factors, emails, score_answer
+
+# chiavi di st.session_state usate da tips e virtù (vedi show_main in app.py)
+STATE_KEYS = [
+    "name", "role", "device_inputs", "da_em_plain", "da_em_attach", "da_cloud_gb",
+    "da_pages", "idle_is_left_on", "idle_turns_off", "ai_total_queries",
+]
+
+# categorie come mostrate nelle pagine -> chiave nei totali di score_answer
+CATEGORY_KEYS = {
+    "Devices": "Devices",
+    "E-Waste": "E-Waste",
+    "Digital Activities": "Digital Activities",
+    "Artificial Intelligence": "AI Tools",
+}
+
+
+@dataclass(frozen=True)
+class Results:
+    totals: MappingProxyType      # {"Devices", "E-Waste", "Digital Activities", "AI Tools"} in kg CO2e/anno
+    total: float
+    top_category: str             # una delle chiavi di CATEGORY_KEYS
+    equivalences: MappingProxyType
+    top_tips: tuple
+    other_tips: tuple             # ((categoria, (tip, ...)), ...)
+    virtues: tuple
+    factors_version: str
+
+
+# === 1) GENERIC (evergreen) TIPS, per categoria ===
+GENERIC_TIPS = {
+    "Devices": [
+        "<b>Update software regularly.</b> This enhances efficiency and performance, often reducing energy consumption.",
+        "<b>Activate power-saving settings, reduce screen brightness and enable dark mode.</b> This lowers energy use.",
+        "<b>Choose accessories made from recycled or sustainable materials.</b> This minimizes the environmental impact of your tech choices."
+    ],
+    "E-Waste": [
+        "<b>Repair instead of replacing.</b> Fix broken electronics whenever possible to avoid unnecessary waste."
+    ],
+    "Digital Activities": [
+        "<b>Use your internet mindfully:</b> close unused apps, avoid sending large attachments, and turn off video during calls when not essential."
+    ],
+    "Artificial Intelligence": [
+        "<b>Use search engines for simple tasks: </b> They consume far less energy than AI tools.",
+        "<b>Disable AI-generated results in search engines</b> (e.g., on Bing: go to Settings > Search > Uncheck \"Include AI-powered answers\" or similar option).",
+        "<b>Prefer smaller AI models when possible.</b> For basic tasks, use lighter versions like GPT-4o-mini instead of more energy-intensive models.",
+        "<b>Be concise in AI prompts and require concise answers:</b> short inputs and outputs require less processing."
+    ]
+}
+
+
+# ===============================
+# Helpers comuni
+# ===============================
+def _adj_years(years: float, used: str, shared: str, f) -> float:
+    if years <= 0:
+        return 0.0
+    return years * f.life_multiplier(used, shared)
+
+
+def _fmt_kg(x: float) -> str:
+    # arrotonda "pulito": 0 decimali se grande, 1 decimale altrimenti
+    if x >= 10:
+        return f"{round(x):,}".replace(",", " ")
+    return f"{round(x, 1)}"
+
+
+# ===============================
+# Personalized Tips – DEVICES
+# ===============================
+def tip_devices_new_laptopdesktop_best(state, f) -> str | None:
+    """
+    Se esistono Laptop/Desktop nuovi, suggerisci il ricondizionato.
+    Mostra solo il device con risparmio annuo maggiore.
+    """
+    best_saving = 0.0
+    best_noun = None
+
+    for dev_id, vals in (state.get("device_inputs") or {}).items():
+        base = dev_id.rsplit("_", 1)[0]
+        if base not in ("Laptop Computer", "Desktop Computer"):
+            continue
+        if vals.get("used") != "New":
+            continue
+
+        try:
+            years = float(vals.get("years", 0) or 0)
+        except Exception:
+            years = 0.0
+        if years <= 0:
+            continue
+
+        shared = vals.get("shared") or "Personal"
+        impact = f.device_ef(base)
+        if impact <= 0:
+            continue
+
+        adj_curr = _adj_years(years, used="New", shared=shared, f=f)
+        # scenario alternativo: stesso shared, ma 'Used'
+        adj_alt = _adj_years(years, used="Used", shared=shared, f=f)
+        if adj_curr <= 0 or adj_alt <= 0:
+            continue
+
+        saving = impact * (1.0 / adj_curr - 1.0 / adj_alt)  # kg/anno
+        if saving > best_saving:
+            best_saving = saving
+            best_noun = "laptop" if base == "Laptop Computer" else "desktop"
+
+    if best_saving > 0 and best_noun:
+        X = _fmt_kg(best_saving)
+        return (
+            f"<b>You bought a new {best_noun}: next time consider choosing a used or refurbished one.</b> "
+            f"You could save about {X} kg CO₂e/year (vs a new device with the same usage)."
+        )
+    return None
+
+
+def tip_devices_extend_life_any_device(state, f) -> str | None:
+    """
+    Qualsiasi device con lifespan <= 3 anni → suggerisci estensione di +2 anni.
+    Mostra solo il caso con risparmio annuo maggiore.
+    """
+    best = {"base": None, "years": None, "saving": 0.0}
+
+    for dev_id, vals in (state.get("device_inputs") or {}).items():
+        base = dev_id.rsplit("_", 1)[0]
+        try:
+            years = float(vals.get("years", 0) or 0)
+        except Exception:
+            years = 0.0
+        if years <= 0 or years > 3:
+            continue
+
+        used = vals.get("used") or "New"
+        shared = vals.get("shared") or "Personal"
+        impact = f.device_ef(base)
+        if impact <= 0:
+            continue
+
+        adj_curr = _adj_years(years, used=used, shared=shared, f=f)
+        adj_ext = _adj_years(years + 2.0, used=used, shared=shared, f=f)
+        if adj_curr <= 0 or adj_ext <= 0:
+            continue
+
+        saving = impact * (1.0 / adj_curr - 1.0 / adj_ext)  # kg CO2e/anno
+        if saving > best["saving"]:
+            best.update({"base": base, "years": years, "saving": saving})
+
+    if best["saving"] > 0 and best["base"]:
+        X = _fmt_kg(best["saving"])
+        device_label = best["base"].lower()
+        return (
+            f"<b>You plan to use your {device_label} for {best['years']:.0f} years.</b> "
+            f"if you extend it to {best['years'] + 2:.0f}, you could save about {X} kg CO₂e/year."
+        )
+    return None
+
+
+# ===============================
+# Personalized Tips – E-WASTE
+# ===============================
+def tip_ewaste_stored_at_home(state, f) -> str | None:
+    """
+    Per tutti i device con eol == 'I store it at home, unused':
+    stima saving annuo passando da 'store' a:
+      - centro raccolta  → delta min
+      - sell/donate      → delta max
+    Somma i risparmi e mostra range.
+    """
+    items = []
+    saving_min = 0.0
+    saving_max = 0.0
+    stored = f.eol_modifier("I store it at home, unused")
+    certified = f.eol_modifier("I bring it to a certified e-waste collection center")
+    donated = f.eol_modifier("I sell or donate it to someone else")
+
+    for dev_id, vals in (state.get("device_inputs") or {}).items():
+        if vals.get("eol") != "I store it at home, unused":
+            continue
+
+        base = dev_id.rsplit("_", 1)[0]
+        try:
+            years = float(vals.get("years", 0) or 0)
+        except Exception:
+            years = 0.0
+        if years <= 0:
+            continue
+
+        used = vals.get("used") or "New"
+        shared = vals.get("shared") or "Personal"
+        impact = f.device_ef(base)
+        if impact <= 0:
+            continue
+
+        adj = _adj_years(years, used=used, shared=shared, f=f)
+        if adj <= 0:
+            continue
+
+        # delta verso alternative (per anno)
+        delta_min = impact * ((stored - certified) / adj)
+        delta_max = impact * ((stored - donated) / adj)
+        saving_min += max(0.0, delta_min)
+        saving_max += max(0.0, delta_max)
+        items.append(base)
+
+    if items and (saving_min > 0 or saving_max > 0):
+        uniq = ", ".join(sorted(set(items)))
+        lo = _fmt_kg(saving_min)
+        hi = _fmt_kg(saving_max)
+        return (
+            f"<b>You have {uniq} stored at home.</b> Recycling or reusing them could save between {lo} and {hi} kg CO₂e/year. Don’t let them gather dust!"
+        )
+    return None
+
+
+def tip_ewaste_general_trash(state, f) -> str | None:
+    """
+    Per device con eol == 'I throw it away in general waste':
+    stima il saving annuo se passassero alla miglior alternativa (sell/donate)
+    e indica per quali device vale.
+    """
+    total_saving = 0.0
+    devices = []
+    trashed = f.eol_modifier("I throw it away in general waste")
+    donated = f.eol_modifier("I sell or donate it to someone else")
+
+    for dev_id, vals in (state.get("device_inputs") or {}).items():
+        if vals.get("eol") != "I throw it away in general waste":
+            continue
+
+        base = dev_id.rsplit("_", 1)[0]
+        devices.append(base)
+
+        try:
+            years = float(vals.get("years", 0) or 0)
+        except Exception:
+            years = 0.0
+        if years <= 0:
+            continue
+
+        used = vals.get("used") or "New"
+        shared = vals.get("shared") or "Personal"
+        impact = f.device_ef(base)
+        if impact <= 0:
+            continue
+
+        adj = _adj_years(years, used=used, shared=shared, f=f)
+        if adj <= 0:
+            continue
+
+        # delta verso best alternative (sell/donate)
+        delta = impact * ((trashed - donated) / adj)
+        total_saving += max(0.0, delta)
+
+    if devices and total_saving > 0:
+        names = ", ".join(sorted(set(devices)))
+        X = _fmt_kg(total_saving)
+        return (
+            f"<b>You throw {names} away in general waste. this prevents proper recycling or reuse.</b> "
+            f"Bringing it to a certified collection point could save about {X} kg CO₂e/year."
+        )
+    return None
+
+
+# ===============================
+# Personalized Tips – DIGITAL ACTIVITIES
+# ===============================
+def tip_emails_with_attachments_impact(state, f) -> str | None:
+    """
+    Mostra l'impatto annuo delle email con allegati
+    SOLO se > 10 email/giorno (soglia).
+    """
+    em_attach = int(state.get("da_em_attach", 0))  # soglia > 10
+    if em_attach <= 10:
+        return None
+    impact_year = em_attach * f.email_attach * f.days  # kg CO2e/anno
+    X = _fmt_kg(impact_year)
+    return (
+        f"<b>Currently, your emails with attachments emit around {X} kg CO₂e/year.</b> Try sharing links to OneDrive or Google Drive instead of large attachments."
+    )
+
+
+def tip_emails_plain_impact(state, f) -> str | None:
+    """
+    Mostra l'impatto annuo delle email senza allegati
+    SOLO se > 10 email/giorno (soglia).
+    """
+    em_plain = int(state.get("da_em_plain", 0))  # soglia > 10
+    if em_plain <= 10:
+        return None
+    impact_year = em_plain * f.email_plain * f.days  # kg CO2e/anno
+    X = _fmt_kg(impact_year)
+    return (
+        f"<b>Currently, your emails without attachments emit around {X} kg CO₂e/year. </b> To reduce this, opt for instant messaging where possible."
+    )
+
+
+def tip_cloud_storage_impact(state, f) -> str | None:
+    """
+    Se lo storage cloud è >50GB, mostra l'impatto annuo attuale e consiglia di fare decluttering.
+    """
+    cld = float(state.get("da_cloud_gb", 0))  # soglia > 50
+    if cld <= 50:
+        return None
+    impact_year = cld * f.cloud_gb  # kg CO2e/anno
+    X = _fmt_kg(impact_year)
+    return (
+        f"<b>At the moment, your annual footprint from stored data is {X} kg CO₂e/year.</b> Try to declutter your digital space by regularly deleting unnecessary files and emptying trash and spam folders to reduce digital pollution."
+    )
+
+
+def tip_idle_left_on(state, f) -> str | None:
+    """
+    Se 'I leave it on (idle mode)': saving passando a 'I turn it off'.
+    """
+    if not state.get("idle_is_left_on", False):
+        return None
+    saved = f.idle_total[1] - f.idle_total[0]  # da idle a spento
+    X = _fmt_kg(saved)
+    return (
+        f"<b>You usually leave your computer on in idle mode. </b> Turning it off at the end of the day could save up to {X} kg CO₂e/year and extend its lifespan."
+    )
+
+
+# ===============================
+# Personalized Tips – AI
+# ===============================
+def tip_ai_queries_volume(state, f) -> str | None:
+    """
+    Mostra il volume totale di query AI al giorno.
+    Se > 30, suggerisce di fare richieste più mirate per ridurre il numero e l'energia usata.
+    """
+    Q = int(state.get("ai_total_queries", 0) or 0)
+    if Q <= 30:
+        return None
+    return (
+        f"<b>You're asking about {Q} AI queries per day. </b> Try making more targeted requests to reduce this number and save energy."
+    )
+
+
+# ===============================
+# Registry + Aggregator
+# ===============================
+PERSONALIZED_TIP_FACTORIES = {
+    "Devices": [
+        tip_devices_new_laptopdesktop_best,
+        tip_devices_extend_life_any_device,
+    ],
+    "E-Waste": [
+        tip_ewaste_stored_at_home,
+        tip_ewaste_general_trash,
+    ],
+    "Digital Activities": [
+        tip_cloud_storage_impact,
+        tip_emails_with_attachments_impact,
+        tip_idle_left_on,
+        tip_emails_plain_impact,
+    ],
+    "Artificial Intelligence": [
+        tip_ai_queries_volume,
+    ],
+}
+
+
+def gather_personalized_tips(state, factors):
+    out = {k: [] for k in PERSONALIZED_TIP_FACTORIES}
+    for cat, funcs in PERSONALIZED_TIP_FACTORIES.items():
+        for fn in funcs:
+            try:
+                tip = fn(state, factors)
+            except Exception:
+                tip = None
+            if tip:
+                out[cat].append(tip)
+    return out
+
+
+def _dedup_keep_order(seq):
+    seen = set()
+    out = []
+    for x in seq:
+        if x not in seen:
+            out.append(x)
+            seen.add(x)
+    return out
+
+
+def build_tips(state, top_category, factors, seed=None):
+    """
+    Ritorna (tips per la categoria principale, ((categoria, tips), ...) per le altre).
+    seed: seme della scelta dei tips generici (default nome|ruolo).
+    """
+    personalized = gather_personalized_tips(state, factors)
+
+    # --- TOP CATEGORY → ALL tips (personalized + generic)
+    top_tips = _dedup_keep_order(personalized.get(top_category, []) + GENERIC_TIPS.get(top_category, []))
+
+    # --- OTHER CATEGORIES → up to 2 tips each, prioritize personalized
+    if seed is None:
+        seed = f"{state.get('name') or ''}|{state.get('role') or ''}"
+    rnd = random.Random(seed)  # stabile per utente (o per risposta)
+
+    others = []
+    for cat in [c for c in GENERIC_TIPS.keys() if c != top_category]:
+        picked = personalized.get(cat, [])[:2]  # take up to 2 personalized
+
+        if len(picked) < 2:
+            remaining = 2 - len(picked)
+            gen_pool = [g for g in GENERIC_TIPS.get(cat, []) if g not in picked]
+            if gen_pool:
+                picked += gen_pool if len(gen_pool) <= remaining else rnd.sample(gen_pool, remaining)
+
+        if picked:  # se resta solo 1 tip va bene
+            others.append((cat, tuple(picked)))
+    return tuple(top_tips), tuple(others)
+
+
+# ===============================
+# Virtù
+# ===============================
+GOOD_EOLS = {
+    "I bring it to a certified e-waste collection center",
+    "I return it to manufacturer for recycling or reuse",
+    "I sell or donate it to someone else",
+    "Device provided by the university, I return it after use",
+}
+
+
+def build_virtues(state):
+    virtues = []
+    device_inputs = state.get("device_inputs") or {}
+
+    # 1) Devices usati: elenca i device usati
+    used_devices = [dev_id.rsplit("_", 1)[0] for dev_id, vals in device_inputs.items() if vals.get("used") == "Used"]
+    if used_devices:
+        unique_used = ", ".join(sorted(set(used_devices)))
+        virtues.append(f"You chose a used device for your {unique_used}! This typically reduces manufacturing emissions by 30–50% per device.")
+
+    # 2) Device longevity: usati per più di 5 anni
+    long_lived_devices = []
+    for dev_id, vals in device_inputs.items():
+        try:
+            if float(vals.get("years", 0)) > 5:
+                long_lived_devices.append(dev_id.rsplit("_", 1)[0])
+        except Exception:
+            pass
+    if long_lived_devices:
+        names = ", ".join(sorted(set(long_lived_devices)))
+        virtues.append(f"You use your {names} for more than 5 years! Extending device life reduces the need for new production and saves valuable resources.")
+
+    # 3) End-of-life virtuoso (almeno uno dei device)
+    if any(vals.get("eol") in GOOD_EOLS for vals in device_inputs.values()):
+        virtues.append("You dispose some of devices responsibly! EU aims to achieve a correct e-waste disposal rate of 65%, but many countries are still below this threshold.")
+
+    # 4) Poche email con allegato (1–10)
+    if int(state.get("da_em_attach", 0) or 0) <= 10:
+        virtues.append(
+            "You keep the exchange of emails with attachments low. An email with an attachment typically weighs almost ten times more than one without."
+        )
+
+    # 5) Cloud storage basso (<5GB o 5–20GB)
+    if float(state.get("da_cloud_gb", 0) or 0.0) <= 20:
+        virtues.append(
+            "You keep your cloud storage light by cleaning up files you no longer need! This reduces the energy required to store and maintain them."
+        )
+
+    # 6) Spegnere il computer quando non usato
+    if state.get("idle_turns_off"):
+        virtues.append("You turn off your computer when not in use. This single action can save over 150 kWh of energy per year for a single computer!")
+
+    # 7) Zero stampe
+    if int(state.get("da_pages", 0) or 0) == 0:
+        virtues.append(
+            "You never print. This saves paper, ink, and the energy needed for printing... the trees thank you!"
+        )
+
+    # 8) Uso moderato dell’AI (< 20 query/giorno)
+    if int(state.get("ai_total_queries", 0) or 0) <= 20:
+        virtues.append(
+            "You use AI sparingly, staying under 20 queries a day. This reduces the energy consumed by high-compute AI models."
+        )
+    return tuple(virtues)
+
+
+def build_results(totals, state, version=None, seed=None):
+    """
+    totals: output di footprint.score_answer; state: dict con le chiavi STATE_KEYS;
+    version: versione dei fattori con cui sono stati calcolati i totali (default quella del file);
+    seed: seme dei tips generici (vedi build_tips).
+    Ritorna l'oggetto Results con tutto quello che serve alle pagine dei risultati.
+    """
+    f = compile_factors(version)
+    totals = {k: float(totals.get(k, 0) or 0) for k in CATEGORY_KEYS.values()}
+    total = sum(totals.values())
+    by_category = {cat: totals[key] for cat, key in CATEGORY_KEYS.items()}
+    top_category = max(by_category, key=by_category.get)
+    top_tips, other_tips = build_tips(state, top_category, f, seed)
+    return Results(
+        totals=MappingProxyType(totals),
+        total=total,
+        top_category=top_category,
+        equivalences=MappingProxyType({
+            "burgers": total / f.equivalences["burgers"],
+            "led_days": (total / f.equivalences["led_hours"]) / 24,
+            "car_km": total / f.equivalences["car_km"],
+            "netflix_hours": total / f.equivalences["netflix_hours"],
+        }),
+        top_tips=top_tips,
+        other_tips=other_tips,
+        virtues=build_virtues(state),
+        factors_version=f.version,
+    )
+
+
+# ===============================
+# Results per risposta (memoizzabili)
+# ===============================
+def canonical_answer(answer):
+    """Codice answer_codec della risposta con i device in ordine fisso: l'ordine non cambia i risultati."""
+    devices = sorted(
+        answer.get("devices") or [],
+        key=lambda d: (str(d.get("type")), float(d.get("years") or 0), str(d.get("used")),
+                       str(d.get("shared")), str(d.get("eol"))),
+    )
+    return encode({**answer, "devices": devices})
+
+
+def answer_key(code, version=None):
+    """Hash della risposta canonica e della versione dei fattori: chiave della cache e seme dei tips."""
+    version = compile_factors(version).version
+    return hashlib.blake2b(f"{version}|{code}".encode("ascii"), digest_size=16).hexdigest()
+
+
+def state_from_answer(answer):
+    """Lo stato usato da tips e virtù (STATE_KEYS), ricavato dalla risposta invece che dalla sessione."""
+    devices = answer.get("devices") or []
+    return {
+        "role": answer.get("role"),
+        "device_inputs": {
+            f"{d.get('type')}_{i}": {k: d.get(k) for k in ("years", "used", "shared", "eol")}
+            for i, d in enumerate(devices)
+        },
+        "da_em_plain": int(emails.get(answer.get("email_plain"), 0)),
+        "da_em_attach": int(emails.get(answer.get("email_attach"), 0)),
+        "da_cloud_gb": float(cloud_gb.get(answer.get("cloud"), 0)),
+        "da_pages": int(answer.get("pages", 0) or 0),
+        "idle_is_left_on": answer.get("idle") == "I leave it on (idle mode)",
+        "idle_turns_off": answer.get("idle") == "I turn it off",
+        "ai_total_queries": sum(int(q or 0) for q in (answer.get("ai") or {}).values()),
+    }
+
+
+def results_for_answer(code, version=None):
+    """Results completo (totali compresi) da una risposta canonica; stesso input, stesso output.
+
+    Tutto viene dal codice decodificato, mai dalla sessione: il Results va nella cache
+    condivisa sotto answer_key(code), quindi deve dipendere solo da quello.
+    """
+    answer = decode(code)
+    return build_results(score_answer(answer, version), state_from_answer(answer), version,
+                         seed=answer_key(code, version))
@@ -0,0 +1,206 @@
+"""Calcolo dell'impronta per interi export di risposte (CSV o JSONL), da riga di comando.
+
+Esempio:
+    python score_batch.py answers.jsonl -o results.csv --chunk-size 20000
+
+Le righe vengono lette a blocchi, calcolate con footprint.score() e scritte subito,
+così la memoria resta costante anche su file da milioni di righe. Con --workers N
+i blocchi sono distribuiti su N processi; l'output resta nello stesso ordine ed è
+identico byte per byte a quello del singolo processo.
+
+Formato JSONL: una risposta per riga, come in footprint.encode_answers().
+Formato CSV: colonne role, email_plain, email_attach, cloud, wifi, pages, idle,
+devices (lista JSON di device), una colonna per attività e una per task AI
+(intestazione = etichetta della domanda); la colonna id è opzionale.
+"""
+import argparse
+import collections
+import csv
+import functools
+import io
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from footprint import ACTIVITIES, AI_TASKS, FACTORS_VERSION, compile_factors, encode_answers, score
+
+OUTPUT_FIELDS = ["id", "Role", "CO2 Devices", "CO2 E-Waste", "CO2 AI", "CO2 Digital Activities", "CO2 Total"]
+
+
+def _num(x, default=0.0):
+    if x is None or str(x).strip() == "":
+        return default
+    return float(str(x).strip().replace(",", "."))
+
+
+# Ogni formato ha due fasi: lettura grezza (nel processo principale, veloce) e
+# parse in risposta (nei worker), così anche il parse si parallelizza.
+
+def read_jsonl(f):
+    """Ritorna (righe grezze, funzione di parse)."""
+    return (line for line in f if line.strip()), json.loads
+
+
+def parse_csv_row(header, fields):
+    row = dict(zip(header, fields))
+    answer = {
+        "role": (row.get("role") or "").strip(),
+        "devices": json.loads(row.get("devices") or "[]"),
+        "hours": {a: _num(row[a]) for a in ACTIVITIES if row.get(a) not in (None, "")},
+        "email_plain": row.get("email_plain") or "-- Select option --",
+        "email_attach": row.get("email_attach") or "-- Select option --",
+        "cloud": row.get("cloud") or "-- Select option --",
+        "wifi": _num(row.get("wifi"), 4.0),
+        "pages": int(_num(row.get("pages"))),
+        "idle": row.get("idle") or "I don’t have a computer",
+        "ai": {t: _num(row[t]) for t in AI_TASKS if row.get(t) not in (None, "")},
+    }
+    if row.get("id"):
+        answer["id"] = row["id"]
+    return answer
+
+
+def read_csv(f):
+    """Ritorna (liste di campi, funzione di parse)."""
+    reader = csv.reader(f)
+    header = [h.strip() for h in next(reader, [])]
+    return reader, functools.partial(parse_csv_row, header)
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+def chunked(records, size):
+    it = iter(records)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _parse_chunk(raw, parse, first_row, skip_invalid):
+    """
+    Parse + encode_answers(), indicando la riga colpevole (o scartandola con --skip-invalid).
+    Ritorna (risposte valide, numeri di riga nel file, colonne).
+    """
+    try:
+        chunk = [parse(r) for r in raw]
+        return chunk, range(first_row, first_row + len(chunk)), encode_answers(chunk)
+    except (ValueError, TypeError, AttributeError, KeyError):
+        pass
+    valid, rows = [], []
+    for i, r in enumerate(raw):
+        try:
+            answer = parse(r)
+            encode_answers([answer])
+        except (ValueError, TypeError, AttributeError, KeyError) as e:
+            if not skip_invalid:
+                raise ValueError(f"row {first_row + i}: {e}") from None
+            print(f"[score_batch] skipping row {first_row + i}: {e}", file=sys.stderr)
+            continue
+        valid.append(answer)
+        rows.append(first_row + i)
+    return valid, rows, encode_answers(valid)
+
+
+def score_chunk(raw, parse, first_row, skip_invalid=False, version=None):
+    """Calcola un blocco grezzo e ritorna (righe, testo CSV già formattato)."""
+    chunk, rows, cols = _parse_chunk(raw, parse, first_row, skip_invalid)
+    totals = score(cols, version)
+    dev, ew, dig, ai = totals["Devices"], totals["E-Waste"], totals["Digital Activities"], totals["AI Tools"]
+    total = dev + ew + dig + ai
+
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    for i, (answer, row) in enumerate(zip(chunk, rows)):
+        w.writerow([
+            answer.get("id", row), answer.get("role", ""),
+            f"{dev[i]:.6f}", f"{ew[i]:.6f}", f"{ai[i]:.6f}", f"{dig[i]:.6f}", f"{total[i]:.6f}",
+        ])
+    return len(chunk), buf.getvalue()
+
+
+def _score_serial(chunks, parse, skip_invalid, version):
+    for first_row, chunk in chunks:
+        yield score_chunk(chunk, parse, first_row, skip_invalid, version)
+
+
+def _score_parallel(chunks, parse, skip_invalid, version, workers):
+    """Come _score_serial(), ma su un pool di processi; al massimo 2 blocchi in coda per worker."""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque()
+        for first_row, chunk in chunks:
+            pending.append(pool.submit(score_chunk, chunk, parse, first_row, skip_invalid, version))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def run(records, parse, out, chunk_size=10000, skip_invalid=False, progress=sys.stderr, workers=1, version=None):
+    """Calcola tutte le risposte grezze in streaming; ritorna (righe, secondi)."""
+    compile_factors(version)  # versione sconosciuta: errore prima di leggere i dati
+    csv.writer(out, lineterminator="\n").writerow(OUTPUT_FIELDS)
+    t0 = time.perf_counter()
+
+    def numbered():
+        first_row = 1
+        for chunk in chunked(records, chunk_size):
+            yield first_row, chunk
+            first_row += len(chunk)
+
+    if workers > 1:
+        results = _score_parallel(numbered(), parse, skip_invalid, version, workers)
+    else:
+        results = _score_serial(numbered(), parse, skip_invalid, version)
+
+    done = 0
+    for n, text in results:
+        out.write(text)
+        out.flush()
+        done += n
+        if progress:
+            elapsed = time.perf_counter() - t0
+            print(f"[score_batch] {done} rows, {done / elapsed:,.0f} rows/s", file=progress)
+    return done, time.perf_counter() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score Digital Carbon Footprint answers in bulk.")
+    parser.add_argument("input", help="CSV or JSONL file with answers ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="output CSV file (default: stdout)")
+    parser.add_argument("--format", choices=sorted(READERS), help="input format (default: from file extension)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="rows scored per batch (default: 10000)")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="worker processes (default: 1; 0 = one per CPU)")
+    parser.add_argument("--version", default=FACTORS_VERSION,
+                        help=f"factors version from factors.json (default: {FACTORS_VERSION})")
+    parser.add_argument("--skip-invalid", action="store_true", help="skip rows with unknown labels instead of stopping")
+    parser.add_argument("--quiet", action="store_true", help="do not print progress")
+    args = parser.parse_args(argv)
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+
+    fmt = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+    fin = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", newline="")
+    fout = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    try:
+        records, parse = READERS[fmt](fin)
+        rows, secs = run(records, parse, fout, args.chunk_size, args.skip_invalid,
+                         progress=None if args.quiet else sys.stderr, workers=workers, version=args.version)
+    except ValueError as e:
+        parser.exit(1, f"score_batch: {e}\n")
+    finally:
+        if fin is not sys.stdin:
+            fin.close()
+        if fout is not sys.stdout:
+            fout.close()
+    print(f"[score_batch] done: {rows} rows in {secs:.2f}s ({rows / max(secs, 1e-9):,.0f} rows/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""Server HTTP locale che imita l'API di Sheet.best usata dall'app, per test e benchmark offline.
+
+    python standin_server.py --port 8765 --latency 300 --jitter 100 --error-rate 0.05
+
+e nei secrets dell'app:
+
+    SHEETBEST_URL = "http://127.0.0.1:8765"
+    SHEETBEST_STATS_URL = "http://127.0.0.1:8765/tabs/Stats"
+
+Rotte (come Sheet.best): GET / (tutte le righe), POST / (oggetto o lista, ritorna
+le righe inserite), PATCH /<colonna>/<valore> (aggiorna le righe che corrispondono
+e le ritorna), GET /tabs/Stats (media e numero di righe per ruolo).
+Come Sheet.best non deduplica nulla: un POST ripetuto crea una riga in più.
+Le righe stanno in memoria; con --dump vengono scritte in un file JSON all'uscita.
+"""
+import argparse
+import json
+import random
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+from storage import _stats_from
+
+
+class StandinState:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, lost_ack_rate=0.0):
+        self.latency = latency          # secondi
+        self.jitter = jitter
+        self.error_rate = error_rate    # richieste che falliscono con 503 senza effetti
+        self.lost_ack_rate = lost_ack_rate  # scritture applicate ma risposte con 504 (esito incerto)
+        self.rows = []
+        self.lock = threading.Lock()
+        self.counts = {"GET": 0, "POST": 0, "PATCH": 0, "errors": 0, "lost_acks": 0}
+
+
+class Handler(BaseHTTPRequestHandler):
+    state = None  # StandinState, impostato da make_server
+    protocol_version = "HTTP/1.1"  # keep-alive, come dietro un vero load balancer
+    disable_nagle_algorithm = True  # header e corpo partono in due write: senza, +40 ms di delayed ACK
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, obj):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(n) or b"null")
+
+    def _simulate(self, method):
+        """Latenza ed errori casuali; ritorna False se la richiesta deve fallire subito."""
+        st = self.state
+        with st.lock:
+            st.counts[method] += 1
+        delay = st.latency + random.uniform(-st.jitter, st.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if random.random() < st.error_rate:
+            with st.lock:
+                st.counts["errors"] += 1
+            self._reply(503, {"error": "simulated failure"})
+            return False
+        return True
+
+    def _parts(self):
+        return [unquote(p) for p in urlsplit(self.path).path.split("/") if p]
+
+    def _write_reply(self, result):
+        st = self.state
+        if random.random() < st.lost_ack_rate:
+            with st.lock:
+                st.counts["lost_acks"] += 1
+            self._reply(504, {"error": "simulated timeout after write"})
+        else:
+            self._reply(200, result)
+
+    def do_GET(self):
+        if not self._simulate("GET"):
+            return
+        parts = self._parts()
+        with self.state.lock:
+            rows = [dict(r) for r in self.state.rows]
+        if parts[-2:] == ["tabs", "Stats"]:
+            self._reply(200, _stats_from(rows))
+        elif len(parts) >= 2:
+            col, val = parts[-2], parts[-1]
+            self._reply(200, [r for r in rows if str(r.get(col)) == val])
+        else:
+            self._reply(200, rows)
+
+    def do_POST(self):
+        try:
+            body = self._body()
+        except ValueError:
+            self._reply(400, {"error": "invalid JSON"})
+            return
+        if not self._simulate("POST"):
+            return
+        rows = body if isinstance(body, list) else [body]
+        if not all(isinstance(r, dict) for r in rows):
+            self._reply(400, {"error": "expected an object or a list of objects"})
+            return
+        with self.state.lock:
+            self.state.rows.extend(dict(r) for r in rows)
+        self._write_reply(rows)
+
+    def do_PATCH(self):
+        try:
+            body = self._body()
+        except ValueError:
+            self._reply(400, {"error": "invalid JSON"})
+            return
+        if not self._simulate("PATCH"):
+            return
+        parts = self._parts()
+        if len(parts) < 2 or not isinstance(body, dict):
+            self._reply(400, {"error": "expected PATCH /<column>/<value> with an object"})
+            return
+        col, val = parts[-2], parts[-1]
+        with self.state.lock:
+            hit = [r for r in self.state.rows if str(r.get(col)) == val]
+            for r in hit:
+                r.update(body)
+            hit = [dict(r) for r in hit]
+        self._write_reply(hit)
+
+
+def make_server(host="127.0.0.1", port=8765, **kwargs):
+    """Server pronto (non avviato); kwargs come StandinState. Utile anche dentro script di test."""
+    handler = type("StandinHandler", (Handler,), {"state": StandinState(**kwargs)})
+    srv = ThreadingHTTPServer((host, port), handler)
+    srv.daemon_threads = True
+    return srv
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the Sheet.best API used by the app.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="added latency per request, in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +/- jitter on the latency, in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--lost-ack-rate", type=float, default=0.0,
+                        help="fraction of writes applied but answered with 504")
+    parser.add_argument("--dump", help="write the stored rows to this JSON file on exit")
+    args = parser.parse_args(argv)
+
+    srv = make_server(args.host, args.port, latency=args.latency / 1000, jitter=args.jitter / 1000,
+                      error_rate=args.error_rate, lost_ack_rate=args.lost_ack_rate)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # anche kill: stampa i contatori e scrive --dump
+    print(f"Sheet.best stand-in on http://{args.host}:{args.port} (stats: /tabs/Stats)", file=sys.stderr)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        st = srv.RequestHandlerClass.state
+        print(json.dumps(st.counts), file=sys.stderr)
+        if args.dump:
+            with open(args.dump, "w", encoding="utf-8") as f:
+                json.dump(st.rows, f, ensure_ascii=False, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
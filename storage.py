@@ -0,0 +1,364 @@
+"""Backend di salvataggio delle righe (una per submission, vedi build_row in app.py).
+
+Tutti i backend espongono la stessa interfaccia (Storage):
+- insert(rows)      -> una conferma (bool) per riga;
+- upsert(row)       -> aggiorna la riga con lo stesso 'Submission ID' o la inserisce;
+- fetch_all()       -> tutte le righe salvate;
+- fetch_stats()     -> [{'Role', 'AvgCO2', 'Count'}], come il tab 'Stats' del foglio.
+
+Implementazioni: Sheet.best (produzione), SQLite locale e un file colonnare
+append-only (sviluppo, test di carico). Il backend si sceglie con open_storage().
+Per provare il percorso HTTP senza Sheet.best c'è standin_server.py.
+
+Benchmark veloce di scrittura e lettura delle statistiche:
+
+    python storage.py --backend sheetbest --url http://127.0.0.1:8765 --rows 2000
+"""
+import abc
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from urllib.parse import quote
+
+import numpy as np
+
+from writebehind import BatchRejected
+
+KEY_FIELD = "Submission ID"
+# colonne numeriche delle righe, in quest'ordine nel file colonnare
+FLOAT_FIELDS = ["CO2 Devices", "CO2 E-Waste", "CO2 AI", "CO2 Digital Activities", "CO2 Total"]
+
+
+def _num(x):
+    # come _to_float in app.py: "310,2" o "310.2" -> float, altrimenti NaN
+    try:
+        return float(str(x).strip().replace(" ", "").replace(",", "."))
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _stats_from(rows):
+    acc = {}
+    for row in rows:
+        role = (row.get("Role") or "").strip()
+        x = _num(row.get("CO2 Total"))
+        if role and x == x:
+            s = acc.setdefault(role, [0.0, 0])
+            s[0] += x
+            s[1] += 1
+    return [{"Role": r, "AvgCO2": round(t / n, 3), "Count": n} for r, (t, n) in sorted(acc.items())]
+
+
+class Storage(abc.ABC):
+    """Interfaccia comune dei backend (vedi docstring del modulo)."""
+
+    @abc.abstractmethod
+    def insert(self, rows):
+        """Salva le righe; ritorna una conferma (bool) per riga."""
+
+    @abc.abstractmethod
+    def upsert(self, row):
+        """Aggiorna la riga con lo stesso 'Submission ID' o la inserisce; True se confermata."""
+
+    @abc.abstractmethod
+    def fetch_all(self):
+        """Tutte le righe salvate."""
+
+    def fetch_stats(self):
+        return _stats_from(self.fetch_all())
+
+
+class SheetBestStorage(Storage):
+    """Sheet.best (o standin_server.py): le righe vanno nel foglio, le medie sono nel tab 'Stats'."""
+
+    def __init__(self, url, stats_url, http):
+        self.url = url.rstrip("/")
+        self.stats_url = stats_url
+        self.http = http  # httpclient.PooledClient
+
+    @staticmethod
+    def _check(r):
+        if 400 <= r.status_code < 500 and r.status_code not in (408, 429):
+            raise BatchRejected(f"HTTP {r.status_code}: {r.text[:200]}")
+        r.raise_for_status()
+        return r.json()
+
+    def insert(self, rows):
+        resp = self._check(self.http.post("save", self.url, json=rows))
+        inserted = len(resp) if isinstance(resp, list) else 0
+        print(f"[autosave] sent {len(rows)} rows, {inserted} acknowledged", file=sys.stderr)
+        return [i < inserted for i in range(len(rows))]
+
+    def upsert(self, row):
+        url = f"{self.url}/{quote(KEY_FIELD)}/{quote(str(row[KEY_FIELD]), safe='')}"
+        resp = self._check(self.http.patch("save", url, json=row))
+        if isinstance(resp, list) and resp:
+            print(f"[autosave] updated submission {row[KEY_FIELD]}", file=sys.stderr)
+            return True
+        return self.insert([row])[0]
+
+    def fetch_all(self):
+        r = self.http.get("export", self.url)
+        r.raise_for_status()
+        return r.json() or []
+
+    def fetch_stats(self):
+        if not self.stats_url:
+            return []
+        r = self.http.get("stats", self.stats_url)
+        r.raise_for_status()
+        return r.json() or []
+
+
+class SQLiteStorage(Storage):
+    """Una tabella con il payload JSON e le colonne usate dalle statistiche; 'Submission ID' è unico."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS submissions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        submission_id TEXT,
+        role TEXT,
+        total REAL,
+        payload TEXT NOT NULL,
+        updated REAL NOT NULL
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS submissions_key ON submissions (submission_id) WHERE submission_id IS NOT NULL;
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+
+    @staticmethod
+    def _params(row):
+        total = _num(row.get("CO2 Total"))
+        return (row.get(KEY_FIELD), (row.get("Role") or "").strip(), total if total == total else None,
+                json.dumps(row, ensure_ascii=False), time.time())
+
+    def insert(self, rows):
+        # una riga con un ID già presente non viene duplicata (e conta come confermata)
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR IGNORE INTO submissions (submission_id, role, total, payload, updated) VALUES (?, ?, ?, ?, ?)",
+                [self._params(r) for r in rows],
+            )
+            self._db.execute("COMMIT")
+        return [True] * len(rows)
+
+    def upsert(self, row):
+        if row.get(KEY_FIELD) is None:
+            return self.insert([row])[0]
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO submissions (submission_id, role, total, payload, updated) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (submission_id) WHERE submission_id IS NOT NULL DO UPDATE SET "
+                "role = excluded.role, total = excluded.total, payload = excluded.payload, updated = excluded.updated",
+                self._params(row),
+            )
+        return True
+
+    def fetch_all(self):
+        with self._lock:
+            return [json.loads(p) for (p,) in self._db.execute("SELECT payload FROM submissions ORDER BY id")]
+
+    def fetch_stats(self):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT role, AVG(total), COUNT(total) FROM submissions "
+                "WHERE role != '' AND total IS NOT NULL GROUP BY role ORDER BY role"
+            ).fetchall()
+        return [{"Role": r, "AvgCO2": round(avg, 3), "Count": n} for r, avg, n in rows]
+
+
+class ColumnarStorage(Storage):
+    """
+    Cartella con un file float64 append-only per ogni colonna di FLOAT_FIELDS e un
+    rows.jsonl con il resto della riga (ID, ruolo, ...). Un upsert aggiunge una nuova
+    versione: in lettura vale l'ultima per ogni 'Submission ID'. I file vengono
+    scritti uno dopo l'altro: se un append si interrompe a metà, all'apertura (o
+    subito dopo l'errore) _repair() li tronca tutti allo stesso numero di righe
+    complete, altrimenti gli append successivi resterebbero disallineati.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._repair()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _repair(self):
+        """Tronca rows.jsonl e le colonne alle righe presenti in tutti i file; ritorna quante sono."""
+        meta_path = self._file("rows.jsonl")
+        ends = [0]  # offset di fine di ogni riga completa di rows.jsonl
+        try:
+            with open(meta_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    ends.append(ends[-1] + len(line))
+        except FileNotFoundError:
+            pass
+        col_paths = [self._file(f"col{i}.f64") for i in range(len(FLOAT_FIELDS))]
+        n = min([len(ends) - 1] + [os.path.getsize(p) // 8 if os.path.exists(p) else 0 for p in col_paths])
+        for p, size in [(meta_path, ends[n])] + [(p, n * 8) for p in col_paths]:
+            if os.path.exists(p) and os.path.getsize(p) != size:
+                print(f"[storage] truncating {p} to {n} rows after an interrupted append", file=sys.stderr)
+                os.truncate(p, size)
+        return n
+
+    def insert(self, rows):
+        if not rows:
+            return []
+        with self._lock:
+            try:
+                with open(self._file("rows.jsonl"), "a", encoding="utf-8") as f:
+                    f.write("".join(
+                        json.dumps({k: v for k, v in r.items() if k not in FLOAT_FIELDS}, ensure_ascii=False) + "\n"
+                        for r in rows
+                    ))
+                for i, col in enumerate(FLOAT_FIELDS):
+                    with open(self._file(f"col{i}.f64"), "ab") as f:
+                        np.array([_num(r.get(col)) for r in rows], dtype="<f8").tofile(f)
+            except BaseException:
+                self._repair()  # nessuna riga a metà: il batch non c'è, e il chiamante lo ritenta
+                raise
+        return [True] * len(rows)
+
+    def upsert(self, row):
+        return self.insert([row])[0]
+
+    def _load(self):
+        with self._lock:
+            try:
+                with open(self._file("rows.jsonl"), encoding="utf-8") as f:
+                    meta = [json.loads(line) for line in f if line.endswith("\n")]
+            except FileNotFoundError:
+                return [], np.zeros((len(FLOAT_FIELDS), 0))
+            cols = []
+            for i in range(len(FLOAT_FIELDS)):
+                try:
+                    cols.append(np.fromfile(self._file(f"col{i}.f64"), dtype="<f8"))
+                except FileNotFoundError:
+                    cols.append(np.zeros(0))
+        n = min([len(meta)] + [len(c) for c in cols])
+        meta = meta[:n]
+        data = np.stack([c[:n] for c in cols])
+        # ultima versione per submission (le righe senza ID restano tutte)
+        last = {}
+        keep = []
+        for i, m in enumerate(meta):
+            key = m.get(KEY_FIELD)
+            if key is None:
+                keep.append(i)
+            else:
+                last[key] = i
+        keep = sorted(keep + list(last.values()))
+        return [meta[i] for i in keep], data[:, keep]
+
+    def fetch_all(self):
+        meta, data = self._load()
+        out = []
+        for j, m in enumerate(meta):
+            row = dict(m)
+            row.update({col: float(data[i, j]) for i, col in enumerate(FLOAT_FIELDS)})
+            out.append(row)
+        return out
+
+    def fetch_stats(self):
+        meta, data = self._load()
+        if not meta:
+            return []
+        roles = np.array([(m.get("Role") or "").strip() for m in meta])
+        total = data[FLOAT_FIELDS.index("CO2 Total")]
+        ok = (roles != "") & np.isfinite(total)
+        names, idx = np.unique(roles[ok], return_inverse=True)
+        count = np.bincount(idx, minlength=len(names))
+        avg = np.bincount(idx, weights=total[ok], minlength=len(names)) / np.maximum(count, 1)
+        return [{"Role": str(r), "AvgCO2": round(float(a), 3), "Count": int(c)} for r, a, c in zip(names, avg, count)]
+
+
+BACKENDS = ["sheetbest", "sqlite", "columnar"]
+
+
+def open_storage(backend, url=None, stats_url=None, path=None, http=None):
+    """Crea il backend richiesto; path è il file SQLite o la cartella del formato colonnare."""
+    if backend == "sheetbest":
+        if not url:
+            raise ValueError("the sheetbest backend needs a URL (SHEETBEST_URL)")
+        if http is None:
+            from httpclient import PooledClient
+            http = PooledClient()
+        return SheetBestStorage(url, stats_url, http)
+    if backend == "sqlite":
+        return SQLiteStorage(path or "submissions.sqlite3")
+    if backend == "columnar":
+        return ColumnarStorage(path or "submissions.columnar")
+    raise ValueError(f"Unknown storage backend: {backend!r} (expected one of {', '.join(BACKENDS)})")
+
+
+def _fake_row(i, roles=("Student", "Professor", "Staff Member")):
+    vals = [round(random.uniform(0, 400), 6) for _ in FLOAT_FIELDS[:-1]]
+    row = {KEY_FIELD: f"bench-{i:08d}", "Role": roles[i % len(roles)]}
+    row.update(zip(FLOAT_FIELDS, vals + [round(sum(vals), 6)]))
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure write and stats throughput of a storage backend.")
+    parser.add_argument("--backend", choices=BACKENDS, default="sheetbest")
+    parser.add_argument("--url", help="Sheet.best (or standin_server.py) URL")
+    parser.add_argument("--stats-url", help="Stats tab URL (default: <url>/tabs/Stats)")
+    parser.add_argument("--path", help="SQLite file or columnar directory")
+    parser.add_argument("--rows", type=int, default=1000, help="rows to write (default: 1000)")
+    parser.add_argument("--batch", type=int, default=50, help="rows per insert (default: 50)")
+    parser.add_argument("--reads", type=int, default=50, help="stats reads (default: 50)")
+    args = parser.parse_args(argv)
+
+    stats_url = args.stats_url or (args.url and args.url.rstrip("/") + "/tabs/Stats")
+    store = open_storage(args.backend, url=args.url, stats_url=stats_url, path=args.path)
+    rows = [_fake_row(i) for i in range(args.rows)]
+
+    t0 = time.perf_counter()
+    acked = 0
+    for i in range(0, len(rows), args.batch):
+        try:
+            acked += sum(store.insert(rows[i:i + args.batch]))
+        except Exception as e:
+            print(f"insert failed: {e}", file=sys.stderr)
+    t_write = time.perf_counter() - t0
+
+    lat = []
+    for _ in range(args.reads):
+        t = time.perf_counter()
+        try:
+            store.fetch_stats()
+        except Exception as e:
+            print(f"stats failed: {e}", file=sys.stderr)
+        lat.append((time.perf_counter() - t) * 1000)
+    lat.sort()
+    print(json.dumps({
+        "backend": args.backend,
+        "rows_acked": acked,
+        "write_rows_per_s": round(acked / t_write, 1) if t_write else None,
+        "stats_p50_ms": round(lat[len(lat) // 2], 2) if lat else None,
+        "stats_p95_ms": round(lat[int(len(lat) * 0.95) - 1], 2) if lat else None,
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
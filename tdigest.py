@@ -0,0 +1,134 @@
+"""t-digest (variante "merging") per stimare percentili in streaming.
+
+Ogni digest tiene al massimo qualche centinaio di centroidi (media, peso), quindi
+pochi KB indipendentemente dal numero di valori; due digest si possono unire
+con merge(). cdf(x) usa una ricerca binaria su array precalcolati: microsecondi.
+"""
+import bisect
+import math
+
+
+class TDigest:
+    def __init__(self, compression=100):
+        self.compression = compression
+        self._means = []
+        self._weights = []
+        self._buffer = []
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._cum = None  # pesi cumulati al centro di ogni centroide, per cdf()
+
+    def add(self, x, w=1.0):
+        x = float(x)
+        if not math.isfinite(x):
+            return
+        self._buffer.append((x, float(w)))
+        self.count += w
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        self._cum = None
+        if len(self._buffer) > 5 * self.compression:
+            self._compress()
+
+    def merge(self, other):
+        other._compress()
+        self._buffer.extend(zip(other._means, other._weights))
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._cum = None
+        self._compress()
+        return self
+
+    def _k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _q(self, k):
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(list(zip(self._means, self._weights)) + self._buffer)
+        self._buffer = []
+        total = sum(w for _, w in points)
+        means, weights = [], []
+        cur_m, cur_w = points[0]
+        w_so_far = 0.0
+        q_limit = self._q(self._k(0.0) + 1)
+        for m, w in points[1:]:
+            if (w_so_far + cur_w + w) / total <= q_limit:
+                cur_m += (m - cur_m) * w / (cur_w + w)
+                cur_w += w
+            else:
+                means.append(cur_m)
+                weights.append(cur_w)
+                w_so_far += cur_w
+                q_limit = self._q(self._k(w_so_far / total) + 1)
+                cur_m, cur_w = m, w
+        means.append(cur_m)
+        weights.append(cur_w)
+        self._means, self._weights = means, weights
+        self._cum = None
+
+    def _prepare(self):
+        self._compress()
+        cum, acc = [], 0.0
+        for w in self._weights:
+            cum.append(acc + w / 2)
+            acc += w
+        self._cum = cum
+
+    def cdf(self, x):
+        """Frazione (0–1) dei valori <= x."""
+        if self.count == 0:
+            return None
+        if self._cum is None:
+            self._prepare()
+        if x < self.min:
+            return 0.0
+        if x >= self.max:
+            return 1.0
+        means, cum = self._means, self._cum
+        i = bisect.bisect_right(means, x)
+        # interpolazione lineare tra i centri dei centroidi (agli estremi: min e max)
+        if i == 0:
+            x0, c0, x1, c1 = self.min, 0.0, means[0], cum[0]
+        elif i == len(means):
+            x0, c0, x1, c1 = means[-1], cum[-1], self.max, self.count
+        else:
+            x0, c0, x1, c1 = means[i - 1], cum[i - 1], means[i], cum[i]
+        c = c0 if x1 == x0 else c0 + (c1 - c0) * (x - x0) / (x1 - x0)
+        return min(1.0, max(0.0, c / self.count))
+
+    def quantile(self, q):
+        """Valore stimato al quantile q (0–1)."""
+        if self.count == 0:
+            return None
+        if self._cum is None:
+            self._prepare()
+        target = q * self.count
+        cum, means = self._cum, self._means
+        i = bisect.bisect_left(cum, target)
+        if i == 0:
+            x0, c0, x1, c1 = self.min, 0.0, means[0], cum[0]
+        elif i == len(cum):
+            x0, c0, x1, c1 = means[-1], cum[-1], self.max, self.count
+        else:
+            x0, c0, x1, c1 = means[i - 1], cum[i - 1], means[i], cum[i]
+        return x0 if c1 == c0 else x0 + (x1 - x0) * (target - c0) / (c1 - c0)
+
+    def to_dict(self):
+        self._compress()
+        return {"c": self.compression, "n": self.count, "min": self.min, "max": self.max,
+                "m": [round(m, 6) for m in self._means], "w": self._weights}
+
+    @classmethod
+    def from_dict(cls, d):
+        t = cls(d["c"])
+        t._means, t._weights = list(d["m"]), list(d["w"])
+        t.count, t.min, t.max = d["n"], d["min"], d["max"]
+        return t
@@ -0,0 +1,49 @@
+import random
+
+from footprint import (
+    ACTIVITIES, AI_TASKS, IDLE_OPTIONS, ROLE_ACTIVITIES, ROLES, cloud_gb, compile_factors, emails, encode_answers, score,
+)
+
+
+def _random_answer(rnd):
+    role = rnd.choice(ROLES)
+    return {
+        "role": role,
+        "hours": {a: rnd.randrange(17) * 0.5 for a in ROLE_ACTIVITIES[role]},
+        "email_plain": rnd.choice(list(emails)),
+        "email_attach": rnd.choice(list(emails)),
+        "cloud": rnd.choice(list(cloud_gb)),
+        "wifi": rnd.randrange(17) * 0.5,
+        "pages": rnd.randrange(101),
+        "idle": rnd.choice(IDLE_OPTIONS),
+        "ai": {t: rnd.choice([0, 0, 5, 15, 20, rnd.randrange(10001)]) for t in AI_TASKS},
+    }
+
+
+def _show_main(answer, f):
+    """Digital Activities e AI Tools come li calcolava show_main, un widget alla volta."""
+    days = f.days
+    hours_total = 0
+    for act in ROLE_ACTIVITIES[answer["role"]]:
+        hours_total += answer["hours"][act] * f.act[ROLES.index(answer["role"]), ACTIVITIES.index(act)] * days
+    mail_total = (emails[answer["email_plain"]] * f.email_plain + emails[answer["email_attach"]] * f.email_attach
+                  + cloud_gb[answer["cloud"]] * f.cloud_gb) * days
+    wifi_total = answer["wifi"] * f.wifi * days
+    print_total = answer["pages"] * f.print * (days / 5)
+    idle_total = f.idle_total[IDLE_OPTIONS.index(answer["idle"])]
+    digital = hours_total + mail_total + wifi_total + print_total + idle_total
+    ai_total = 0
+    for j, task in enumerate(AI_TASKS):
+        ai_total += answer["ai"][task] * f.ai[j] * days
+    return digital, ai_total
+
+
+def test_vectorized_totals_match_show_main_exactly():
+    rnd = random.Random(7)
+    answers = [_random_answer(rnd) for _ in range(5000)]
+    f = compile_factors()
+    totals = score(encode_answers(answers))
+    for i, answer in enumerate(answers):
+        digital, ai = _show_main(answer, f)
+        assert totals["Digital Activities"][i] == digital, i
+        assert totals["AI Tools"][i] == ai, i
@@ -0,0 +1,25 @@
+import csv
+import io
+import json
+
+from footprint import ROLES
+import score_batch
+
+
+def _jsonl(answers):
+    return io.StringIO("".join(json.dumps(a) + "\n" for a in answers))
+
+
+def _ids(answers, **kw):
+    records, parse = score_batch.read_jsonl(_jsonl(answers))
+    out = io.StringIO()
+    score_batch.run(records, parse, out, progress=None, skip_invalid=True, **kw)
+    return [row["id"] for row in csv.DictReader(io.StringIO(out.getvalue()))]
+
+
+def test_skipped_row_keeps_file_row_numbers():
+    answers = [{"role": ROLES[0]}, {"role": ROLES[0]}, {"role": "Astronaut"}, {"role": ROLES[0]}, {"role": ROLES[0]}]
+    # senza colonna id vale il numero di riga nel file, qualunque sia la dimensione dei blocchi
+    assert _ids(answers) == ["1", "2", "4", "5"]
+    assert _ids(answers, chunk_size=1) == ["1", "2", "4", "5"]
+    assert _ids(answers, chunk_size=2) == ["1", "2", "4", "5"]
@@ -0,0 +1,98 @@
+"""Cache di processo per un singolo valore remoto (es. le righe del tab Stats).
+
+- entro ttl secondi il valore è servito dalla memoria (hit);
+- scaduto ma entro max_stale viene servito lo stesso (stale) mentre un solo
+  refresh in background lo aggiorna;
+- se manca del tutto (miss) il chiamante aspetta il caricamento, ma anche qui
+  parte una sola richiesta: gli altri chiamanti concorrenti aspettano la stessa.
+"""
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+
+class TTLCache:
+    def __init__(self, loader, ttl=60.0, max_stale=3600.0, name="ttlcache"):
+        self._loader = loader
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.name = name
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded_at = None
+        self._inflight = None
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0, "prefetches": 0}
+
+    def _age(self):
+        return None if self._loaded_at is None else time.monotonic() - self._loaded_at
+
+    def _load(self, fut):
+        try:
+            value = self._loader()
+        except BaseException as e:
+            with self._lock:
+                self._stats["errors"] += 1
+                self._inflight = None
+            print(f"[{self.name}] refresh failed:", e, file=sys.stderr)
+            fut.set_exception(e)
+            return
+        with self._lock:
+            self._value = value
+            self._loaded_at = time.monotonic()
+            self._inflight = None
+        fut.set_result(value)
+
+    def refresh_async(self):
+        """Avvia un refresh in background (se non ce n'è già uno) e ritorna il suo Future."""
+        with self._lock:
+            if self._inflight is not None:
+                return self._inflight
+            fut = self._inflight = Future()
+            self._stats["refreshes"] += 1
+        threading.Thread(target=self._load, args=(fut,), name=f"{self.name}-refresh", daemon=True).start()
+        return fut
+
+    def prefetch(self):
+        """
+        Scalda la cache in anticipo: se il valore è fresco ritorna un Future già completato,
+        altrimenti avvia (o riusa) il refresh in corso. Non conta come hit/miss.
+        """
+        with self._lock:
+            self._stats["prefetches"] += 1
+            age = self._age()
+            if age is not None and age < self.ttl:
+                fut = Future()
+                fut.set_result(self._value)
+                return fut
+        return self.refresh_async()
+
+    def get(self, timeout=None):
+        """Ritorna il valore (eventualmente stale); solleva l'errore del loader solo se non c'è nulla da servire."""
+        with self._lock:
+            age = self._age()
+            if age is not None and age < self.ttl:
+                self._stats["hits"] += 1
+                return self._value
+            if age is not None and age < self.ttl + self.max_stale:
+                self._stats["stale_hits"] += 1
+                value, stale = self._value, True
+            else:
+                self._stats["misses"] += 1
+                stale = False
+        fut = self.refresh_async()
+        if stale:
+            return value
+        return fut.result(timeout)
+
+    def peek(self):
+        """Ultimo valore caricato (anche scaduto), senza contare né avviare refresh."""
+        with self._lock:
+            return self._value
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["age_s"] = self._age()
+            out["refreshing"] = self._inflight is not None
+        return out
@@ -0,0 +1,183 @@
+"""Coda write-behind: accetta le righe subito e le invia in background, a blocchi.
+
+Le righe vengono prima scritte nell'outbox durevole (outbox.py), poi un solo thread
+worker per processo (condiviso da tutte le sessioni Streamlit) le raggruppa e le
+invia con send(rows): parte un blocco quando ci sono batch_size righe pronte oppure
+quando la più vecchia aspetta da max_wait secondi.
+
+send(rows) ritorna una lista di bool (conferma per riga): le righe confermate
+escono dall'outbox, le altre vengono ritentate singolarmente (una per richiesta)
+con backoff.
+Dopo ogni conferma viene chiamato on_sent(rows, replaced) con le righe confermate
+e, per ognuna, la versione precedente già confermata o None (es. per aggiornare
+le medie locali).
+Le righe con una chiave già confermata (modifiche) o il cui invio precedente ha
+avuto esito incerto passano da upsert(row), una alla volta, così un reinvio
+aggiorna la riga esistente invece di duplicarla. Incerto lo decide maybe_sent(exc):
+solo se la richiesta può essere arrivata al server (es. read timeout, connessione
+chiusa dopo l'invio). Circuito aperto, risposte di errore (429, 503, ...) ed errori
+di connessione lasciano le righe nel blocco: si ritenta tutto insieme, con backoff.
+Se il server rifiuta il blocco intero (BatchRejected, es. HTTP 400) le righe
+vengono reinviate una alla volta, così una riga non valida non blocca le altre.
+"""
+import random
+import sys
+import threading
+import time
+
+
+class BatchRejected(Exception):
+    """Il server ha rifiutato il contenuto del blocco (non un errore temporaneo)."""
+
+
+class WriteBehindQueue:
+    def __init__(self, send, outbox, batch_size=50, max_wait=2.0, base_delay=1.0, max_delay=300.0,
+                 on_sent=None, upsert=None, maybe_sent=None, name="writebehind"):
+        """maybe_sent(exc): True se l'invio fallito può essere arrivato al server (default: sempre)."""
+        self._send = send
+        self._upsert = upsert
+        self._maybe_sent = maybe_sent or (lambda exc: True)
+        self._on_sent = on_sent
+        self.outbox = outbox
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {"enqueued": 0, "sent": 0, "requests": 0, "upserts": 0, "failed_requests": 0, "row_retries": 0,
+                       "last_batch_size": None, "last_flush_ms": None, "avg_flush_ms": None}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, row, key=None):
+        """Salva la riga nell'outbox e ritorna subito (key: vedi Outbox.add)."""
+        self.outbox.add(row, key)
+        with self._lock:
+            self._stats["enqueued"] += 1
+        self._wake.set()
+
+    def depth(self):
+        return self.outbox.count()
+
+    def stats(self):
+        """Contatori + righe in attesa e latenza (ms) tra salvataggio e invio riuscito."""
+        with self._lock:
+            out = dict(self._stats)
+        out["depth"] = self.depth()
+        return out
+
+    def join(self, timeout=None):
+        """Attende che l'outbox sia vuoto (utile a fine script / nei benchmark)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.depth():
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            self._wake.set()
+            time.sleep(0.05)
+        return True
+
+    def _backoff(self, attempts):
+        delay = min(self.max_delay, self.base_delay * (2 ** attempts))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _record_flush(self, created):
+        now = time.time()
+        with self._lock:
+            s = self._stats
+            for c in created:
+                ms = (now - c) * 1000
+                s["sent"] += 1
+                s["last_flush_ms"] = ms
+                prev = s["avg_flush_ms"]
+                s["avg_flush_ms"] = ms if prev is None else prev + (ms - prev) / s["sent"]
+
+    def _wait(self, timeout=None):
+        if timeout is None:
+            due = self.outbox.next_due()
+            timeout = None if due is None else max(0.0, due - time.time())
+        self._wake.wait(timeout)
+        self._wake.clear()
+
+    def _needs_upsert(self, entry):
+        return self._upsert is not None and entry.key is not None and (entry.prev is not None or entry.uncertain)
+
+    def _post(self, batch):
+        """Un invio: ritorna le conferme per riga, o solleva l'eccezione di send()/upsert()."""
+        upsert = len(batch) == 1 and self._needs_upsert(batch[0])
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["upserts"] += int(upsert)
+            self._stats["last_batch_size"] = len(batch)
+        try:
+            acks = [bool(self._upsert(batch[0].row))] if upsert else list(self._send([b.row for b in batch]))
+        except Exception:
+            with self._lock:
+                self._stats["failed_requests"] += 1
+            raise
+        return acks + [False] * (len(batch) - len(acks))
+
+    def _settle(self, batch, acks, uncertain=True):
+        """Conferma le righe con ack; le altre ritentano da sole (uncertain: forse già inserite)."""
+        done = [b for b, ok in zip(batch, acks) if ok]
+        if done:
+            self.outbox.ack(done)
+            self._record_flush([b.created for b in done])
+            if self._on_sent:
+                try:
+                    self._on_sent([b.row for b in done], [b.prev for b in done])
+                except Exception as e:
+                    print("[autosave][ERROR] on_sent:", e, file=sys.stderr)
+        for b, ok in zip(batch, acks):
+            if not ok:
+                with self._lock:
+                    self._stats["row_retries"] += 1
+                self.outbox.retry_later([b.id], self._backoff(b.attempts), solo=True, uncertain=uncertain)
+
+    def _flush(self, batch):
+        try:
+            acks = self._post(batch)
+        except BatchRejected as e:
+            if len(batch) == 1:
+                print("[autosave] row rejected, retrying later:", e, file=sys.stderr)
+                self._settle(batch, [False], uncertain=False)
+                return
+            # isola le righe non valide: reinvio una alla volta
+            for b in batch:
+                self._flush([b])
+            return
+        except Exception as e:
+            # errore temporaneo (rete, timeout, 429, 5xx, circuito aperto): si ritenta il blocco più tardi;
+            # solo se le righe possono essere arrivate al server il prossimo invio sarà un upsert
+            uncertain = self._maybe_sent(e)
+            print(f"[autosave] sending {len(batch)} rows failed ({e}), retrying"
+                  + (" as upserts" if uncertain else ""), file=sys.stderr)
+            self.outbox.retry_later([b.id for b in batch], self._backoff(max(b.attempts for b in batch)),
+                                    uncertain=uncertain)
+            return
+        self._settle(batch, acks)
+
+    def _run(self):
+        while True:
+            try:
+                n, oldest = self.outbox.ready()
+                if not n:
+                    self._wait()
+                    continue
+                waited = time.time() - oldest
+                if n < self.batch_size and waited < self.max_wait:
+                    # finestra di raggruppamento: aspetta altre righe o la scadenza
+                    self._wait(self.max_wait - waited)
+                    continue
+                batch = self.outbox.take(self.batch_size)
+                single = [b for b in batch if b.solo or self._needs_upsert(b)]
+                grouped = [b for b in batch if b not in single]
+                if grouped:
+                    self._flush(grouped)
+                # righe non confermate o rifiutate e aggiornamenti: partono da sole, per non bloccare le altre
+                for b in single:
+                    self._flush([b])
+            except Exception as e:
+                # errori dell'outbox stesso (es. disco pieno): non far morire il thread
+                print("[autosave][ERROR]", e, file=sys.stderr)
+                time.sleep(self.base_delay)